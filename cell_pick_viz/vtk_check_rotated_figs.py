@@ -41,7 +41,7 @@ def getdata():
 
     # vtk data and picked bud, neck, tip inputs
     vtkF = swalk(op.join(rawdir),
-                 '*.vtk', start=0, stop=-4)
+                 '*.vt[kp]', start=0, stop=-4)
     vtkS = swalk(surfdir,
                  '*.vtk', start=0, stop=-12)
     mombud_csv = swalk(op.join(datadir, op.pardir, 'csv'),
@@ -25,7 +25,7 @@ nxgrph = nxgrph[78]
 if __name__ == '__main__':
     try:
         vtkF = wr.ddwalk(op.join(rawdir, 'normSkel'),
-                         '*skeleton.vtk', start=5, stop=-13)
+                         '*skeleton.vt[kp]', start=5, stop=-13)
         vtkS = wr.ddwalk(op.join(inputdir, 'surfaceFiles'),
                          '*surface.vtk', stop=-12)
 
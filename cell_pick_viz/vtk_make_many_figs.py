@@ -40,7 +40,7 @@ def main(*args, **kwargs):
     datadir = op.join(os.getcwd(), 'mutants', 'normalizedVTK')
 
     try:
-        vtkF = ddwalk(datadir, '*skeleton.vtk', start=5, stop=-13)
+        vtkF = ddwalk(datadir, '*skeleton.vt[kp]', start=5, stop=-13)
 #        vtkS = ddwalk(op.join(inputdir, 'surfaceFiles'),
 #                      '*surface.vtk', stop=-12)
     except UsageError:
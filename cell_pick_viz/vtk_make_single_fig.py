@@ -45,7 +45,7 @@ def main(scalar_select=None, save=False, **kwargs):
                           'transformedData', 'filtered')
         filekey = 'NUM1_032016_011_RFPstack_030'
 
-        vtkF = swalk(datadir, '*.vtk', start=0, stop=-4)
+        vtkF = swalk(datadir, '*.vt[kp]', start=0, stop=-4)
 
         data = vz.callreader(vtkF[filekey])
         _, _, nxgrph = mg(data, filekey)
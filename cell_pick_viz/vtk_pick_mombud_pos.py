@@ -123,7 +123,7 @@ def callback(obj, event):
             print 'results recorded!'
 
 # filelist and graph list
-vtkF = wr.ddwalk(op.join(rawdir, 'normSkel'), '*skeleton.vtk',
+vtkF = wr.ddwalk(op.join(rawdir, 'normSkel'), '*skeleton.vt[kp]',
                  start=5, stop=-13)
 
 filekeys = {item: vtkF[media][item] for media
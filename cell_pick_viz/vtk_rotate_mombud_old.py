@@ -24,7 +24,7 @@ cur_col, palette = vz.generate_color_labels(**def_cols)
 
 # vtk data and cell picking points data
 vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
-                 '*skeleton.vtk', start=5, stop=-13)
+                 '*skeleton.vt[kp]', start=5, stop=-13)
 
 mombud = wr.swalk(op.join(datadir, 'csv'),
                   '*csv', stop=-4)
@@ -18,7 +18,7 @@ rawdir = op.join(os.getcwd(), 'output')
 
 # filelist and graph list
 vtkF = wr.ddwalk(op.join(rawdir, 'normSkel'),
-                 '*skeleton.vtk', start=5, stop=-13)
+                 '*skeleton.vt[kp]', start=5, stop=-13)
 
 mombud = wr.swalk(op.join(datadir, 'csv'),
                   'YP*csv', stop=-4)
@@ -21,6 +21,7 @@ from mayavi.core.api import Source, Engine
 from mayavi.core.ui.api import SceneEditor, MlabSceneModel, EngineView, \
                                MayaviScene
 from mombud.functions import vtkvizfuncs as vz
+from pipeline.vtkio import read_polydata
 # pylint: disable=C0103, E1136
 datadir = op.join(os.getcwd(), 'mutants')
 
@@ -29,10 +30,7 @@ def vtkopen(fpath):
     """
     wrapper to open polydata files
     """
-    reader = tvtk.PolyDataReader(file_name=fpath)
-    reader.update
-    data = reader.output
-    return data
+    return tvtk.to_tvtk(read_polydata(fpath))
 
 
 def cellpos(vtkdata, base, tip, neck):
@@ -8,11 +8,10 @@ import os.path as op
 from collections import defaultdict
 import cPickle as pickle
 import pandas as pd
-from tvtk.api import tvtk
-import vtk
 import numpy as np
 import traceback
 from wrappers import UsageError
+from pipeline.vtkio import read_polydata
 # pylint: disable=C0103
 class FalseException(Exception):
     pass
@@ -69,13 +68,9 @@ def gen_data(regen=False, **kwargs):
 
 def vtkopen(fpath):
     """
-    wrapper to open polydata files
+    wrapper to open polydata files (legacy `.vtk` or XML `.vtp`)
     """
-    reader = vtk.vtkPolyDataReader()
-    reader.SetFileName(fpath)
-    reader.Update()
-    data = reader.GetOutput()
-    return data
+    return read_polydata(fpath)
 
 
 def gen_cell_dict(data, label=None, vtk_label=None):
@@ -126,6 +121,7 @@ def cellpos(cellname, df, **kwargs):
     """
     outdic = {}
     cellkey = cellname.rsplit('\\', 1)[1][:-4]
+    from tvtk.api import tvtk  # mayavi, loaded on first use
     data = vtkopen(cellname)
     data = tvtk.to_tvtk(data)
 
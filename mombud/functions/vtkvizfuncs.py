@@ -4,7 +4,6 @@ functions to render vtk output from pipeline
 """
 import math
 from collections import defaultdict
-import vtk
 import numpy as np
 from mayavi import mlab
 from mayavi.sources.api import ParametricSurface
@@ -13,6 +12,8 @@ from tvtk.api import tvtk
 import networkx as nx
 from seaborn import xkcd_palette as scolor
 from wrappers import UsageError
+from pipeline.polylines import PolylineTable
+from pipeline.vtkio import read_polydata
 # pylint: disable=C0103
 
 
@@ -79,11 +80,7 @@ def callreader(filepath):
     ***THIS RETURNS A VTK version polydata, for a mayavi source, use
     setup_vtk_source***
     """
-    reader = vtk.vtkPolyDataReader()
-    reader.SetFileName(filepath)
-    reader.Update()
-    polydata = reader.GetOutput()
-    return polydata
+    return read_polydata(filepath)
 
 
 def setup_vtk_source(fpath):
@@ -103,9 +100,8 @@ def setup_vtk_source(fpath):
         mayavi pipeline ready source object
 
     """
-    dat = tvtk.PolyDataReader(file_name=fpath)
-    dat.update()   # very IMPORTANT!!!
-    src = VTKDataSource(data=dat.output)
+    dat = tvtk.to_tvtk(read_polydata(fpath))
+    src = VTKDataSource(data=dat)
     if hasattr(src, 'point_scalars_name'):
         src.point_scalars_name = 'DY_raw'  # make this default scalar
     return src
@@ -127,17 +123,18 @@ def labellines(vtksrc):
             mlab.text3d(x, y, z, '%s' % line, scale=0.15)
 
 
-def edgeplot(fig, vtksrc, cellid, scalartype='DY_raw', **kwargs):
+def edgeplot(fig, vtksrc, cellid, scalartype='DY_raw',
+             table=None, **kwargs):
     """
-    Draw one edge of the vtk cell. Uses tvtk functions, not VTK.
+    Draw one edge of the vtk cell. Uses tvtk functions, not VTK. Pass the
+    PolylineTable of `vtksrc` as `table` when drawing several edges
 
     """
     dataset = tvtk.to_tvtk(vtksrc)
-    line = dataset.get_cell(cellid)
-    vals = dataset.point_data.get_array(scalartype)
-    pts = line.points.to_array()
-    ptid = line.point_ids
-    scalvals = [vals[int(pid)] for pid in ptid]
+    if table is None:
+        table = PolylineTable.from_polydata(vtksrc, [scalartype])
+    pts = table.edge(cellid)
+    scalvals = table.edge(cellid, scalartype).tolist()
 
     src = mlab.pipeline.line_source(pts[:, 0],
                                     pts[:, 1],
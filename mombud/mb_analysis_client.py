@@ -13,6 +13,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import mombud.functions.vtk_mbfuncs as vf
+from pipeline import profiling as prof
 from wrappers import FalseException, UsageError, swalk, ddwalk
 # pylint: disable=C0103
 COL_ODR = ['MFB1', 'NUM1', 'YPT11', 'WT', 'YPE', 'YPL', 'YPR']
@@ -70,7 +71,7 @@ def getData():
     reject = swalk(rejectfold, '*png', stop=-4)
 
     # VTK files for new and old data
-    filext = "*vtk"
+    filext = "*vt[kp]"
     vtkF = ddwalk(datadir, filext, stop=-4)
     vtkF_old = swalk(datadir_old, filext, stop=-4)
 
@@ -235,6 +236,7 @@ def process_ind_df(vtkdf, mbax=None, cellax=None, **kwargs):
     return dicout
 
 
+@prof.timed(cat='munge')
 def postprocess_df(**kwargs):
     """
     Set population level data ,update parameters dict for plotting and filter
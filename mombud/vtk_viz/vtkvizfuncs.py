@@ -3,12 +3,13 @@
 functions to render vtk output from pipeline
 """
 import math
-import vtk
 import numpy as np
 from mayavi import mlab
 from mayavi.sources.api import ParametricSurface
 from tvtk.api import tvtk
 import networkx as nx
+from pipeline.polylines import PolylineTable
+from pipeline.vtkio import read_polydata
 # pylint: disable=C0103
 
 def nicegrph(graph, axinput, grphtype='neato'):
@@ -34,11 +35,7 @@ def callreader(filepath):
     """
     Convenience wrapper for vtk reader call
     """
-    reader = vtk.vtkPolyDataReader()
-    reader.SetFileName(filepath)
-    reader.Update()
-    polydata = reader.GetOutput()
-    return polydata
+    return read_polydata(filepath)
 
 
 def labellines(vtksrc):
@@ -57,17 +54,18 @@ def labellines(vtksrc):
             mlab.text3d(x, y, z, '%s' % line, scale=0.15)
 
 
-def edgeplot(fig, vtksrc, cellid, scalartype='DY_raw'):
+def edgeplot(fig, vtksrc, cellid, scalartype='DY_raw',
+             table=None):
     """
-    Draw one edge of the vtk cell. Uses tvtk functions, not VTK.
+    Draw one edge of the vtk cell. Uses tvtk functions, not VTK. Pass the
+    PolylineTable of `vtksrc` as `table` when drawing several edges
 
     """
     dataset = tvtk.to_tvtk(vtksrc)
-    line = dataset.get_cell(cellid)
-    vals = dataset.point_data.get_array(scalartype)
-    pts = line.points.to_array()
-    ptid = line.point_ids
-    scalvals = [vals[int(pid)] for pid in ptid]
+    if table is None:
+        table = PolylineTable.from_polydata(vtksrc, [scalartype])
+    pts = table.edge(cellid)
+    scalvals = table.edge(cellid, scalartype).tolist()
 
     src = mlab.pipeline.line_source(pts[:, 0],
                                     pts[:, 1],
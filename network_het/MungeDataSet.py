@@ -1,213 +1,167 @@
 """
     Calculate the statistical and topological measures of interest of cells
-    in various carbon sources and munge it into dataframe
+    in various carbon sources and munge it into dataframe, run headless on
+    the pipeline folders as the munge stage of sweepython.py
 """
-import errno
-import sys
 import os
 import os.path as op
-import fnmatch
+import traceback
+from collections import defaultdict
 import numpy as np
-from tvtk.api import tvtk
 import networkx as nx
 import scipy.stats as sp
-import matplotlib.pyplot as plt
-from collections import defaultdict
-from network_het.mungedata import MungeDataFuncs as md
 import pandas as pd
 import cPickle as pickle
-from pipeline.make_networkx import makegraph as mg
+from network_het.mungedata import MungeDataFuncs as md
+from network_het import graphlets as gl
+from pipeline import profiling as prof
+from pipeline.artifacts import cached_map
+from pipeline.graphstore import GraphStore
+from pipeline.polylines import PolylineTable
+from pipeline.vtkio import read_polydata
 from numpy.random import choice as samp_no_rep
+import vtk.util.numpy_support as vnpy
 import wrappers as wr
-plt.close('all')
-
-# =============================================================================
-#               init vars and get vtk, graph data
-# =============================================================================
 # pylint: disable=C0103
 
-# pylint: disable=C0103d
-savefolder = op.expanduser(os.sep.join(['~', 'Dropbox', 'SusanneSweeShared',
-                                        'network']))
-datadir = op.join(os.getcwd())
-rawdir = op.join(os.getcwd(), 'old_w_new')
+NBOOT = 100  # number of replicates for bootstrap
+cnnsub = nx.connected_component_subgraphs
+avg_shpthl = nx.average_shortest_path_length
+avg_nnd = nx.average_neighbor_degree
 
-# filelist and graph list
-if __name__ == '__main__':
+# measures of each cell, the columns of the munged DataFrame
+OUT = ('mito_avgdeg',
+       'mito_beta_geo',
+       'mito_beta_top',
+       'mito_bpts_dy',
+       'mito_bpts_dyraw',
+       'mito_bpts_orbits',
+       'mito_bptcoefvar_raw',
+       'mito_btwcntr_uw',
+       'mito_btwcntr_w',
+       'mito_cell_avedy',
+       'mito_cell_avedyr',
+       'mito_cell_stddy',
+       'mito_cell_stddyr',
+       'mito_charpl_uw',
+       'mito_charpl_w',
+       'mito_clscntr_uw',
+       'mito_clscntr_w',
+       'mito_clstcf_uw',
+       'mito_clstcf_w',
+       'mito_edge_avedy',
+       'mito_edge_avedyr',
+       'mito_edge_coefvar',
+       'mito_edge_coefvarr',
+       'mito_edge_stddy',
+       'mito_edge_stddyr',
+       'mito_edgelen',
+       'mito_edgenum',
+       'mito_knn_uw',
+       'mito_knn_w',
+       'mito_phi',
+       'mito_pk3',
+       'mito_totlen',
+       'mito_widcoef',
+       'mito_widcoefDY',
+       'mito_cell_ave_gfp',
+       'mito_cell_ave_rfp',
+       'mito_cell_w',
+       'mito_iso_dyr',
+       'mito_bootbpts_dyraw',
+       'mito_tubew',
+       'mito_nodenumbers',
+       'mito_graphlets')
+
+
+def load_backgrounds(folder):
+    """
+    Returns a dict of (RFP, GFP) background values by cell or cell type key,
+    from `folder/fileMetas.pkl` (filemetas of generate_filemetas) and/or
+    `folder/pre_normalized/background_all.pkl` (normalize input), which wins
+    """
+    backgrounds = {}
     try:
-        with open(op.join(rawdir, 'fileMetas.pkl'), 'rb') as inpt:
+        with open(op.join(folder, 'fileMetas.pkl'), 'rb') as inpt:
             filemetas = pickle.load(inpt)
+        backgrounds.update((i, (filemetas[i][0], filemetas[i][1]))
+                           for i in filemetas)
     except IOError:
-        print "Error: Make sure you have file metadatas in working directory"
-
+        pass
     try:
+        with open(op.join(folder, 'pre_normalized', 'background_all.pkl'),
+                  'rb') as inpt:
+            bck = pickle.load(inpt)
+        backgrounds.update((i, (bck[i]['ch2'], bck[i]['ch1'])) for i in bck)
+    except IOError:
+        pass
+    return backgrounds
 
-        vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
-                 '*skeleton.vtk', start=5, stop=-13)
-#        vtkSkel = wr.ddwalk(op.join(datadir, 'output', 'normalizedVTK'),
-#                            '*skeleton.vtk', stop=-13)
-        vtkVolRfp = wr.ddwalk(op.join(datadir, 'input', 'resampledFiles'),
-                              '*RF*resampled.vtk', stop=-14)
-        vtkVolGfp = wr.ddwalk(op.join(datadir, 'input', 'resampledFiles'),
-                              '*GF*resampled.vtk', stop=-14)
-        graph_pkl = wr.swalk(op.join(datadir, 'data'), '*_grph.pkl')
-    except Exception:
-        print "Error: check your filepaths"
-        sys.exit()
-
-#    for lab in sorted(vtkSkel.keys())[:]:
-#        try:
-#            folder = op.join(datadir, 'output', 'normalizedVTK', lab)
-#            os.makedirs(folder)
-#        except OSError as exception:
-#            if exception.errno != errno.EEXIST:
-#                raise
-
-G = {}
-backgroundGFP = {}
-backgroundRFP = {}
-parDir = os.path.dirname(os.getcwd())
-for key, val in graph_pkl.iteritems():
-    with open(val, 'rb') as inpt:
-        temp = pickle.load(inpt)[2]
-        for grph in temp:
-            G[grph.graph['cell']] = grph
-
-
-media = sorted(vtkF.keys())
-# pylint: enable=C0103
-
-#    networkX graph objects of mitograph
-#for i in G:
-#    with open(G[i][0], 'rb') as inpt:
-#        temp = pickle.load(inpt)[2]
-#        G[i].append(temp)
-
-backgroundRFP = {i: filemetas[i][0] for i in filemetas.keys()}
-backgroundGFP = {i: filemetas[i][1] for i in filemetas.keys()}
-
-# =============================================================================
-#               begin pipeline
-# =============================================================================
-# pylint: disable=C0103
-mito_avgdeg = defaultdict(dict)
-mito_bpts_dy = defaultdict(dict)
-mito_bpts_dyraw = defaultdict(dict)
-mito_bptcoefvar_raw = defaultdict(dict)
-mito_btwcntr_uw = defaultdict(dict)
-mito_btwcntr_w = defaultdict(dict)
-mito_cell_avedy = defaultdict(dict)
-mito_cell_avedyr = defaultdict(dict)
-mito_cell_stddy = defaultdict(dict)
-mito_cell_stddyr = defaultdict(dict)
-mito_charpl_uw = defaultdict(dict)
-mito_charpl_w = defaultdict(dict)
-mito_clscntr_uw = defaultdict(dict)
-mito_clscntr_w = defaultdict(dict)
-mito_clstcf_uw = defaultdict(dict)
-mito_clstcf_w = defaultdict(dict)
-mito_edge_avedy = defaultdict(dict)
-mito_edge_avedyr = defaultdict(dict)
-mito_edge_coefvar = defaultdict(dict)
-mito_edge_coefvarr = defaultdict(dict)
-mito_edge_stddy = defaultdict(dict)
-mito_edge_stddyr = defaultdict(dict)
-mito_edgelen = defaultdict(dict)
-mito_edgenum = defaultdict(dict)
-mito_knn_uw = defaultdict(dict)
-mito_knn_w = defaultdict(dict)
-mito_beta_top = defaultdict(dict)
-mito_beta_geo = defaultdict(dict)
-mito_phi = defaultdict(dict)
-mito_pk3 = defaultdict(dict)
-mito_totlen = defaultdict(dict)
-mito_widcoef = defaultdict(dict)
-mito_widcoefDY = defaultdict(dict)
-mito_cell_ave_gfp = defaultdict(dict)
-mito_cell_ave_rfp = defaultdict(dict)
-mito_cell_w = defaultdict(dict)
-mito_iso_dyr = defaultdict(dict)
-mito_bootbpts_dyraw = defaultdict(dict)
-mito_tubew = defaultdict(dict)
-mito_nodenumbers = defaultdict(dict)
 
-cnnsub = nx.connected_component_subgraphs
-avg_shpthl = nx.average_shortest_path_length
-avg_nnd = nx.average_neighbor_degree
-# pylint: enable=C0103
-for mem in media:
-    print'\nNow on %s\n' % mem + "=" * 79
-    for n, filekey  in enumerate(vtkF[mem]):
-#        filekey = f.partition('_')[2]
-        Norm = []
-        NormRaw = []
-        GFP = []
-        RFP = []
-        arrPts = []
-        W = []
-        W2 = []
-        rGFP = []
-        lineId = {}
-
-        reader = tvtk.PolyDataReader()
-        reader.set(file_name=vtkF[mem][filekey])
-        reader.update()
-        data = reader.output
-        temp = data.point_data
-        scalarsNorm = np.ravel(temp.get_array('DY_minmax'))
-        dyRaw = np.ravel(temp.get_array('DY_raw'))
-        rawGFP = np.ravel(temp.get_array('rGFP'))
-        rawRFP = np.ravel(temp.get_array('rRFP'))
-        WidthEq = np.ravel(temp.get_array('WidthEq'))
-        tubeWidth = np.ravel(temp.get_array('TubeWidth'))
-
-        try:
-            curGrph = G[filekey]
-        except KeyError:
-            curGrph = mg(tvtk.to_vtk(data), filekey)[2]
-
-        fk = filekey.rsplit('_', 1)[0]  # mutant type short key
-        try:
-            minA = backgroundRFP[filekey]-1
-        except KeyError:  # for mutants type
-            minA = backgroundRFP[fk]-1
-
-        try:
-            minB = min(backgroundGFP[filekey], min(rawGFP))
-        except KeyError:  # for mutants type
-            minB = min(backgroundGFP[fk], min(rawGFP))
+def cell_background(backgrounds, filekey):
+    """
+    Returns the (RFP, GFP) background of `filekey` from load_backgrounds(),
+    or of its cell type (mutants) key, KeyError if there is neither
+    """
+    try:
+        return backgrounds[filekey]
+    except KeyError:  # for mutants type
+        return backgrounds[filekey.rsplit('_', 1)[0]]
+
+
+@prof.timed(name='munge_cell', cat='cell', cell='filekey')
+def munge_cell(filekey, vtkpath, cellGrph, background):
+    """
+    Returns the measures of cell `filekey` as a dict keyed by the names in
+    OUT, from its normalized skeleton `vtkpath`, its CellGraph `cellGrph`
+    and its (RFP, GFP) `background` (see cell_background())
+    """
+    out = {}
+    data = read_polydata(vtkpath)
+    table = PolylineTable.from_polydata(data, ['DY_minmax', 'DY_raw'])
+    temp = data.GetPointData()
+    scalarsNorm = np.ravel(vnpy.vtk_to_numpy(temp.GetArray('DY_minmax')))
+    dyRaw = np.ravel(vnpy.vtk_to_numpy(temp.GetArray('DY_raw')))
+    rawGFP = np.ravel(vnpy.vtk_to_numpy(temp.GetArray('rGFP')))
+    rawRFP = np.ravel(vnpy.vtk_to_numpy(temp.GetArray('rRFP')))
+    WidthEq = np.ravel(vnpy.vtk_to_numpy(temp.GetArray('WidthEq')))
+    tubeWidth = np.ravel(vnpy.vtk_to_numpy(temp.GetArray('TubeWidth')))
+
+    curGrph = cellGrph.to_networkx()
+    orbits = gl.orbit_counts(cellGrph)
+
+    minA = background[0]-1
+    minB = min(background[1], min(rawGFP))
 
 #    Convert multigraph to graph for clustering coef calc (choose long edges)
-        GG = nx.Graph()
-        for n, nbrs in curGrph.adjacency_iter():
-            for nbr, attr in nbrs.items():
-                maxvalue = max([d['weight'] for d in attr.values()])
-                GG.add_edge(n, nbr, weight=maxvalue)
+    GG = nx.Graph()
+    for n, nbrs in curGrph.adjacency_iter():
+        for nbr, attr in nbrs.items():
+            maxvalue = max([d['weight'] for d in attr.values()])
+            GG.add_edge(n, nbr, weight=maxvalue)
 
 #    get btps intensity value within radofinfluence
-        branchpoints = {j: attr['coord'] for j, attr
-                        in curGrph.nodes(data=True)
-                        if attr['degree'] > 2}
+    branchpoints = {j: attr['coord'] for j, attr
+                    in curGrph.nodes(data=True)
+                    if attr['degree'] > 2}
 
-        bptpid = md.bpts_inten(data, branchpoints)
-        bptdy = {key: np.mean([scalarsNorm[el] for el in vals])
-                 for key, vals in sorted(bptpid.iteritems())}
+    bptpid = md.bpts_inten(data, branchpoints)
+    bptdy = {key: np.mean([scalarsNorm[el] for el in vals])
+             for key, vals in sorted(bptpid.iteritems())}
 
-        bptdy_raw = {key: np.mean([dyRaw[el] for el in vals])
-                     for key, vals in sorted(bptpid.iteritems())}
+    bptdy_raw = {key: np.mean([dyRaw[el] for el in vals])
+                 for key, vals in sorted(bptpid.iteritems())}
 
-        bptcoefvar_raw = {key: sp.variation([dyRaw[el] for el in vals])
-                          for key, vals in sorted(bptpid.iteritems())}
+    bptcoefvar_raw = {key: sp.variation([dyRaw[el] for el in vals])
+                      for key, vals in sorted(bptpid.iteritems())}
 
 #    make bootstrapped btps and bootstrap dyraw around rad of influence
+    with prof.span('bootstrap', 'munge', cell=filekey):
         bpids = np.unique([el for lis in bptpid.values() for el in lis])
-        allids = {i: np.array(data.get_cell(i).point_ids) for i
-                  in range(data.number_of_lines)}
-        nonbpids = np.unique([el for lis in allids.values() for el
-                              in lis if el not in bpids])
+        nonbpids = np.setdiff1d(table.pids, bpids)
 
         bootbp = defaultdict(dict)
-        nboot = 100  # number of replicates for bootstrap
+        nboot = NBOOT
         for n in range(nboot):
             bootbp[n] = {}
             for k, v in bptpid.items():
@@ -222,15 +176,7 @@ for mem in media:
         bootbpdy_raw = {key: np.mean(vals) for key, vals
                         in mean_bs.iteritems()}
 
-#    get the line of interest
-        for line in range(data.number_of_lines):
-            cellIds = list(data.get_cell(line).point_ids)
-            Norm.append([scalarsNorm[cid] for cid in cellIds])
-            NormRaw.append([dyRaw[cid] for cid in cellIds])
-            GFP.append([rawGFP[cid] for cid in cellIds])
-            RFP.append([rawRFP[cid] for cid in cellIds])
-            W.append([WidthEq[cid] for cid in cellIds])
-
+    with prof.span('centrality', 'munge', cell=filekey):
         dedges = {(a, b, eattr['cellID']): eattr['weight'] for a, b, eattr
                   in curGrph.edges(data=True)}  # edgelists
         node_btwcent = nx.betweenness_centrality(curGrph)
@@ -249,186 +195,217 @@ for mem in media:
                            weight='weight')
         ccW = nx.average_clustering(GG, weight='weight')
 
-        conncomps = [cnn for cnn in cnnsub(curGrph)]
-        largest_cnn = conncomps[np.argmax([g.number_of_edges() for g
-                                           in cnnsub(curGrph)])]
+    conncomps = [cnn for cnn in cnnsub(curGrph)]
+    largest_cnn = conncomps[np.argmax([g.number_of_edges() for g
+                                       in cnnsub(curGrph)])]
 #        smallest_cnn = conncomps[np.argmin([g.number_of_edges() for g
 #                                            in cnnsub(curGrph)])]
-        isocnn = [a for a in conncomps if len(a.edges()) == 1]
+    isocnn = [a for a in conncomps if len(a.edges()) == 1]
 
 #        isoedgecid = [eattr['cellID'] for n1, n2, eattr
 #                      in smallest_cnn.edges(data=True)][0]
 #        isoedgepid = data.get_cell(isoedgecid).point_ids
-        isoedgecid = [eattr['cellID'] for subg
-                      in isocnn for n1, n2, eattr
-                      in subg.edges(data=True)]
-        isoedgepid = {cid: np.array(data.get_cell(cid).point_ids) for cid
-                      in isoedgecid}
+    isoedgecid = [eattr['cellID'] for subg
+                  in isocnn for n1, n2, eattr
+                  in subg.edges(data=True)]
+    isoedgepid = {cid: table.line_pids(cid) for cid in isoedgecid}
 
 # =============================================================================
 #              these are the stats of interest
 # =============================================================================
 #       Topology
-        # make sure the edges are returned in the same order as DY (by cellid)
+    # make sure the edges are returned in the same order as DY (by cellid)
 
-        x = {i[2]: dedges[i] for i in dedges.keys()}
+    x = {i[2]: dedges[i] for i in dedges.keys()}
 
-        mito_edgelen[filekey] = [x[key] for key in sorted(x.keys())]
+    out['mito_edgelen'] = [x[key] for key in sorted(x.keys())]
 
-        mito_totlen[filekey] = np.sum(mito_edgelen[filekey])
+    out['mito_totlen'] = np.sum(out['mito_edgelen'])
 
-        mito_edgenum[filekey] = curGrph.number_of_edges()
-        mito_nodenumbers[filekey]= curGrph.number_of_nodes()
+    out['mito_edgenum'] = curGrph.number_of_edges()
+    out['mito_nodenumbers'] = curGrph.number_of_nodes()
 
-        for line in isoedgepid:
-            mito_iso_dyr[filekey][line] = [dyRaw[pid] for pid
-                                           in isoedgepid[line]]
+    if isoedgepid:  # left out (NaN) for cells without isolated edges
+        out['mito_iso_dyr'] = {line: [dyRaw[pid] for pid
+                                      in isoedgepid[line]]
+                               for line in isoedgepid}
 #       Function
-        mito_edge_avedy[filekey] = [
-            np.mean(el) for el in Norm]  # per cell
+    out['mito_edge_avedy'] = list(
+        table.mean('DY_minmax'))  # per cell
 
-        mito_edge_stddy[filekey] = [
-            np.std(el) for el in Norm]  # per cell!
+    out['mito_edge_stddy'] = list(
+        table.std('DY_minmax'))  # per cell!
 
-        mito_edge_avedyr[filekey] = [
-            np.mean(el) for el in NormRaw]
+    out['mito_edge_avedyr'] = list(table.mean('DY_raw'))
 
-        mito_edge_stddyr[filekey] = [
-            np.std(el) for el in NormRaw]
+    out['mito_edge_stddyr'] = list(table.std('DY_raw'))
 
-        mito_edge_coefvar[filekey] = [
-            np.std(el)/np.mean(el) for el in Norm]
+    out['mito_edge_coefvar'] = list(table.cv('DY_minmax'))
 
-        mito_edge_coefvarr[filekey] = [
-            np.std(el)/np.mean(el) for el in NormRaw]
+    out['mito_edge_coefvarr'] = list(table.cv('DY_raw'))
 
-        mito_cell_avedy[filekey] = np.mean(scalarsNorm)
+    out['mito_cell_avedy'] = np.mean(scalarsNorm)
 
-        mito_cell_avedyr[filekey] = np.mean(dyRaw)
+    out['mito_cell_avedyr'] = np.mean(dyRaw)
 
-        mito_cell_stddy[filekey] = np.std(scalarsNorm)
+    out['mito_cell_stddy'] = np.std(scalarsNorm)
 
-        mito_cell_stddyr[filekey] = np.std(dyRaw)
+    out['mito_cell_stddyr'] = np.std(dyRaw)
 
-        mito_bpts_dy[filekey] = [bptdy[key] for key
-                                 in sorted(branchpoints)]
+    out['mito_bpts_dy'] = [bptdy[key] for key
+                           in sorted(branchpoints)]
 
-        mito_bpts_dyraw[filekey] = [bptdy_raw[key] for key
-                                    in sorted(branchpoints)]
-        mito_bptcoefvar_raw[filekey] = [bptcoefvar_raw[key] for key
-                                        in sorted(branchpoints)]
-        mito_bootbpts_dyraw[filekey] = [bootbpdy_raw[key] for key
-                                        in sorted(branchpoints)]
+    out['mito_bpts_dyraw'] = [bptdy_raw[key] for key
+                              in sorted(branchpoints)]
+    # orbit counts in gl.ORBITS order, rows align with mito_bpts_dyraw
+    out['mito_bpts_orbits'] = gl.branchpoint_orbits(cellGrph,
+                                                    orbits).tolist()
+    out['mito_graphlets'] = gl.graphlet_counts(orbits)
+    out['mito_bptcoefvar_raw'] = [bptcoefvar_raw[key] for key
+                                  in sorted(branchpoints)]
+    out['mito_bootbpts_dyraw'] = [bootbpdy_raw[key] for key
+                                  in sorted(branchpoints)]
 
-        mito_cell_ave_gfp[filekey] = np.mean(rawGFP-minB)
-        mito_cell_ave_rfp[filekey] = np.mean(rawRFP-minA)
-        mito_cell_w[filekey] = np.mean(WidthEq)
-        mito_tubew[filekey] = np.mean(tubeWidth)
+    out['mito_cell_ave_gfp'] = np.mean(rawGFP-minB)
+    out['mito_cell_ave_rfp'] = np.mean(rawRFP-minA)
+    out['mito_cell_w'] = np.mean(WidthEq)
+    out['mito_tubew'] = np.mean(tubeWidth)
 #       Connectivity
-        mito_widcoef[filekey] = sp.pearsonr(rawRFP, tubeWidth)
-        mito_widcoefDY[filekey] = sp.pearsonr(dyRaw, tubeWidth)
+    out['mito_widcoef'] = sp.pearsonr(rawRFP, tubeWidth)
+    out['mito_widcoefDY'] = sp.pearsonr(dyRaw, tubeWidth)
 
-        mito_btwcntr_uw[filekey] = [node_btwcent[key] for key
-                                    in sorted(branchpoints)]  # per cell!
+    out['mito_btwcntr_uw'] = [node_btwcent[key] for key
+                              in sorted(branchpoints)]  # per cell!
 
-        mito_clscntr_uw[filekey] = [node_clscent[key] for key
-                                    in sorted(branchpoints)]  # per cell
+    out['mito_clscntr_uw'] = [node_clscent[key] for key
+                              in sorted(branchpoints)]  # per cell
 
-        mito_knn_uw[filekey] = [anndeg[key] for key  # nearest neighb conn
-                                in sorted(branchpoints)]
+    out['mito_knn_uw'] = [anndeg[key] for key  # nearest neighb conn
+                          in sorted(branchpoints)]
 
-        mito_clstcf_uw[filekey] = [lc[key] for key
-                                   in sorted(branchpoints)]
+    out['mito_clstcf_uw'] = [lc[key] for key
+                             in sorted(branchpoints)]
 
-        mito_charpl_uw[filekey] = np.max(
-            [avg_shpthl(g) for g in cnnsub(curGrph)
-             if len(g) > 1])
+    out['mito_charpl_uw'] = np.max(
+        [avg_shpthl(g) for g in cnnsub(curGrph)
+         if len(g) > 1])
 
 #       Connectivity weighted by length
-        mito_btwcntr_w[filekey] = [node_btwcentW[key] for key
-                                   in sorted(branchpoints)]  # per cell!
+    out['mito_btwcntr_w'] = [node_btwcentW[key] for key
+                             in sorted(branchpoints)]  # per cell!
 
-        mito_clscntr_w[filekey] = [node_clscentW[key] for key
-                                   in sorted(branchpoints)]  # per cell
+    out['mito_clscntr_w'] = [node_clscentW[key] for key
+                             in sorted(branchpoints)]  # per cell
 
-        mito_knn_w[filekey] = [anndeg_w[key] for key
-                               in sorted(branchpoints)]  # nrst nb. conn.
+    out['mito_knn_w'] = [anndeg_w[key] for key
+                         in sorted(branchpoints)]  # nrst nb. conn.
 
-        mito_clstcf_w[filekey] = [lcW[key] for key
-                                  in sorted(branchpoints)]
+    out['mito_clstcf_w'] = [lcW[key] for key
+                            in sorted(branchpoints)]
 
-        mito_charpl_w[filekey] = np.max(
-            [avg_shpthl(g, weight='weight') for g in cnnsub(curGrph)
-             if len(g) > 1])
+    out['mito_charpl_w'] = np.max(
+        [avg_shpthl(g, weight='weight') for g in cnnsub(curGrph)
+         if len(g) > 1])
 
-        mito_phi[filekey] = (1. * largest_cnn.number_of_nodes() /
-                             curGrph.number_of_nodes())
+    out['mito_phi'] = (1. * largest_cnn.number_of_nodes() /
+                       curGrph.number_of_nodes())
 
-        mito_beta_top[filekey] = (1. * largest_cnn.number_of_edges() /
-                                  curGrph.number_of_edges())
+    out['mito_beta_top'] = (1. * largest_cnn.number_of_edges() /
+                            curGrph.number_of_edges())
 
-        mito_beta_geo[filekey] = (np.sum([eattr['weight'] for e, f, eattr
-                                          in largest_cnn.edges(data=True)]) /
-                                  mito_totlen[filekey])
+    out['mito_beta_geo'] = (np.sum([eattr['weight'] for e, f, eattr
+                                    in largest_cnn.edges(data=True)]) /
+                            out['mito_totlen'])
 
-        mito_pk3[filekey] = 1. * k3 / curGrph.number_of_nodes()
+    out['mito_pk3'] = 1. * k3 / curGrph.number_of_nodes()
 
-        mito_avgdeg[filekey] = (2. * curGrph.number_of_edges() /
-                                curGrph.number_of_nodes())
+    out['mito_avgdeg'] = (2. * curGrph.number_of_edges() /
+                          curGrph.number_of_nodes())
+    return out
 
 
-OUT = ('mito_avgdeg',
-       'mito_beta_geo',
-       'mito_beta_top',
-       'mito_bpts_dy',
-       'mito_bpts_dyraw',
-       'mito_bptcoefvar_raw',
-       'mito_btwcntr_uw',
-       'mito_btwcntr_w',
-       'mito_cell_avedy',
-       'mito_cell_avedyr',
-       'mito_cell_stddy',
-       'mito_cell_stddyr',
-       'mito_charpl_uw',
-       'mito_charpl_w',
-       'mito_clscntr_uw',
-       'mito_clscntr_w',
-       'mito_clstcf_uw',
-       'mito_clstcf_w',
-       'mito_edge_avedy',
-       'mito_edge_avedyr',
-       'mito_edge_coefvar',
-       'mito_edge_coefvarr',
-       'mito_edge_stddy',
-       'mito_edge_stddyr',
-       'mito_edgelen',
-       'mito_edgenum',
-       'mito_knn_uw',
-       'mito_knn_w',
-       'mito_phi',
-       'mito_pk3',
-       'mito_totlen',
-       'mito_widcoef',
-       'mito_widcoefDY',
-       'mito_cell_ave_gfp',
-       'mito_cell_ave_rfp',
-       'mito_cell_w',
-       'mito_iso_dyr',
-       'mito_bootbpts_dyraw',
-       'mito_tubew',
-       'mito_nodenumbers')
-
-FRAMES = []
-for i in OUT:
-    FRAMES.append(pd.Series(globals()[i], name=i))
-df = pd.concat(FRAMES, axis=1)
-df['cat'] = df.index
-df['media'] = df['cat'].apply(lambda x: x.split('_', 1)[0])
-df = df.drop('cat', axis=1)
-df['charpl_norm_len'] = df.mito_charpl_uw / df.mito_totlen
-df['charpl_norm_numedge'] = df.mito_charpl_w / df.mito_edgenum
-df['cell_coefvar'] = df['mito_edge_avedy'].apply(sp.variation)
-df['cell_coefvar_r'] = df['mito_edge_avedyr'].apply(sp.variation)
-
-with open('munged_dataframe_2016.pkl', 'wb') as OUTPUT:
-    pickle.dump(df, OUTPUT)
+def _munge_task(args):
+    """
+    Pool worker for munge_cells(), loads a pickled CellGraph. Returns
+    (filekey, None) after printing the traceback if the cell failed
+    """
+    filekey, files, values = args
+    try:
+        with open(files['graph'], 'rb') as inpt:
+            graph = pickle.load(inpt)
+        return filekey, munge_cell(filekey, files['skel'], graph,
+                                   values['background'])
+    except Exception:  # pylint: disable=W0703
+        print "%s failed:\n%s" % (filekey, traceback.format_exc())
+        return filekey, None
+
+
+def munge_cells(cells, jobs=1, chunksize=1, store=None):
+    """
+    Returns a dict of munge_cell() by cell for `cells`, a dict of filekey:
+    (skeleton path, CellGraph pickle path, background), computed by a pool
+    of `jobs` worker processes. Failed cells are left out. With an
+    ArtifactStore `store` the measures are `munge_cell` artifacts, so only
+    the cells whose skeleton, graph or background changed are computed
+    """
+    return cached_map(_munge_task,
+                      {filekey: {'skel': skel, 'graph': graph}
+                       for filekey, (skel, graph, _) in cells.items()},
+                      store, 'munge_cell', {'nboot': NBOOT}, jobs, chunksize,
+                      values={filekey: {'background': background}
+                              for filekey, (_, _, background)
+                              in cells.items()})
+
+
+def munge_frame(results):
+    """
+    Returns the DataFrame of munge_cells() `results`, one row per cell and
+    one column per name in OUT, with the derived columns
+    """
+    FRAMES = []
+    for i in OUT:
+        FRAMES.append(pd.Series({filekey: results[filekey][i]
+                                 for filekey in results
+                                 if i in results[filekey]}, name=i))
+    df = pd.concat(FRAMES, axis=1)
+    df['cat'] = df.index
+    df['media'] = df['cat'].apply(lambda x: x.split('_', 1)[0])
+    df = df.drop('cat', axis=1)
+    df['charpl_norm_len'] = df.mito_charpl_uw / df.mito_totlen
+    df['charpl_norm_numedge'] = df.mito_charpl_w / df.mito_edgenum
+    df['cell_coefvar'] = df['mito_edge_avedy'].apply(sp.variation)
+    df['cell_coefvar_r'] = df['mito_edge_avedyr'].apply(sp.variation)
+    return df
+
+
+def main():
+    """
+    Munge the cells of `old_w_new/normalizedVTK` into
+    munged_dataframe_2016.pkl, the graphs are taken from (and missing ones
+    built into) the graph store in `old_w_new/graphs`, as make_networkx
+    """
+    rawdir = op.join(os.getcwd(), 'old_w_new')
+    backgrounds = load_backgrounds(rawdir)
+    if not backgrounds:
+        print "Error: Make sure you have file metadatas in working directory"
+        return 1
+    vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
+                     '*skeleton.vt[kp]', start=5, stop=-13)
+    graphs = GraphStore(op.join(rawdir, 'graphs'))
+    cells = {}
+    for mem in sorted(vtkF.keys()):
+        for filekey in vtkF[mem]:
+            graphs.get(filekey, vtkF[mem][filekey])
+            cells[filekey] = (vtkF[mem][filekey],
+                              op.join(graphs.folder,
+                                      graphs.index.get(filekey)['graph']),
+                              cell_background(backgrounds, filekey))
+    graphs.save()
+
+    df = munge_frame(munge_cells(cells))
+    with open('munged_dataframe_2016.pkl', 'wb') as OUTPUT:
+        pickle.dump(df, OUTPUT)
+    return 0
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,8 @@ from numpy.random import choice as samp_no_rep
 import pandas as pd
 import cPickle as pickle
 import seaborn as sns
+from pipeline.graphstore import GraphStore
+from pipeline.vtkio import read_polydata
 plt.close('all')
 
 
@@ -45,26 +47,19 @@ def bpts_inten(vtkdata, bptscoord, radinf=.3):
 # =============================================================================
 # pylint: disable=C0103
 vtkF = {}
-G = {}
 backgroundGFP = {}
 backgroundRFP = {}
 parDir = os.path.dirname(os.getcwd())
 for root, dirs, files in os.walk(os.getcwd()):
     for i in files:
-        if fnmatch.fnmatch(i, '*vtk'):
+        if fnmatch.fnmatch(i, '*skeleton.vt[kp]'):
             vtkF.setdefault(root.rsplit('\\', 1)[1], []).append(
                 os.path.join(root, i))
-        if fnmatch.fnmatch(i, '*grph.pkl'):
-            G.setdefault(root.rsplit('\\', 1)[1], []).append(
-                os.path.join(root, i))
 
 media = sorted(vtkF.keys())
 
-#    networkX graph objects of mitograph
-for i in G:
-    with open(G[i][0], 'rb') as inpt:
-        temp = pickle.load(inpt)[2]
-        G[i].append(temp)
+#    networkX graph objects of mitograph, in the store of the data folder
+graphs = GraphStore(os.path.join(parDir, 'graphs'))
 
 #    get metadatas
 with open(parDir+'\\'+'fileMetas.pkl', 'rb') as inpt:
@@ -95,11 +90,9 @@ for mem in media:
         rGFP = []
         lineId = {}
 
-        curGrph = G[mem][1][n]
-        reader = tvtk.PolyDataReader()
-        reader.set(file_name=a)
-        reader.update()
-        data = reader.output
+        filekey = a.rsplit('\\', 1)[1][5:][:-13]
+        curGrph = graphs.get(filekey, a).to_networkx()
+        data = tvtk.to_tvtk(read_polydata(a))
         scalarsNorm = data.point_data.scalars
         temp = data.point_data
         dyRaw = np.ravel(temp.get_array('DY_raw'))
@@ -107,7 +100,6 @@ for mem in media:
         rawRFP = np.ravel(temp.get_array('rRFP'))
         WidthEq = np.ravel(temp.get_array('WidthEq'))
         tubeWidth = np.ravel(temp.get_array('tubeWidth'))
-        filekey = a.rsplit('\\', 1)[1][5:][:-13]
 
         if backgroundRFP[filekey] > min(rawRFP):
             minA = backgroundRFP[filekey]-1
@@ -139,3 +131,5 @@ for mem in media:
 
         fakebpdy_raw = {key: np.mean([dyRaw[el] for el in vals])
                         for key, vals in sorted(fakebp.iteritems())}
+
+graphs.save()
@@ -14,6 +14,7 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 from network_het.mungedata import MungeDataFuncs as md
+from network_het.mungedata import MungeDataPlots as mdp
 import TkClas
 
 sns.plotting_context('talk', font_scale=1.4)
@@ -248,11 +249,11 @@ dfs2.to_clipboard(float_format='%6.4f')
 # ============================================================================
 # # PLOTS
 # =============================================================================
-g = md.boxviol(dfvol, 'Amount density', 'media_new')
+g = mdp.boxviol(dfvol, 'Amount density', 'media_new')
 g.set_title('Quasi Density', fontsize=24)
 g.set_ylabel('Quasi Density')
 plt.ylim([0, dfvol['Amount density'].quantile(0.995)])
-h = md.boxviol(dfvol, 'Surf', 'media_new')
+h = mdp.boxviol(dfvol, 'Surf', 'media_new')
 h.set_title(u'Cell Surface Area /µm²', fontsize=24)
 h.set_ylabel('')
 plt.ylim([0, dfvol.Surf.quantile(0.9995)])
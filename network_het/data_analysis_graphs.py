@@ -11,6 +11,7 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 from network_het.mungedata import MungeDataFuncs as md
+from network_het.mungedata import MungeDataPlots as mdp
 sns.plotting_context('talk', font_scale=1.4)
 # pylint: disable=C0103
 plt.close('all')
@@ -73,11 +74,11 @@ dfvol = pd.DataFrame({'Vol': dfsize.loc[:, 'Vol'],
 dfvol['mitovol'] = np.pi * (.15)**2 * dfvol.mitolen
 dfvol['Vol Ratio'] = dfvol.mitovol / dfvol.Vol
 
-g = md.boxviol(dfvol, 'Vol Ratio', 'media')
+g = mdp.boxviol(dfvol, 'Vol Ratio', 'media')
 g.set_title('Volume Ratio', fontsize=24)
 g.set_ylabel('')
 plt.ylim(0)
-h = md.boxviol(dfvol, 'Vol', 'media')
+h = mdp.boxviol(dfvol, 'Vol', 'media')
 h.set_title(r'Cell Volume $\mu m^{3}$', fontsize=24)
 h.set_ylabel('')
 plt.ylim(0)
@@ -110,14 +111,14 @@ for col in dfscals.columns[:-2]:
 #for col in dflists.columns[:-1]:
 #    DF = df.loc[:, [col, 'media']]
 #    DF[col] = DF[col].apply(np.mean)
-#    axg = md.boxviol(DF, col, 'media')
+#    axg = mdp.boxviol(DF, col, 'media')
 #    axg.set_title(dic[col], fontsize=20)
 #    axg.set_ylabel('')
 #    plt.savefig('_%s.png' % col)
 #    plt.close()
 #for col in dfscals.columns[:-1]:
 #    DF = df.loc[:, [col, 'media']]
-#    axg = md.boxviol(DF, col, 'media')
+#    axg = mdp.boxviol(DF, col, 'media')
 #    axg.set_title(dic[col], fontsize=20)
 #    axg.set_ylabel('')
 #    plt.savefig('_%s.png' % col)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Graphlet (2 to 4 node connected induced subgraph) counts of the cell graphs
+in the graph store, per node as automorphism orbit counts and per cell as
+graphlet counts
+"""
+import sys
+import os.path as op
+import argparse
+import cPickle as pickle
+import traceback
+import numpy as np
+import pandas as pd
+import wrappers as wr
+from pipeline.artifacts import ArtifactStore, cached_map
+from pipeline.catalog import FileCatalog
+from pipeline.graphstore import GraphStore, build_graphs
+# pylint: disable=C0103
+
+# node orbits of the graphlets, numbered as in Przulj (2007)
+ORBITS = ('edge',                                   # 0
+          'path3_end', 'path3_mid',                 # 1, 2
+          'triangle',                               # 3
+          'path4_end', 'path4_mid',                 # 4, 5
+          'star_leaf', 'star_hub',                  # 6, 7
+          'cycle4',                                 # 8
+          'paw_tail', 'paw_side', 'paw_hub',        # 9, 10, 11
+          'diamond_side', 'diamond_hub',            # 12, 13
+          'clique4')                                # 14
+
+# graphlets with an orbit of theirs and the number of nodes in that orbit
+GRAPHLETS = (('edge', 0, 2),
+             ('path3', 2, 1),
+             ('triangle', 3, 3),
+             ('path4', 5, 2),
+             ('star', 7, 1),
+             ('cycle4', 8, 4),
+             ('paw', 11, 1),
+             ('diamond', 13, 2),
+             ('clique4', 14, 4))
+
+# orbit of a node by (edges, max degree, degree of the node) of its graphlet
+_ORBIT3 = {(2, 2, 1): 1, (2, 2, 2): 2, (3, 2, 2): 3}
+_ORBIT4 = {(3, 2, 1): 4, (3, 2, 2): 5,
+           (3, 3, 1): 6, (3, 3, 3): 7,
+           (4, 2, 2): 8,
+           (4, 3, 1): 9, (4, 3, 2): 10, (4, 3, 3): 11,
+           (5, 3, 2): 12, (5, 3, 3): 13,
+           (6, 3, 3): 14}
+
+
+def _unique_rows(arr):
+    """
+    Unique rows of the 2D int array `arr`, each row sorted first
+    """
+    arr = np.sort(arr, axis=1)
+    if not len(arr):
+        return arr
+    arr = arr[np.lexsort(arr.T[::-1])]
+    keep = np.r_[True, np.any(np.diff(arr, axis=0) != 0, axis=1)]
+    return arr[keep]
+
+
+def _extend(sets, indptr, indices):
+    """
+    All (row of `sets`, neighbor of a node of the row) pairs, as the rows
+    of `sets` with the neighbor appended, neighbors inside the row excluded
+    """
+    degree = np.diff(indptr)
+    out = []
+    for col in range(sets.shape[1]):
+        nodes = sets[:, col]
+        width = degree[nodes].max() if len(nodes) else 0
+        slot = np.arange(width)
+        row, k = np.nonzero(slot < degree[nodes][:, None])
+        nbr = indices[indptr[nodes[row]] + k]
+        new = np.all(sets[row] != nbr[:, None], axis=1)
+        out.append(np.c_[sets[row[new]], nbr[new]])
+    return np.vstack(out) if out else np.empty((0, sets.shape[1] + 1), int)
+
+
+def _classify(sets, adj, table):
+    """
+    Orbit of every node of the connected node `sets` (one per row), looked
+    up in `table` by the edges, max degree and node degree of the induced
+    subgraph
+    """
+    k = sets.shape[1]
+    linked = np.zeros(sets.shape, dtype=int)
+    nedges = np.zeros(len(sets), dtype=int)
+    for a in range(k):
+        for b in range(a + 1, k):
+            hit = np.asarray(adj[sets[:, a], sets[:, b]]).ravel() > 0
+            linked[:, a] += hit
+            linked[:, b] += hit
+            nedges += hit
+    maxdeg = linked.max(axis=1)
+    orbit = np.empty(sets.shape, dtype=int)
+    for key, val in table.items():
+        m, dmax, d = key
+        orbit[(nedges == m)[:, None] & (maxdeg == dmax)[:, None] &
+              (linked == d)] = val
+    return orbit
+
+
+def orbit_counts(graph):
+    """
+    Returns the (nodes x 15) array of the number of times each node of
+    CellGraph `graph` touches each orbit of ORBITS, on the simple graph
+    (self loops dropped, parallel edges merged)
+
+    Connected triples are enumerated from the neighbor pairs of every node
+    and connected quadruples by extending the triples with a neighbor, all
+    as array operations, so the cost is linear in the number of graphlets
+    rather than in the number of node subsets
+    """
+    adj = graph.adjacency()
+    n = adj.shape[0]
+    counts = np.zeros((n, len(ORBITS)), dtype=int)
+    counts[:, 0] = np.diff(adj.indptr)
+    if not adj.nnz:
+        return counts
+
+    edges = np.c_[np.repeat(np.arange(n), counts[:, 0]), adj.indices]
+    edges = edges[edges[:, 0] < edges[:, 1]]
+    triples = _unique_rows(_extend(edges, adj.indptr, adj.indices))
+    for sets, table in ((triples, _ORBIT3),
+                        (_unique_rows(_extend(triples, adj.indptr,
+                                              adj.indices)), _ORBIT4)):
+        if len(sets):
+            np.add.at(counts, (sets.ravel(),
+                               _classify(sets, adj, table).ravel()), 1)
+    return counts
+
+
+def graphlet_counts(orbits):
+    """
+    Returns a dict of the number of each graphlet of GRAPHLETS in a graph,
+    from its node `orbits` counts returned by orbit_counts()
+    """
+    total = orbits.sum(axis=0)
+    return {name: int(total[orb] // size) for name, orb, size in GRAPHLETS}
+
+
+def branchpoint_orbits(graph, orbits=None):
+    """
+    Returns the orbit counts of the branchpoints (degree > 2 nodes) of
+    CellGraph `graph`, in node order as the branchpoint lists of
+    MungeDataSet (eg. `mito_bpts_dyraw`)
+    """
+    if orbits is None:
+        orbits = orbit_counts(graph)
+    return orbits[graph.degree > 2]
+
+
+def _orbits_task(args):
+    """
+    Pool worker for graphlet_tables(), loads a pickled CellGraph. Returns
+    (cell, None) after printing the traceback if the cell failed
+    """
+    cell, fpath = args
+    try:
+        with open(fpath, 'rb') as inpt:
+            graph = pickle.load(inpt)
+        return cell, (graph.degree, orbit_counts(graph))
+    except Exception:  # pylint: disable=W0703
+        print "%s failed:\n%s" % (cell, traceback.format_exc())
+        return cell, None
+
+
+def graphlet_tables(files, jobs=1, chunksize=1, store=None):
+    """
+    Returns the graphlet counts per cell and the orbit counts per node as
+    DataFrames, for the CellGraph pickles `files` (dict of cell: file path)
+    computed by a pool of `jobs` worker processes. Nodes are indexed by
+    (cell, node) with their multigraph `degree`, so `degree > 2` selects
+    the branchpoints. With an ArtifactStore `store` only the cells whose
+    graph changed are computed
+    """
+    results = cached_map(_orbits_task, files, store, 'graphlets',
+                         {'orbits': ORBITS}, jobs, chunksize)
+
+    cells = pd.DataFrame.from_dict(
+        {cell: graphlet_counts(results[cell][1]) for cell in results},
+        orient='index')
+    cells['media'] = [cell.split('_', 1)[0] for cell in cells.index]
+
+    frames = []
+    for cell in sorted(results):
+        degree, orbits = results[cell]
+        frame = pd.DataFrame(orbits, columns=ORBITS)
+        frame.insert(0, 'degree', degree)
+        frame.index = pd.MultiIndex.from_product(
+            [[cell], frame.index], names=['cell', 'node'])
+        frames.append(frame)
+    nodes = pd.concat(frames) if frames else pd.DataFrame(columns=ORBITS)
+    return cells, nodes
+
+
+def main(argv=None):
+    """
+    Write the graphlet and orbit counts of every cell, the graphs are taken
+    from (and missing ones built into) the graph store
+    """
+    parser = argparse.ArgumentParser(
+        description='Graphlet counts of the mito network graphs')
+    parser.add_argument('basedir', nargs='?', default='mutants',
+                        help='folder with normalizedVTK and graphs '
+                        'subfolders')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (default 1)')
+    parser.add_argument('-c', '--chunksize', type=int, default=1,
+                        help='cells handed to a worker at a time')
+    parser.add_argument('-o', '--output', default='graphlet_dataframe.pkl',
+                        help='pickled (cells, nodes) DataFrames to write')
+    args = parser.parse_args(argv)
+
+    catalog = FileCatalog(op.join(args.basedir, 'catalog.sqlite'))
+    vtkF = wr.ddwalk(op.join(args.basedir, 'normalizedVTK'),
+                     '*skeleton.vt[kp]', start=5, stop=-13, catalog=catalog)
+    catalog.close()
+    paths = {files: vtkF[mediatype][files]
+             for mediatype in vtkF for files in vtkF[mediatype]}
+    store = GraphStore(op.join(args.basedir, 'graphs'))
+    jobs = max(args.jobs, 1)
+    chunksize = max(args.chunksize, 1)
+    artifacts = ArtifactStore(op.join(args.basedir, 'artifacts'))
+    failed = build_graphs(store, paths, jobs=jobs, chunksize=chunksize,
+                          artifacts=artifacts)
+    files = {cell: op.join(store.folder, store.index.get(cell)['graph'])
+             for cell in paths if cell not in failed}
+
+    cells, nodes = graphlet_tables(files, jobs=jobs, chunksize=chunksize,
+                                   store=artifacts)
+    with open(args.output, 'wb') as output:
+        pickle.dump((cells, nodes), output)
+    print 'graphlet counts of %d cells saved in %s' % (len(cells),
+                                                       args.output)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
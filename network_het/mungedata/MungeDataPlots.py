@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Jul 22 18:10:24 2015
+Functions for plotting the munged dataset in sns and pandas
+@author: sweel
+"""
+import matplotlib.pyplot as plt
+import pandas as pd
+import numpy as np
+import seaborn as sns
+
+
+def adjust_axes(fighandle, numticks):
+    """adjust number of ticks
+    """
+    ax_loc = fighandle.axes.shape
+    for loc in range(ax_loc[0]):
+        x = fighandle.axes[ax_loc[0]-1, loc]
+        xbounds = x.get_xbound()
+        x.set_xticks(np.round(
+            np.linspace(0., xbounds[1], numticks),
+            2))
+
+        y = fighandle.axes[loc, 0]
+        ybounds = y.get_ybound()
+        y.set_yticks(np.round(
+            np.linspace(0., ybounds[1], numticks),
+            2))
+
+
+def boxviol(datf, vals, group, **kwargs):
+    """plot violin with boxplot bounds and stripplots
+    """
+    with sns.plotting_context('talk', font_scale=1.25):
+        _, ax1 = plt.subplots(1, 1)
+
+        #  VIOLINPLOT
+        sns.violinplot(x=group,
+                       ax=ax1,
+                       y=vals,
+                       data=datf)
+
+#        xpos = [tic for tic in ax1.get_xticks()]
+#
+#        #  BOXPLOT
+#        dic = datf.boxplot(vals,
+#                           by=group,
+#                           ax=ax1,
+#                           showbox=False,
+#                           showmeans=True,
+#                           showfliers=False,
+#                           whiskerprops={'linewidth': 0},
+##                           medianprops={'linewidth': 3},
+#                           capprops={'linewidth': 2,
+#                                     'markersize': 1,
+#                                     'color': '#555555'},
+#                           positions=xpos,
+#                           return_type='dict')
+
+#        for dline in dic[dic.keys()[0]]['medians']:
+#            dline.set_color('#FFFFFF')
+#            x1, x2 = dline.get_xdata()
+#            dline.set_xdata([x1 + .1, x2 - .1])
+
+        ax1.set_title('')
+        plt.suptitle('')
+        #  STRIPPLOT
+        sns.stripplot(x=group,
+                      y=vals,
+                      ax=ax1,
+                      data=datf,
+                      jitter=.05,
+                      size=3,
+                      alpha=.4)
+
+        #  LABELS AND LIMS
+#        pltlims = []
+#        for cap in dic[dic.keys()[0]]['caps']:
+#            pltlims.append(cap.get_ydata()[0])
+#        lowerb = min(pltlims)
+#        upperb = max(pltlims)
+#        plt.ylim(max(0, (lowerb - .05 * lowerb)), 1.05 * upperb)
+#        pltlims = kwargs.pop('pltLims', None)  # for customizing ylims
+#        if pltlims is not None:
+#            plt.ylim(pltlims)
+#        else:
+#            plt.ylim(0.)
+        plt.show()
+        return ax1
+
+
+def pairplotter(dataset):
+    """plot pairplot for single cell
+    """
+    for idx in dataset.index:
+        dlist = {c: d for c, d in dataset.ix[idx].iteritems()}
+        cell_conn = pd.DataFrame(dlist)
+        cell_conn['cell'] = idx
+        dfpair = cell_conn.ix[:, 2:8]
+        gr1 = sns.PairGrid(dfpair)
+        gr1 = gr1.map(sns.regplot)
+        gr1.savefig('%s_pairplot.png' % idx)
+        print '%s done' % idx
+        plt.close()
+    gr1 = gr1.map_lower(plt.scatter)
+    gr1 = gr1.map_diag(sns.kdeplot, lw=3, legend=False)
+    gr1 = gr1.map_upper(sns.regplot)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Batch Laplacian spectral descriptors of the cell graphs in the graph store,
+written as a per-cell feature table next to the munged dataframe
+"""
+import sys
+import os.path as op
+import argparse
+import cPickle as pickle
+import traceback
+import numpy as np
+import pandas as pd
+from scipy import linalg
+from scipy.sparse import csgraph
+from scipy.sparse import linalg as splinalg
+import wrappers as wr
+from pipeline.artifacts import ArtifactStore, cached_map
+from pipeline.catalog import FileCatalog
+from pipeline.graphstore import GraphStore, build_graphs
+# pylint: disable=C0103
+
+# diffusion times of the heat kernel trace signature
+HEAT_TIMES = (.1, 1., 10.)
+# graphs up to this many nodes use the full (dense) spectrum
+DENSE_MAX = 1000
+# random probe vectors of the heat kernel trace estimate of larger graphs
+HEAT_PROBES = 64
+
+
+def spectrum(mat, k, which='SA'):
+    """
+    Returns the `k` smallest (`SA`) or largest (`LA`) eigenvalues of the
+    symmetric sparse matrix `mat` in ascending order, from the dense
+    spectrum for small matrices and the Lanczos eigensolver otherwise
+    """
+    n = mat.shape[0]
+    if n <= DENSE_MAX or k >= n - 1:
+        vals = linalg.eigvalsh(mat.toarray())
+        return vals[:k] if which == 'SA' else vals[-k:]
+    if which == 'SA':
+        # shift-invert just below zero, Laplacians are positive semidefinite
+        vals = splinalg.eigsh(mat, k, sigma=-1e-2, which='LM',
+                              return_eigenvectors=False)
+    else:
+        vals = splinalg.eigsh(mat, k, which='LA',
+                              return_eigenvectors=False)
+    return np.sort(vals)
+
+
+def heat_traces(lap, times=HEAT_TIMES, probes=HEAT_PROBES, seed=0):
+    """
+    Returns the traces of the heat kernels exp(-t `lap`) for each t in
+    `times`. Exact from the dense spectrum up to DENSE_MAX nodes, above that
+    the Hutchinson estimate: the mean of z' exp(-t lap) z over `probes`
+    random sign vectors z, seeded so a graph always gets the same value
+    """
+    n = lap.shape[0]
+    if n <= DENSE_MAX:
+        lam = linalg.eigvalsh(lap.toarray())
+        return [np.sum(np.exp(-t * lam)) for t in times]
+    lap = lap.tocsr().astype(float)
+    z = np.random.RandomState(seed).choice([-1., 1.], size=(n, probes))
+    return [np.mean(np.sum(z * splinalg.expm_multiply(-t * lap, z), axis=0))
+            for t in times]
+
+
+def spectral_features(graph):
+    """
+    Returns a dict of the spectral descriptors of CellGraph `graph`
+
+    * components : number of connected components
+    * algebraic_connectivity : second smallest Laplacian eigenvalue of the
+      largest component
+    * spectral_radius, spectral_gap : largest adjacency eigenvalue of the
+      largest component and its difference to the second largest
+    * heat_trace_<t> : trace of the heat kernel exp(-t L) of the normalized
+      Laplacian per node, estimated for graphs larger than DENSE_MAX (see
+      heat_traces())
+
+    The descriptors of a graph without nodes are NaN
+    """
+    adj = graph.adjacency()
+    n = adj.shape[0]
+    feats = {'nodes': n,
+             'edges': graph.number_of_edges()}
+    if n == 0:
+        feats['components'] = 0
+        for key in (['algebraic_connectivity', 'spectral_radius',
+                     'spectral_gap'] +
+                    ['heat_trace_{:g}'.format(t) for t in HEAT_TIMES]):
+            feats[key] = np.nan
+        return feats
+    ncomp, labels = csgraph.connected_components(adj, directed=False)
+    feats['components'] = ncomp
+
+    largest = labels == np.argmax(np.bincount(labels))
+    sub = adj[largest][:, largest]
+    if sub.shape[0] > 1:
+        feats['algebraic_connectivity'] = spectrum(
+            csgraph.laplacian(sub), 2, 'SA')[1]
+        top = spectrum(sub, 2, 'LA')
+        feats['spectral_radius'] = top[1]
+        feats['spectral_gap'] = top[1] - top[0]
+    else:
+        feats['algebraic_connectivity'] = np.nan
+        feats['spectral_radius'] = feats['spectral_gap'] = np.nan
+
+    traces = heat_traces(csgraph.laplacian(adj, normed=True))
+    for t, trace in zip(HEAT_TIMES, traces):
+        feats['heat_trace_{:g}'.format(t)] = trace / n
+    return feats
+
+
+def _features_task(args):
+    """
+    Pool worker for spectral_table(), loads a pickled CellGraph. Returns
+    (cell, None) after printing the traceback if the cell failed
+    """
+    cell, fpath = args
+    try:
+        with open(fpath, 'rb') as inpt:
+            graph = pickle.load(inpt)
+        return cell, spectral_features(graph)
+    except Exception:  # pylint: disable=W0703
+        print "%s failed:\n%s" % (cell, traceback.format_exc())
+        return cell, None
+
+
+def spectral_table(files, jobs=1, chunksize=1, store=None):
+    """
+    Returns a DataFrame of spectral_features() indexed by cell, for the
+    CellGraph pickles `files` (dict of cell: file path), computed by a pool
+    of `jobs` worker processes. With an ArtifactStore `store` only the cells
+    whose graph changed are computed
+    """
+    results = cached_map(_features_task, files, store, 'spectral',
+                         {'heat_times': HEAT_TIMES, 'dense_max': DENSE_MAX,
+                          'heat_probes': HEAT_PROBES}, jobs, chunksize)
+    df = pd.DataFrame.from_dict(results, orient='index')
+    df['media'] = [cell.split('_', 1)[0] for cell in df.index]
+    return df
+
+
+def main(argv=None):
+    """
+    Write the spectral descriptors of every cell, the graphs are taken from
+    (and missing ones built into) the graph store
+    """
+    parser = argparse.ArgumentParser(
+        description='Spectral descriptors of the mito network graphs')
+    parser.add_argument('basedir', nargs='?', default='mutants',
+                        help='folder with normalizedVTK and graphs '
+                        'subfolders')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (default 1)')
+    parser.add_argument('-c', '--chunksize', type=int, default=1,
+                        help='cells handed to a worker at a time')
+    parser.add_argument('-o', '--output', default='spectral_dataframe.pkl',
+                        help='pickled DataFrame to write')
+    args = parser.parse_args(argv)
+
+    catalog = FileCatalog(op.join(args.basedir, 'catalog.sqlite'))
+    vtkF = wr.ddwalk(op.join(args.basedir, 'normalizedVTK'),
+                     '*skeleton.vt[kp]', start=5, stop=-13, catalog=catalog)
+    catalog.close()
+    paths = {files: vtkF[mediatype][files]
+             for mediatype in vtkF for files in vtkF[mediatype]}
+    store = GraphStore(op.join(args.basedir, 'graphs'))
+    jobs = max(args.jobs, 1)
+    chunksize = max(args.chunksize, 1)
+    artifacts = ArtifactStore(op.join(args.basedir, 'artifacts'))
+    failed = build_graphs(store, paths, jobs=jobs, chunksize=chunksize,
+                          artifacts=artifacts)
+    files = {cell: op.join(store.folder, store.index.get(cell)['graph'])
+             for cell in paths if cell not in failed}
+
+    df = spectral_table(files, jobs=jobs, chunksize=chunksize,
+                        store=artifacts)
+    with open(args.output, 'wb') as output:
+        pickle.dump(df, output)
+    print 'spectral descriptors of %d cells saved in %s' % (len(df),
+                                                           args.output)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Module for a content addressed store of derived pipeline data (artifacts),
+keyed by the stage that made them, the contents of their input files, the
+keys of the artifacts they were derived from and their parameters, so a
+change to any input only invalidates the artifacts downstream of it.
+
+An artifact is either a pickled value kept in the store or output files
+written elsewhere (eg. normalized skeletons), and an input file that is the
+output of another artifact makes that artifact a dependency, eg.
+
+    raw skeleton, background -> normalize -> graph -> munge_cell -> munge
+"""
+import os
+import os.path as op
+import cPickle as pickle
+import multiprocessing
+from collections import deque
+from pipeline import manifest as mf
+# pylint: disable=C0103
+
+
+def artifact_entry(stage, name, files=None, deps=None, values=None,
+                   params=None, previous=None):
+    """
+    Returns the store entry of artifact `name` (eg. a cell) of `stage`,
+    `entry['key']` is its SHA1 key
+
+    Parameters
+    ----------
+    files : dict
+        input file paths by label, hashed by content. Only re-hashed if
+        changed since the `previous` entry
+    deps : dict
+        keys of upstream artifacts by label
+    values : dict
+        JSON serializable input values by label, eg. the background values
+        of a single cell rather than the file of all backgrounds, so that
+        other cells are not invalidated when it changes
+    params : dict
+        stage parameters, include a version to invalidate the artifacts of
+        a stage whose code changed
+    """
+    old = (previous or {}).get('inputs', {})
+    entry = {'stage': stage,
+             'name': name,
+             'inputs': {lab: mf.file_record(path, old.get(lab))
+                        for lab, path in (files or {}).items()},
+             'deps': dict(deps or {}),
+             'values': {lab: mf.value_digest(val)
+                        for lab, val in (values or {}).items()},
+             'params': mf.value_digest(params or {})}
+    entry['key'] = mf.value_digest(
+        [stage, name,
+         {lab: rec['sha1'] for lab, rec in entry['inputs'].items()},
+         entry['deps'], entry['values'], entry['params']])
+    return entry
+
+
+def _head(stage, name):
+    return '{}/{}'.format(stage, name)
+
+
+def _unchanged(rec):
+    # file of record `rec` still has the recorded size and mtime
+    try:
+        stat = os.stat(rec['path'])
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime) == (rec['size'], rec['mtime'])
+
+
+class ArtifactStore(object):
+    """
+    Folder of pickled artifacts, one file per artifact named by its key.
+    `index.json` records the entry of every stored artifact, which forms the
+    dependency graph between artifacts through their `deps`, and
+    `heads.json` maps each (stage, name) to the key of its latest artifact.
+    Entries of file artifacts list their output file records in `outputs`
+
+    Parameters
+    ----------
+    folder : str
+        path of the store, created if needed
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        if not op.isdir(folder):
+            os.makedirs(folder)
+        self.index = mf.Manifest(op.join(folder, 'index.json'))
+        self.heads = mf.Manifest(op.join(folder, 'heads.json'))
+        self._producers = None
+
+    def path(self, key):
+        """
+        Path of the file of artifact `key`
+        """
+        return op.join(self.folder, '{}.pkl'.format(key))
+
+    def head(self, stage, name):
+        """
+        Key of the latest artifact `name` of `stage`, None if there is none
+        """
+        return self.heads.get(_head(stage, name))
+
+    def producer(self, fpath):
+        """
+        Key of the head artifact with output file `fpath`, None if the file
+        was not made by an artifact of this store
+        """
+        if self._producers is None:
+            self._producers = {}
+            for key in self.heads.entries.values():
+                outputs = (self.index.get(key) or {}).get('outputs', {})
+                for rec in outputs.values():
+                    self._producers[rec['path']] = key
+        return self._producers.get(op.abspath(fpath))
+
+    def entry(self, stage, name, files=None, deps=None, values=None,
+              params=None):
+        """
+        Returns the entry of artifact `name` of `stage`, see
+        artifact_entry(). Input `files` made by another artifact (see
+        producer()) add it to the `deps` under the label of the file
+        """
+        deps = dict(deps or {})
+        for lab, path in (files or {}).items():
+            key = self.producer(path)
+            if key is not None:
+                deps.setdefault(lab, key)
+        previous = self.index.get(self.head(stage, name))
+        return artifact_entry(stage, name, files, deps, values, params,
+                              previous)
+
+    def has(self, key):
+        """
+        True if artifact `key` is stored, or its output files are as
+        recorded (same size and mtime)
+        """
+        if op.isfile(self.path(key)):
+            return True
+        outputs = (self.index.get(key) or {}).get('outputs')
+        return bool(outputs) and all(_unchanged(rec)
+                                     for rec in outputs.values())
+
+    def load(self, key):
+        """
+        Returns the value of artifact `key`, or None if it is not stored
+        """
+        if not op.isfile(self.path(key)):
+            return None
+        with open(self.path(key), 'rb') as inpt:
+            return pickle.load(inpt)
+
+    def put(self, entry, value=None, outputs=None):
+        """
+        Store `value` as the artifact of `entry`, or record the `outputs`
+        (dict of label: file path) written for it
+        """
+        if outputs:
+            old = (self.index.get(entry['key']) or {}).get('outputs', {})
+            entry = dict(entry, outputs={
+                lab: mf.file_record(path, old.get(lab))
+                for lab, path in outputs.items()})
+        if value is not None:
+            fpath = self.path(entry['key'])
+            temp = fpath + '.tmp'
+            with open(temp, 'wb') as output:
+                pickle.dump(value, output, pickle.HIGHEST_PROTOCOL)
+            if op.isfile(fpath):
+                os.remove(fpath)  # os.rename won't overwrite on Windows
+            os.rename(temp, fpath)
+        self.record(entry)
+
+    def record(self, entry):
+        """
+        Make `entry` (of a stored artifact) the head of its stage and name
+        """
+        old = self.index.get(entry['key']) or {}
+        if 'outputs' not in entry and 'outputs' in old:
+            entry = dict(entry, outputs=old['outputs'])
+        self._producers = None
+        self.index.update(entry['key'], entry)
+        self.heads.update(_head(entry['stage'], entry['name']),
+                          entry['key'])
+
+    def get(self, stage, name, build, files=None, deps=None, values=None,
+            params=None):
+        """
+        Returns the key and value of artifact `name` of `stage`, the value
+        is made by calling `build()` and stored if any of its inputs (see
+        artifact_entry()) changed since it was stored
+        """
+        entry = self.entry(stage, name, files, deps, values, params)
+        value = self.load(entry['key'])
+        if value is None:
+            value = build()
+            self.put(entry, value)
+        else:
+            self.record(entry)
+        return entry['key'], value
+
+    def downstream(self, key):
+        """
+        Keys of the stored artifacts derived from artifact `key`, directly
+        or through other artifacts
+        """
+        users = {}
+        for other, entry in self.index.entries.items():
+            for dep in entry['deps'].values():
+                users.setdefault(dep, []).append(other)
+        found = set()
+        queue = deque([key])
+        while queue:
+            for other in users.get(queue.popleft(), ()):
+                if other not in found:
+                    found.add(other)
+                    queue.append(other)
+        return found
+
+    def stale(self):
+        """
+        Returns the (stage, name) of the head artifacts that are out of
+        date: an input or output file changed, or an upstream artifact is no
+        longer the head of its stage and name, or is itself stale
+        """
+        status = {}
+
+        def is_stale(key):
+            if key not in status:
+                entry = self.index.get(key)
+                status[key] = False  # guards against cycles
+                if entry is None:  # not made by this store
+                    return False
+                status[key] = (
+                    self.heads.get(_head(entry['stage'],
+                                         entry['name'])) != key or
+                    any(not op.isfile(rec['path']) or
+                        mf.file_record(rec['path'], rec)['sha1'] !=
+                        rec['sha1'] for rec in
+                        (list(entry['inputs'].values()) +
+                         list(entry.get('outputs', {}).values()))) or
+                    any(is_stale(dep) for dep in entry['deps'].values()))
+            return status[key]
+
+        heads = [self.index.get(key) for key in self.heads.entries.values()
+                 if key in self.index.entries]
+        return sorted((entry['stage'], entry['name']) for entry in heads
+                      if is_stale(entry['key']))
+
+    def prune(self):
+        """
+        Delete the artifacts that are neither a head nor upstream of one,
+        returns the number deleted. The output files of file artifacts are
+        left alone
+        """
+        keep = set()
+        queue = deque(self.heads.entries.values())
+        while queue:
+            key = queue.popleft()
+            entry = self.index.get(key)
+            if key not in keep:
+                keep.add(key)
+                if entry is not None:
+                    queue.extend(entry['deps'].values())
+        removed = 0
+        for key in list(self.index.entries):
+            if key not in keep:
+                self.index.discard(key)
+                if op.isfile(self.path(key)):
+                    os.remove(self.path(key))
+                removed += 1
+        return removed
+
+    def save(self):
+        """
+        Write the index and heads, call after a batch of get() or put()
+        """
+        self.index.save()
+        self.heads.save()
+
+
+def cached_map(func, files, store=None, stage=None, params=None, jobs=1,
+               chunksize=1, values=None):
+    """
+    Returns a dict of `func((name, path))[1]` for every name, path in
+    `files` (dict), computed by a pool of `jobs` worker processes. `func`
+    returns (name, value) and must be a module level function, a None value
+    marks a failed name which is left out (and not stored). A path may also
+    be a dict of input file paths by label, and with `values` (dict of name:
+    dict of JSON serializable values by label) `func` is called with
+    (name, path, values[name])
+
+    With an ArtifactStore `store` the values are artifacts of `stage` and
+    `params` with the file(s) and values as input, so only the names whose
+    files, values or `params` changed are computed
+    """
+    results = {}
+    entries = {}
+    tasks = []
+    for name, path in sorted(files.items()):
+        task = (name, path) if values is None else (name, path, values[name])
+        if store is not None:
+            entry = store.entry(
+                stage, name,
+                files=path if isinstance(path, dict) else {'input': path},
+                values=None if values is None else values[name],
+                params=params)
+            if store.has(entry['key']):
+                results[name] = store.load(entry['key'])
+                store.record(entry)
+                continue
+            entries[name] = entry
+        tasks.append(task)
+
+    if jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            computed = pool.map(func, tasks, chunksize)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        computed = [func(task) for task in tasks]
+
+    for name, value in computed:
+        if value is None:
+            continue
+        results[name] = value
+        if store is not None:
+            store.put(entries[name], value)
+    if store is not None:
+        store.save()
+    return results
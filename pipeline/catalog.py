@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Module for a persistent SQLite catalog of the pipeline files, refreshed
+incrementally so that repeated searches of a large (network) folder tree
+only list the folders that changed since the last search
+"""
+import os
+import os.path as op
+import fnmatch
+import re
+import sqlite3
+import time
+import traceback
+from collections import defaultdict
+from wrappers import UsageError
+try:
+    from os import scandir
+except ImportError:  # Python 2, use the scandir backport if installed
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+# pylint: disable=C0103
+
+# eg. Norm_YPE_042515_001_RFPstack_000_skeleton.vtk (normalizedVTK) or
+# Normalized_YPE_042515_001_RFPstack_000_mitoskel.vtk (normalize stage)
+NAME_RE = re.compile(r'^(?:Norm_|Normalized_)?'
+                     r'(?P<cellkey>(?:[A-Za-z][A-Za-z0-9]*_)?'
+                     r'(?P<date>\d{6})_\d+_(?P<channel>[A-Z]+)stack_\d+)'
+                     r'(?:_(?P<kind>[A-Za-z]+))?\.\w+$')
+# kinds with another name in the file names of the pipeline
+KINDS = {'mitoskel': 'skeleton'}
+# version of parse_name(), catalog rows parsed by an older one are parsed
+# again when the catalog is opened
+PARSER_VERSION = 2
+
+# folders modified this recently (s) are listed again on the next refresh,
+# as a change within the mtime resolution of the file system goes unseen
+SETTLE = 2.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    media TEXT,
+    date TEXT,
+    cellkey TEXT,
+    channel TEXT,
+    kind TEXT,
+    size INTEGER,
+    mtime REAL);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+"""
+
+
+def parse_name(fname):
+    """
+    Returns a dict of the `date`, `cellkey`, `channel` and `kind` (eg.
+    skeleton, surface, resampled) of pipeline file name `fname`, None for
+    the parts that do not match. The kind of other files is their extension
+    """
+    match = NAME_RE.match(fname)
+    if match:
+        parts = match.groupdict()
+    else:
+        parts = dict.fromkeys(('date', 'cellkey', 'channel', 'kind'))
+    if parts['kind'] is None:
+        parts['kind'] = op.splitext(fname)[1].lstrip('.') or None
+    parts['kind'] = KINDS.get(parts['kind'], parts['kind'])
+    return parts
+
+
+def _listdir(folder):
+    """
+    Returns the subfolders and the (name, size, mtime) of the files in
+    `folder`. Like os.walk(), links to folders are listed but not followed
+    """
+    subdirs, files = [], []
+    if scandir is not None:
+        for entry in scandir(folder):
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            else:
+                stat = entry.stat()
+                files.append((entry.name, stat.st_size, stat.st_mtime))
+    else:
+        for name in os.listdir(folder):
+            fpath = op.join(folder, name)
+            if op.isdir(fpath):
+                if not op.islink(fpath):
+                    subdirs.append(fpath)
+            else:
+                stat = os.stat(fpath)
+                files.append((name, stat.st_size, stat.st_mtime))
+    return subdirs, files
+
+
+def _under(column):
+    # rows of `column` that are the folder (first ?) or below it (second ?)
+    return '({0} = ? OR substr({0}, 1, length(?)) = ?)'.format(column)
+
+
+class FileCatalog(object):
+    """
+    SQLite catalog of the files below any folder searched with it, with
+    their media (parent folder), date, cell key, channel, kind, size and
+    mtime. A search first refreshes the folder: only folders whose mtime
+    changed are listed again, the others are taken from the catalog
+
+    Parameters
+    ----------
+    dbpath : str
+        path of the SQLite file, created if needed
+    """
+    def __init__(self, dbpath):
+        self.dbpath = dbpath
+        self.conn = sqlite3.connect(dbpath)
+        self.conn.text_factory = str  # byte string paths as os.walk on 2.x
+        self.conn.executescript(_SCHEMA)
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] < \
+                PARSER_VERSION:
+            self._reparse()
+
+    def _reparse(self):
+        """
+        Parse the names of all cataloged files again, see PARSER_VERSION
+        """
+        rows = []
+        for path, name in self.conn.execute('SELECT path, name FROM files'):
+            parts = parse_name(name)
+            rows.append((parts['date'], parts['cellkey'], parts['channel'],
+                         parts['kind'], path))
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE files SET date = ?, cellkey = ?, channel = ?, '
+                'kind = ? WHERE path = ?', rows)
+            self.conn.execute('PRAGMA user_version = {:d}'
+                              .format(PARSER_VERSION))
+
+    def close(self):
+        """
+        Close the database
+        """
+        self.conn.close()
+
+    @staticmethod
+    def _args(folder):
+        return (folder, folder.rstrip(os.sep) + os.sep,
+                folder.rstrip(os.sep) + os.sep)
+
+    def refresh(self, ddir, full=False):
+        """
+        Update the catalog of the files below `ddir`, listing every folder
+        if `full` (eg. after files were rewritten in place, which does not
+        change the mtime of their folder)
+        """
+        root = op.abspath(ddir)
+        known = dict(self.conn.execute(
+            'SELECT path, mtime FROM dirs WHERE ' + _under('path'),
+            self._args(root)))
+        children = defaultdict(list)
+        for path in known:
+            children[op.dirname(path)].append(path)
+
+        seen = set()
+        stack = [root]
+        now = time.time()
+        with self.conn:
+            while stack:
+                folder = stack.pop()
+                try:
+                    mtime = os.stat(folder).st_mtime
+                except OSError:
+                    continue
+                seen.add(folder)
+                if not full and known.get(folder) == mtime:
+                    stack.extend(children[folder])
+                    continue
+                subdirs, files = _listdir(folder)
+                stack.extend(subdirs)
+                self._update(folder, files)
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO dirs VALUES (?, ?)',
+                    (folder, mtime if now - mtime > SETTLE else None))
+
+            gone = [(path,) for path in known if path not in seen]
+            self.conn.executemany('DELETE FROM dirs WHERE path = ?', gone)
+            self.conn.executemany('DELETE FROM files WHERE dir = ?', gone)
+
+    def _update(self, folder, files):
+        """
+        Replace the catalog rows of `folder` that changed by `files`
+        """
+        old = {name: (size, mtime) for name, size, mtime
+               in self.conn.execute(
+                   'SELECT name, size, mtime FROM files WHERE dir = ?',
+                   (folder,))}
+        names = set(name for name, _, _ in files)
+        self.conn.executemany(
+            'DELETE FROM files WHERE path = ?',
+            [(op.join(folder, name),) for name in old if name not in names])
+        rows = []
+        media = op.basename(folder)
+        for name, size, mtime in files:
+            if old.get(name) == (size, mtime):
+                continue
+            parts = parse_name(name)
+            rows.append((op.join(folder, name), folder, name, media,
+                         parts['date'], parts['cellkey'], parts['channel'],
+                         parts['kind'], size, mtime))
+        self.conn.executemany('INSERT OR REPLACE INTO files VALUES '
+                              '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def query(self, ddir, txt='*', refresh=True, **fields):
+        """
+        Returns a list of (folder, file name) of the files below `ddir`
+        whose name matches `txt` (fnmatch, shell format) and whose catalog
+        `fields` (eg. media='YPE', kind='skeleton') are equal to the given
+        values. Folders are given relative to `ddir` as by os.walk()
+        """
+        if refresh:
+            self.refresh(ddir)
+        root = op.abspath(ddir)
+        sql = 'SELECT dir, name FROM files WHERE ' + _under('dir')
+        args = list(self._args(root))
+        for key in sorted(fields):
+            if key not in ('media', 'date', 'cellkey', 'channel', 'kind'):
+                raise ValueError('unknown catalog field {}'.format(key))
+            sql += ' AND {} = ?'.format(key)
+            args.append(fields[key])
+        out = []
+        for folder, name in self.conn.execute(sql + ' ORDER BY path', args):
+            if fnmatch.fnmatch(name, txt):
+                rel = folder[len(root):].lstrip(os.sep)
+                out.append((op.join(ddir, rel) if rel else ddir, name))
+        return out
+
+    def swalk(self, ddir, txt, start=None, stop=None):
+        """
+        Catalog version of wrappers.swalk(), same arguments and result
+        """
+        vtf = {f[start:stop]: op.join(root, f)
+               for root, f in self.query(ddir, txt)}
+        if len(vtf):
+            return vtf
+        traceback.print_stack(limit=5)
+        raise UsageError('Search for file with ext. {} in dir {} failed'
+                         .format(txt, ddir))
+
+    def ddwalk(self, ddir, txt, start=None, stop=None):
+        """
+        Catalog version of wrappers.ddwalk(), same arguments and result
+        """
+        vtf = defaultdict(dict)
+        for root, f in self.query(ddir, txt):
+            media = root.rsplit(os.sep, 1)[1]
+            vtf[media][f[start:stop]] = op.join(root, f)
+        if len(vtf):
+            return vtf
+        traceback.print_stack(limit=5)
+        raise UsageError('Search for file with ext. {} in dir {} failed'
+                         .format(txt, ddir))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Module for a compact, array backed graph of a cell's mito network, that is
+only converted to a networkx graph when needed
+"""
+import numpy as np
+import networkx as nx
+from scipy import sparse
+# pylint: disable=C0103
+
+
+class CellGraph(object):
+    """
+    Mito network of cell `name` as arrays. Nodes are numbered 0..N-1 and
+    edges (one per skeleton line) 0..E-1, the neighbors of node `n` are
+    `indices[indptr[n]:indptr[n+1]]` (CSR adjacency), joined by edges
+    `edge_ids[indptr[n]:indptr[n+1]]`. A self loop appears twice in the row
+    of its node, so the row lengths are the networkx degrees
+
+    Parameters
+    ----------
+    name : str
+        cell name, the `cell` graph attribute in networkx
+    coords, inten : Numpy array
+        coordinates (N x 3) and intensity of each node
+    edges : Numpy array
+        node pair (E x 2) of each edge
+    weight, cellid : Numpy array
+        length and skeleton line id of each edge
+    midpoint : Numpy array
+        midpoint (E x 3) of the endpoints of each edge
+    """
+    __slots__ = ('name', 'coords', 'inten', 'edges', 'weight', 'cellid',
+                 'midpoint', 'indptr', 'indices', 'edge_ids', '_nx')
+
+    def __init__(self, name, coords, inten, edges, weight, cellid,
+                 midpoint):
+        self.name = name
+        self.coords = np.asarray(coords)
+        self.inten = np.asarray(inten)
+        self.edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+        self.weight = np.asarray(weight)
+        self.cellid = np.asarray(cellid, dtype=int)
+        self.midpoint = np.asarray(midpoint)
+        self._nx = None
+
+        nedges = len(self.edges)
+        src = np.r_[self.edges[:, 0], self.edges[:, 1]]
+        dst = np.r_[self.edges[:, 1], self.edges[:, 0]]
+        order = np.lexsort((dst, src))
+        self.indptr = np.r_[0, np.cumsum(
+            np.bincount(src, minlength=len(self.coords)))]
+        self.indices = dst[order]
+        self.edge_ids = np.r_[np.arange(nedges), np.arange(nedges)][order]
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__ if k != '_nx'}
+
+    def __setstate__(self, state):
+        for k in state:
+            setattr(self, k, state[k])
+        self._nx = None
+
+    @classmethod
+    def from_networkx(cls, G):
+        """
+        CellGraph of a networkx graph returned by make_networkx.makegraph()
+        """
+        nodes = sorted(G.nodes())
+        edges = sorted(G.edges(data=True), key=lambda e: e[2]['cellID'])
+        return cls(G.graph['cell'],
+                   [G.node[n]['coord'] for n in nodes],
+                   [G.node[n]['inten'] for n in nodes],
+                   [(u, v) for u, v, _ in edges],
+                   [attr['weight'] for _, _, attr in edges],
+                   [attr['cellID'] for _, _, attr in edges],
+                   [attr['midpoint'] for _, _, attr in edges])
+
+    @property
+    def degree(self):
+        """
+        Degree of each node
+        """
+        return np.diff(self.indptr)
+
+    def number_of_nodes(self):
+        """
+        Number of nodes
+        """
+        return len(self.coords)
+
+    def number_of_edges(self):
+        """
+        Number of edges
+        """
+        return len(self.edges)
+
+    def neighbors(self, n):
+        """
+        Neighbors of node `n`, once per edge joining them
+        """
+        return self.indices[self.indptr[n]:self.indptr[n + 1]]
+
+    def adjacency(self):
+        """
+        Returns the CSR adjacency matrix as a simple graph, ie. without self
+        loops and with parallel edges merged
+        """
+        n = self.number_of_nodes()
+        rows = np.repeat(np.arange(n), self.degree)
+        keep = rows != self.indices
+        adj = sparse.coo_matrix((np.ones(keep.sum()),
+                                 (rows[keep], self.indices[keep])),
+                                shape=(n, n)).tocsr()
+        adj.data[:] = 1.
+        return adj
+
+    def to_networkx(self):
+        """
+        Returns the graph as a networkx MultiGraph with the node (`coord`,
+        `inten`, `degree`) and edge (`weight`, `cellID`, `midpoint`)
+        attributes of make_networkx.makegraph(). Built on first use only
+        """
+        if self._nx is None:
+            G = nx.MultiGraph(cell=self.name)
+            degree = self.degree
+            for n in range(self.number_of_nodes()):
+                G.add_node(n, coord=tuple(self.coords[n]),
+                           inten=self.inten[n], degree=int(degree[n]))
+            G.add_edges_from((u, v, {'weight': self.weight[i],
+                                     'cellID': int(self.cellid[i]),
+                                     'midpoint': tuple(self.midpoint[i])})
+                             for i, (u, v) in enumerate(self.edges.tolist()))
+            self._nx = G
+        return self._nx
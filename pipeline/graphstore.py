@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Module for a per-cell cache of CellGraphs, addressed by the content of the
+skeleton VTK file and the graph build parameters, so a graph can never be
+out of date with its skeleton
+"""
+import os
+import os.path as op
+import cPickle as pickle
+import traceback
+from pipeline import manifest as mf
+from pipeline import profiling as prof
+from pipeline.make_networkx import cellgraph
+from pipeline.vtkio import read_polydata
+# pylint: disable=C0103
+
+
+def graph_entry(cell, vtkpath, scalartype='DY_raw', tol=0., previous=None):
+    """
+    Returns the store entry of the graph of `cell` built from skeleton
+    `vtkpath` with `scalartype` and endpoint tolerance `tol`,
+    `entry['graph']` is its file name. The skeleton is only re-hashed if it
+    changed since the `previous` entry
+    """
+    previous = (previous or {}).get('inputs', {})
+    params = {'scalartype': scalartype}
+    if tol:  # keeps the keys of exact graphs stored before tol existed
+        params['tol'] = tol
+    entry = {'inputs': {'skel': mf.file_record(vtkpath,
+                                               previous.get('skel'))},
+             'params': mf.value_digest(params)}
+    # the graph is named by cell, so it is part of the key
+    key = mf.value_digest([cell,
+                           entry['inputs']['skel']['sha1'],
+                           entry['params']])
+    entry['graph'] = '{}.pkl'.format(key)
+    return entry
+
+
+class GraphStore(object):
+    """
+    Folder of pickled CellGraphs, one file per graph named by the SHA1 of
+    its skeleton file contents and build parameters. `index.json` maps cell
+    names to their latest entry, so unchanged skeletons are not re-hashed
+
+    Parameters
+    ----------
+    folder : str
+        path of the store, created if needed
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        if not op.isdir(folder):
+            os.makedirs(folder)
+        self.index = mf.Manifest(op.join(folder, 'index.json'))
+
+    def entry(self, cell, vtkpath, scalartype='DY_raw', tol=0.):
+        """
+        Returns the entry of the graph of `cell`, see graph_entry()
+        """
+        return graph_entry(cell, vtkpath, scalartype, tol,
+                           self.index.get(cell))
+
+    def has(self, entry):
+        """
+        True if the graph of `entry` is stored
+        """
+        return op.isfile(op.join(self.folder, entry['graph']))
+
+    def load(self, entry):
+        """
+        Returns the CellGraph of `entry`, or None if it is not stored
+        """
+        if not self.has(entry):
+            return None
+        with open(op.join(self.folder, entry['graph']), 'rb') as inpt:
+            return pickle.load(inpt)
+
+    def put(self, cell, entry, graph):
+        """
+        Store CellGraph `graph` of `cell` under `entry`
+        """
+        fpath = op.join(self.folder, entry['graph'])
+        temp = fpath + '.tmp'
+        with open(temp, 'wb') as output:
+            pickle.dump(graph, output, pickle.HIGHEST_PROTOCOL)
+        if op.isfile(fpath):
+            os.remove(fpath)  # os.rename won't overwrite on Windows
+        os.rename(temp, fpath)
+        self.index.update(cell, entry)
+
+    def get(self, cell, vtkpath, scalartype='DY_raw', tol=0.):
+        """
+        Returns the CellGraph of `cell` for skeleton `vtkpath`, built and
+        stored if the skeleton, `scalartype` or `tol` changed since it was
+        stored
+        """
+        entry = self.entry(cell, vtkpath, scalartype, tol)
+        graph = self.load(entry)
+        if graph is None:
+            graph = cellgraph(read_polydata(vtkpath), cell, scalartype, tol)
+            self.put(cell, entry, graph)
+        else:
+            self.index.update(cell, entry)
+        return graph
+
+    def save(self):
+        """
+        Write the index, call after a batch of get() or put()
+        """
+        self.index.save()
+
+
+def _graph_task(args):
+    """
+    Pool worker for build_graphs(), returns the cell, its entry and its
+    CellGraph, which is None if already stored. Failures are returned as a
+    traceback string so that one bad skeleton does not stop the batch
+    """
+    cell, vtkpath, scalartype, tol, folder, previous = args
+    try:
+        entry = graph_entry(cell, vtkpath, scalartype, tol, previous)
+        if op.isfile(op.join(folder, entry['graph'])):
+            return cell, entry, None, None
+        with prof.span('graph_cell', 'cell', cell=cell):
+            graph = cellgraph(read_polydata(vtkpath), cell, scalartype, tol)
+        return cell, entry, graph, None
+    except Exception:  # pylint: disable=W0703
+        return cell, None, None, traceback.format_exc()
+
+
+def build_graphs(store, paths, jobs=1, chunksize=1, scalartype='DY_raw',
+                 tol=0., artifacts=None):
+    """
+    Build the CellGraphs of all skeletons `paths` (dict of cell: VTK file
+    path) that are not yet in GraphStore `store`, with `scalartype` and
+    endpoint tolerance `tol` (see make_networkx.makegraph()). A pool of
+    `jobs` worker processes is handed `chunksize` cells at a time, workers
+    return CellGraphs (arrays only) which are stored as they arrive. With an
+    ArtifactStore `artifacts` each graph file is recorded as a `graph`
+    artifact, depending on the artifact that made its skeleton if any
+
+    Returns
+    -------
+    failed : dict
+        error tracebacks keyed by cell
+    """
+    tasks = [(cell, paths[cell], scalartype, tol, store.folder,
+              store.index.get(cell)) for cell in sorted(paths)]
+    failed = {}
+
+    def handle(result):
+        cell, entry, graph, error = result
+        if error is not None:
+            failed[cell] = error
+            return cell, 'FAILED', False
+        if graph is None:
+            store.index.update(cell, entry)
+        else:
+            store.put(cell, entry, graph)
+        if artifacts is not None:
+            artifacts.put(
+                artifacts.entry('graph', cell,
+                                files={'skel': paths[cell]},
+                                params={'scalartype': scalartype,
+                                        'tol': tol}),
+                outputs={'graph': op.join(store.folder, entry['graph'])})
+        return cell, 'up to date' if graph is None else 'built', graph is None
+
+    mf.map_cells(_graph_task, tasks, handle, [store, artifacts], jobs,
+                 chunksize)
+
+    for cell in sorted(failed):
+        print ("{} failed:\n{}".format(cell, failed[cell]))
+    return failed
@@ -2,82 +2,134 @@
 Module to create mitonetwork in graph representation, with nodes, edges and
 their respective attributes
 """
-import os
+import sys
 import os.path as op
-import cPickle as pickle
+import argparse
+import itertools
+from collections import defaultdict
 import numpy as np
-import networkx as nx
-import vtk
-from tvtk.api import tvtk
 import wrappers as wr
+from pipeline import profiling as prof
+from pipeline.cellgraph import CellGraph
+from pipeline.polylines import PolylineTable
 # pylint: disable=C0103
 
 
-def find_edges(X, Y, M):
+def merge_endpoints(ends, tol):
     """
-    find connections between line segment endpoints in list X and Y
+    Returns a label for each endpoint in `ends`, the lowest index of the
+    endpoints it is merged with. Endpoints closer than `tol` are merged, and
+    so are chains of such endpoints (single linkage). Candidates are found
+    with a spatial hash on a uniform grid of cell size `tol`, so only the
+    endpoints in the 27 surrounding cells are compared
     """
-    n1 = X[:, np.newaxis]-M
-    n2 = Y[:, np.newaxis]-M
-    test1 = np.ravel([np.nonzero(np.all(n == 0, axis=1)) for n in n1])
-    test2 = np.ravel([np.nonzero(np.all(n == 0, axis=1)) for n in n2])
-    e_list = [tuple(sorted(i)) for i in zip(test1, test2)]
-    return e_list
+    pts = ends.tolist()
+    cells = [tuple(c) for c in np.floor(ends / tol).astype(int).tolist()]
+    near = list(itertools.product((-1, 0, 1), repeat=ends.shape[1]))
+    parent = list(range(len(pts)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    grid = defaultdict(list)
+    for i, cell in enumerate(cells):
+        for off in near:
+            for j in grid.get(tuple(c + o for c, o in zip(cell, off)), ()):
+                if sum((a - b)**2 for a, b in zip(pts[i], pts[j])) <= tol**2:
+                    ri, rj = root(i), root(j)
+                    parent[max(ri, rj)] = min(ri, rj)
+        grid[cell].append(i)
+    return np.array([root(i) for i in range(len(pts))], dtype=int)
+
+
+def endpoint_labels(ends, tol=0.):
+    """
+    Returns a label for each endpoint in `ends`, the lowest index of the
+    endpoints at the same coordinate, or within `tol` if `tol` > 0 (see
+    merge_endpoints())
+    """
+    if tol > 0:
+        return merge_endpoints(ends, tol)
+    # sort by coordinates, lexsort is stable so each run of equal
+    # coordinates starts at its lowest endpoint index
+    order = np.lexsort(ends.T[::-1])
+    srtd = ends[order]
+    new = np.ones(len(order), dtype=bool)
+    new[1:] = np.any(srtd[1:] != srtd[:-1], axis=1)
+    labels = np.empty_like(order)
+    labels[order] = order[new][np.cumsum(new) - 1]
+    return labels
+
+
+def endpoint_nodes(X, Y, tol=0.):
+    """
+    Returns the nodes of line segments with first points `X` and last points
+    `Y`, one node per distinct endpoint coordinate, and the edge of each line.
+    With `tol` > 0 endpoints within `tol` of each other share a node (see
+    merge_endpoints()), eg. for skeletons that were transformed or rounded
 
+    Endpoints are indexed `2 * line` for the first and `2 * line + 1` for the
+    last point of a line. A node comes from the lowest endpoint index at its
+    coordinate, and nodes are numbered by descending line, first point
+    before last point
 
-def make_ebunch(e_list, vtkdat, pnts, X, Y):
-    """
-    returns the edge attributes (edge length, etc.) from the edgelist e_list
-    returned by find_edges
+    Returns
+    -------
+    node_ends : array
+        endpoint index of each node
+    e_list : list
+        pair of nodes of each line, smaller node first
     """
-    ebunch = {}
-    for i, el in enumerate(e_list):
-        p = vtkdat.GetCell(i).GetPointIds()
-        pids = [p.GetId(k) for k in range(p.GetNumberOfIds())]
-
-        # calc length of line by shifting line by one pixel and taking diff.
-        # of every pixel of the pair of lines
-        length = np.sum(np.linalg.norm(pnts[np.r_[0, pids[:-1]]][1:] -
-                                       pnts[pids][1:],
-                                       axis=1))
-        ebunch[i] = (el[0], el[1],
-                     {'weight': length,
-                      'cellID': i,
-                      'midpoint': tuple((X[i]+Y[i])/2)})
-    return ebunch
-
-
-def check_exist(bounds, l1, l2, ex_dic=None):
+    ends = np.column_stack((X, Y)).reshape(-1, X.shape[1])
+    node_ends, inverse = np.unique(endpoint_labels(ends, tol),
+                                   return_inverse=True)
+
+    numbering = np.lexsort((node_ends % 2, -(node_ends // 2)))
+    rank = np.empty_like(numbering)
+    rank[numbering] = np.arange(len(numbering))
+    e_list = [tuple(sorted(e)) for e in rank[inverse].reshape(-1, 2).tolist()]
+    return node_ends[numbering], e_list
+
+
+@prof.timed(cat='graph')
+def cellgraph(vtkdata, graphname, scalartype='DY_raw', tol=0.):
     """
-    Check for existence of a connection between nodes.
-    `a, b, c` and `d` are all the possible connections between the endpoints
-    of lines `p1` and `p2`. Check each point for the connectiongs if they
-    coincide (same coordinates).
-
-    Returns:
-    --------
-    Dictionary of type (eg. 'a') as `True` if a connection exist for the type
+    Return the CellGraph of the vtk skel, see makegraph() for the parameters
     """
-    if ex_dic is None:
-        ex_dic = {}
-    a = l1[bounds] - l2[:bounds]
-    b = l1[bounds] - l1[:bounds]
-    c = l2[bounds] - l1[:bounds]
-    d = l2[bounds] - l2[:bounds]
-    dics = {'a': a, 'b': b, 'c': c, 'd': d}
-    for key in sorted(dics):
-        ex_dic[key] = np.any(np.all(dics[key] == 0, axis=1))
-    return ex_dic
-
-
-def makegraph(vtkdata, graphname, scalartype='DY_raw'):
+    table = PolylineTable.from_polydata(vtkdata, [scalartype])
+    scalars = table.columns[scalartype]
+
+    starts = table.offsets[:-1]  # first point of each line in table
+    ends = table.offsets[1:] - 1  # last point of each line in table
+    fp = table.xyz[starts]  # first point coordinates
+    lp = table.xyz[ends]  # last point coordinates
+
+    # Create nodes of graph, coincident endpoints share a node
+    node_ends, edges = endpoint_nodes(fp, lp, tol)
+    node_rows = np.column_stack((starts, ends)).ravel()[node_ends]
+
+    # one edge per line
+    return CellGraph(graphname,
+                     table.xyz[node_rows],
+                     scalars[node_rows],
+                     edges,
+                     table.lengths(),
+                     np.arange(len(table)),
+                     (fp + lp) / 2)
+
+
+@prof.timed(cat='graph')
+def makegraph(vtkdata, graphname, scalartype='DY_raw', tol=0.):
     """
     Return networkX graph object from vtk skel
 
     Parameters
     ----------
     vtkdata: vtkPolyData
-        must use VTK, not tvtk (conversion is handled in function)
+        VTK or tvtk polydata
 
     graphname : str
         name for graph
@@ -92,6 +144,10 @@ def makegraph(vtkdata, graphname, scalartype='DY_raw'):
         bkstRFP,
         bkstGFP,
 
+    tol : float
+        endpoints closer than `tol` are merged into one node, the default 0
+        only merges identical coordinates
+
     Returns
     -------
     nds, edgs : list
@@ -99,73 +155,45 @@ def makegraph(vtkdata, graphname, scalartype='DY_raw'):
     G : networkX
         `NetworkX` graph object
     """
-    nnodes = 0
-    first = {}
-    last = {}
-    scalars = tvtk.to_tvtk(
-        vtkdata.GetPointData().GetScalars(scalartype)).to_array()
-    points = tvtk.to_tvtk(vtkdata.GetPoints()).to_array()
-    G = nx.MultiGraph(cell=graphname)
-
-    for i in range(vtkdata.GetNumberOfCells()):
-        temp = vtkdata.GetCell(i).GetPointIds()
-        mx = temp.GetNumberOfIds()
-        first[i] = temp.GetId(0)   # first point ids dictionary
-        last[i] = temp.GetId(mx-1)  # last point ids dictionary
-    fp = points[first.values()]  # first point coordinates
-    lp = points[last.values()]  # last point coordinates
-
-    # Create node list of graph
-    for i in range(vtkdata.GetNumberOfLines()-1, -1, -1):
-        exist = check_exist(i, fp, lp)
-        # test for a single pixel
-        exist['single_pt'] = np.all((fp[i] - lp[i]) == 0)
-        inten1 = scalars[first[i]]
-        inten2 = scalars[last[i]]
-        # only add a node if there is no connection to another endpoint
-        if not (exist['a'] or exist['b']):
-            G.add_node(nnodes, coord=tuple(fp[i]), inten=inten1)
-            nnodes += 1
-        if not (exist['c'] or exist['d'] or exist['single_pt']):
-            G.add_node(nnodes, coord=tuple(lp[i]), inten=inten2)
-            nnodes += 1
-
-    # Create edgelist of graph
-    Ncoords = np.array([nat['coord'] for n, nat in G.nodes(data=True)])
-    edges = find_edges(fp, lp, Ncoords)
-    ebunch = make_ebunch(edges, vtkdata, points, fp, lp)
-    G.add_edges_from(ebunch.values())
-
-    # Degree connectivity of nodes
-    for n in G.nodes():
-        G.node[n]['degree'] = G.degree(n)
+    G = cellgraph(vtkdata, graphname, scalartype, tol).to_networkx()
     return G.nodes(data=True), G.edges(data=True), G
 
-# ===========================================================================
+
+def main(argv=None):
+    """
+    Build the graph of every normalized skeleton into the graph store
+    """
+    from pipeline.artifacts import ArtifactStore
+    from pipeline.graphstore import GraphStore, build_graphs
+    from pipeline.catalog import FileCatalog
+    parser = argparse.ArgumentParser(
+        description='Build the mito network graphs of normalized skeletons')
+    parser.add_argument('basedir', nargs='?', default='mutants',
+                        help='folder with a normalizedVTK subfolder, graphs '
+                        'are stored in its graphs subfolder')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (default 1)')
+    parser.add_argument('-c', '--chunksize', type=int, default=1,
+                        help='cells handed to a worker at a time')
+    parser.add_argument('-t', '--tol', type=float, default=0.,
+                        help='merge endpoints closer than this (default 0, '
+                        'identical coordinates only)')
+    args = parser.parse_args(argv)
+
+    catalog = FileCatalog(op.join(args.basedir, 'catalog.sqlite'))
+    vtkF = wr.ddwalk(op.join(args.basedir, 'normalizedVTK'),
+                     '*skeleton.vt[kp]', start=5, stop=-13, catalog=catalog)
+    catalog.close()
+    # cell keys are unique across media
+    paths = {files: vtkF[mediatype][files]
+             for mediatype in vtkF for files in vtkF[mediatype]}
+    print 'building graphs of %d files' % len(paths)
+    store = GraphStore(op.join(args.basedir, 'graphs'))
+    failed = build_graphs(store, paths, jobs=max(args.jobs, 1),
+                          chunksize=max(args.chunksize, 1), tol=args.tol,
+                          artifacts=ArtifactStore(op.join(args.basedir,
+                                                          'artifacts')))
+    return 1 if failed else 0
+
 if __name__ == '__main__':
-    # writes out a pickle file containing the graph list of every file for
-    # for each mediatype
-    datadir = op.join(os.getcwd(), 'mutants')
-    rawdir = op.join(os.getcwd(), 'mutants')
-    vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
-                     '*skeleton.vtk', start=5, stop=-13)
-
-    for mediatype in sorted(vtkF.keys())[:]:
-        nlist = []
-        elist = []
-        glist = []
-        print 'creating edge node lists for %s' % mediatype
-        print'number of files = %-3d\n' % len(vtkF[mediatype])
-        for files in sorted(vtkF[mediatype].keys())[:]:
-            reader = vtk.vtkPolyDataReader()
-            reader.SetFileName(vtkF[mediatype][files])
-            reader.Update()
-            data = reader.GetOutput()
-
-            node_data, edge_data, nxgrph = makegraph(data, files)
-            nlist.append(node_data)
-            elist.append(edge_data)
-            glist.append(nxgrph)
-        filename = op.join(datadir, '%s_grph.pkl' % mediatype)
-        with open(filename, 'wb') as output:
-            pickle.dump((nlist, elist, glist), output)
+    sys.exit(main())
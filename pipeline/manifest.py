@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Module for tracking the inputs of pipeline outputs with content hashes, so
+that outputs whose inputs have not changed can be skipped on a re-run, and
+for running the cells of a batch with periodic saves of their manifests
+"""
+import os
+import os.path as op
+import hashlib
+import json
+import multiprocessing
+import time
+# pylint: disable=C0103
+
+
+def file_digest(fpath, blocksize=2**20):
+    """
+    Returns the SHA1 hex digest of the contents of file `fpath`
+    """
+    sha = hashlib.sha1()
+    with open(fpath, 'rb') as inpt:
+        block = inpt.read(blocksize)
+        while block:
+            sha.update(block)
+            block = inpt.read(blocksize)
+    return sha.hexdigest()
+
+
+def value_digest(obj):
+    """
+    Returns the SHA1 hex digest of a JSON serializable object `obj` (eg. a
+    dict of parameters), independent of key order
+    """
+    text = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def file_record(fpath, previous=None):
+    """
+    Returns a dict of the path, size, mtime and digest of file `fpath`.
+
+    The digest of a `previous` record is reused when the path, size and mtime
+    are unchanged, so files are only re-hashed when they have been touched
+    """
+    stat = os.stat(fpath)
+    record = {'path': op.abspath(fpath),
+              'size': stat.st_size,
+              'mtime': stat.st_mtime}
+    if previous and all(previous.get(k) == record[k] for k in record):
+        record['sha1'] = previous['sha1']
+    else:
+        record['sha1'] = file_digest(fpath)
+    return record
+
+
+def _contents(entry):
+    inputs = entry.get('inputs', {})
+    return ({k: inputs[k]['sha1'] for k in inputs},
+            {k: entry[k] for k in entry if k != 'inputs'})
+
+
+def same_inputs(entry, previous):
+    """
+    True if the manifest entries `entry` and `previous` were made from
+    identical input contents and parameters (paths and mtimes are ignored)
+    """
+    return bool(previous) and _contents(entry) == _contents(previous)
+
+
+class Manifest(object):
+    """
+    JSON manifest of output entries keyed by cell, stored at `fpath`.
+    Entries are dicts of `inputs` (from file_record()) and any other
+    digests of values the output depends on
+    """
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.entries = {}
+        if op.isfile(fpath):
+            with open(fpath, 'r') as inpt:
+                self.entries = json.load(inpt)
+
+    def get(self, key):
+        """
+        Returns the entry for `key`, or None if there is no entry
+        """
+        return self.entries.get(key)
+
+    def update(self, key, entry):
+        """
+        Record `entry` for `key`, call save() to write the manifest
+        """
+        self.entries[key] = entry
+
+    def discard(self, key):
+        """
+        Remove the entry for `key`, eg. when its output failed
+        """
+        self.entries.pop(key, None)
+
+    def save(self):
+        """
+        Write the manifest, via a temporary file so that an interrupted run
+        never leaves a truncated manifest behind
+        """
+        temp = self.fpath + '.tmp'
+        with open(temp, 'w') as out:
+            json.dump(self.entries, out, indent=1, sort_keys=True)
+        if op.isfile(self.fpath):
+            os.remove(self.fpath)  # os.rename won't overwrite on Windows
+        os.rename(temp, self.fpath)
+
+
+def map_cells(func, tasks, handle, saves, jobs=1, chunksize=1, interval=10):
+    """
+    Run pool worker `func` on every task of `tasks` with a pool of `jobs`
+    worker processes, handed `chunksize` tasks at a time, and pass each
+    result to `handle` as it arrives. `handle` returns the cell, its status
+    and True if it was skipped, printed as a progress line with the rate of
+    computed cells. The `saves` (eg. Manifest, None is ignored) are saved
+    every `interval` seconds and when the batch ends or fails, so an
+    interrupted batch resumes where it stopped
+    """
+    saves = [obj for obj in saves if obj is not None]
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap_unordered(func, tasks, chunksize)
+    else:
+        pool = None
+        results = (func(task) for task in tasks)
+
+    start = lastsave = time.time()
+    nskip = 0
+    try:
+        for count, result in enumerate(results, 1):
+            cell, status, skipped = handle(result)
+            nskip += skipped
+            print ("[{:>{w}}/{}] {} {} ({:.2f} cells/s)".format(
+                count, len(tasks), cell, status,
+                (count - nskip) / (time.time() - start),
+                w=len(str(len(tasks)))))
+            if time.time() - lastsave > interval:
+                for obj in saves:
+                    obj.save()
+                lastsave = time.time()
+    finally:
+        for obj in saves:
+            obj.save()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
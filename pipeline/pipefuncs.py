@@ -7,9 +7,29 @@ import os
 import os.path as op
 import vtk
 import vtk.util.numpy_support as vnpy
-from numpy import ceil, mean, percentile
+import numpy as np
+from numpy import ceil, percentile
+from scipy import ndimage
+from pipeline import profiling as prof
+from pipeline.vtkio import (Volume, crop_volume, read_volume,
+                            write_polydata)
 # pylint: disable=C0103
 datadir = op.join(os.getcwd())
+# voxel offset stencils for _pointcloud(), keyed by (radius, spacing)
+_STENCILS = {}
+# VoxelHistograms of memory-mapped volumes, see voxel_histogram()
+_HISTOGRAMS = {}
+# names of the arrays in the normalized skeletons, which the graph, fit and
+# munge steps read (make_networkx, fitDistr, MungeDataSet), by the name of
+# the value in normalize_skel()
+LEGACY_NAMES = {'normalized_dy': 'DY_minmax',
+                'unscaled_dy': 'DY_raw',
+                'ch1_bckgrnd': 'bkstGFP',
+                'ch2_bckgrnd': 'bkstRFP',
+                'width_eqv': 'WidthEq',
+                'tubewidth': 'TubeWidth',
+                'vox_ch1': 'rGFP',
+                'vox_ch2': 'rRFP'}
 
 
 def vtk_read(fpath, readertype='vtkPolyDataReader'):
@@ -23,6 +43,7 @@ def vtk_read(fpath, readertype='vtkPolyDataReader'):
     return data
 
 
+@prof.timed(cat='normalize')
 def point_cloud_scalars(skelpath, ch1path, ch2path, **kwargs):
     """
     Returns scalar values from voxels data (eg. *resampledVTK*) lying within
@@ -33,66 +54,354 @@ def point_cloud_scalars(skelpath, ch1path, ch2path, **kwargs):
     skelpath, ch1path, ch2path : str
         filepaths to skeleton and volume/voxels VTK output of respective
         channels to be normalized
+    kwargs :
+        see point_cloud_channels()
+    Returns
+    -------
+    polydata : VTK poly
+        polydata object with raw scalar values and width
+    np_voxel1, np_voxel2 : Numpy Array
+        voxel intensities, memory-mapped from binary volume files
+    """
+    polydata, voxels = point_cloud_channels(
+        skelpath, [('ch1', ch1path), ('ch2', ch2path)], **kwargs)
+    return polydata, voxels['ch1'], voxels['ch2']
+
+
+def point_cloud_channels(skelpath, chpaths, **kwargs):
+    """
+    Returns scalar values from the voxels of any number of channels lying
+    within a point cloud of a specified radius for each point. The volumes
+    must share one grid, the clouds are found once and every channel is
+    sampled from the same voxels
+
+    Parameters
+    ----------
+    skelpath : str
+        filepath to skeleton VTK file
+    chpaths : list of (str, str) or dict
+        channel labels and filepaths of their volume/voxels VTK output, eg.
+        [('ch1', gfp), ('ch2', rfp), ('ch3', matrix)]. A dict is taken in
+        order of its labels
     kwargs :
         radius value argument (float) for _pointcloud()
 
         *will default use a value of 2.5 pixels*
+
+        radii (list of floats) for a sensitivity analysis of the cloud
+        radius, adds `vox_<label>_r{R}` arrays for each radius R, all sampled
+        in the same pass
+
+        mode (str) of sampling, `sphere` (default) for the mean of the voxels
+        within the radius, or `gaussian` / `box` to sample volumes smoothed
+        with a kernel matching the radius (see _smoothed())
+
+        crop (bool), if True (default) the volumes are cropped to the
+        bounding box of the skeleton plus the cloud radius before sampling,
+        so only that block is read from whole-field acquisitions
+
+        full_background (bool), if True the returned voxels are the whole
+        volumes even when cropping, for a background percentile over the
+        full field (default False)
     Returns
     -------
     polydata : VTK poly
-        polydata object with raw scalar values and width
-    np_voxel1, np_voxel2 : Numpy Array
-        numpy array conversion of VTK voxel intensities
+        polydata object with a `vox_<label>` array per channel and width
+    voxels : dict
+        voxel intensities keyed by channel label, a (z, y, x) view of the
+        cropped block or memory-mapped from the whole binary volume file
     """
+    crop = kwargs.pop('crop', True)
+    full_background = kwargs.pop('full_background', False)
+    if isinstance(chpaths, dict):
+        chpaths = sorted(chpaths.items())
     dataSkel = vtk_read(skelpath)
-    voxels_ch1 = vtk_read(ch1path,
-                          readertype='vtkStructuredPointsReader')
-    voxels_ch2 = vtk_read(ch2path,
-                          readertype='vtkStructuredPointsReader')
-
-    ptcld_ch1, ptcld_ch2 = _pointcloud(dataSkel, voxels_ch1, voxels_ch2,
-                                       **kwargs)
+    volumes = [(label, read_volume(path)) for label, path in chpaths]
+    full = {label: vol.scalars for label, vol in volumes}
+    if crop:
+        lower, upper = _cloud_bounds(dataSkel, volumes[0][1].spacing,
+                                     **kwargs)
+        volumes = [(label, crop_volume(vol, lower, upper))
+                   for label, vol in volumes]
+
+    ptclds = _pointcloud_channels(dataSkel, volumes, **kwargs)
     polydata = vtk.vtkPolyData()
     polydata.SetPoints(dataSkel.GetPoints())
     polydata.SetLines(dataSkel.GetLines())
-    polydata.GetPointData().AddArray(ptcld_ch1)
-    polydata.GetPointData().AddArray(ptcld_ch2)
-    np_voxel1 = vnpy.vtk_to_numpy(voxels_ch1.GetPointData().GetScalars())
-    np_voxel2 = vnpy.vtk_to_numpy(voxels_ch2.GetPointData().GetScalars())
+    for ptcld in ptclds[:len(volumes)]:
+        polydata.GetPointData().AddArray(ptcld)
     polydata.GetPointData().AddArray(dataSkel.
                                      GetPointData().GetScalars('Width'))
-    polydata.GetPointData().GetArray(2).SetName("tubewidth")
-    return polydata, np_voxel1, np_voxel2
+    polydata.GetPointData().GetArray(len(volumes)).SetName("tubewidth")
+    for ptcld in ptclds[len(volumes):]:  # extra radii
+        polydata.GetPointData().AddArray(ptcld)
+    if full_background:
+        voxels = full
+    else:
+        voxels = {label: vol.scalars for label, vol in volumes}
+    return polydata, voxels
 
 
-def _pointcloud(skel, ch1, ch2, radius=2.5):
-    vox_ch2 = vtk.vtkDoubleArray()
-    vox_ch2.SetName("vox_ch2")
-    vox_ch1 = vtk.vtkDoubleArray()
-    vox_ch1.SetName("vox_ch1")
+def _cloud_bounds(skel, spacing, radius=2.5, radii=(), mode='sphere'):
+    """
+    Returns the lower and upper corners of the box holding every voxel that
+    _pointcloud_channels() reads for the points of `skel`
+    """
+    points = vnpy.vtk_to_numpy(skel.GetPoints().GetData()) / .055
+    reach = max([radius] + list(radii))
+    if mode != 'sphere':
+        reach *= 2  # support of the smoothing kernels, see _smoothed()
+    # one voxel more for the ceil() snapping and the interpolation
+    pad = reach + np.max(spacing) + 1
+    return points.min(axis=0) - pad, points.max(axis=0) + pad
 
-    # vtk.pointlocator() used to to find the set of points lying within the
-    # radius of the point of interest, returns results in a list called
-    # result
-    loc = vtk.vtkPointLocator()
-    loc.SetDataSet(ch2)
-    loc.BuildLocator()
 
-    inten_ch1 = ch1.GetPointData().GetScalars().GetTuple1
-    inten_ch2 = ch2.GetPointData().GetScalars().GetTuple1
-    result = vtk.vtkIdList()
+def _stencil(radius, spacing):
+    """
+    Return the integer voxel offsets that can fall within `radius` of a point
+    lying anywhere inside a grid cell of size `spacing`, relative to the
+    cell's lower corner. Offsets are cached per (radius, spacing)
+    """
+    key = (radius, tuple(spacing))
+    if key not in _STENCILS:
+        spacing = np.asarray(spacing, dtype=float)
+        half = [int(ceil(radius / s)) + 1 for s in spacing]
+        offsets = np.mgrid[-half[0]:half[0] + 1,
+                           -half[1]:half[1] + 1,
+                           -half[2]:half[2] + 1].reshape(3, -1).T
+        # closest approach of each offset to a point in the unit cell [0, 1)
+        gap = np.where(offsets < 0, -offsets, np.clip(offsets - 1, 0, None))
+        reach = np.sum((gap * spacing)**2, axis=1) <= radius**2
+        _STENCILS[key] = offsets[reach]
+    return _STENCILS[key]
+
+
+def _grid(vol):
+    """
+    Returns the dimensions, spacing, origin and flat scalars of a Volume or
+    vtkStructuredPoints volume as numpy arrays
+    """
+    if isinstance(vol, Volume):
+        return vol
+    return (np.array(vol.GetDimensions()),
+            np.array(vol.GetSpacing()),
+            np.array(vol.GetOrigin()),
+            vnpy.vtk_to_numpy(vol.GetPointData().GetScalars()))
 
-#   averaging of pts intensity value surrounding each point in skel
-    for n in range(skel.GetNumberOfPoints()):
 
-        pt_of_int = tuple(ceil(i/.055) for i in skel.GetPoint(n))
-        loc.FindPointsWithinRadius(radius, pt_of_int, result)
-        vox_id = [result.GetId(i) for i in range(result.GetNumberOfIds())]
+def _cloud_shells(points, dims, spacing, origin, radius):
+    """
+    Returns an array (points x stencil) of the voxel ids lying within
+    `radius` of each point, padded with -1 where the stencil falls outside
+    the sphere or the volume, and the squared distances of those voxels to
+    their point. The clouds of any smaller radius are nested inside, ie. the
+    ids whose distance is within that radius
+    """
+    pos = (points - origin) / spacing  # continuous voxel index coordinates
+    base = np.floor(pos).astype(int)
+    idx = base[:, np.newaxis, :] + _stencil(radius, spacing)
+    delta = origin + idx * spacing - points[:, np.newaxis, :]
+    dist2 = np.sum(delta**2, axis=2)
+    inside = ((dist2 <= radius**2) &
+              np.all((idx >= 0) & (idx < dims), axis=2))
+    # VTK point ids run fastest along x, then y, then z
+    ids = idx[..., 0] + dims[0] * (idx[..., 1] + dims[1] * idx[..., 2])
+    ids[~inside] = -1
+    dist2[~inside] = np.inf
+    return ids, dist2
+
+
+def _cloud_mean(scalars, ids):
+    """
+    Mean of `scalars` over each row of voxel `ids` returned by
+    _cloud_shells(). `scalars` is flat or a (z, y, x) block such as a
+    cropped volume view, which is indexed in place instead of copied
+    """
+    mask = ids >= 0
+    ids = np.where(mask, ids, 0)
+    if scalars.ndim > 1:
+        vals = scalars[np.unravel_index(ids, scalars.shape)]
+    else:
+        vals = np.take(scalars, ids)
+    vals = np.where(mask, vals, 0.)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sum(vals, axis=1, dtype=float) / np.sum(mask, axis=1)
 
-        vox_ch1.InsertNextValue(mean([inten_ch1(m) for m in vox_id]))
 
-        vox_ch2.InsertNextValue(mean([inten_ch2(m) for m in vox_id]))
-    return vox_ch1, vox_ch2
+def _smoothed(scalars, dims, spacing, radius, mode):
+    """
+    Returns the flat volume `scalars` as a (z, y, x) float32 array convolved
+    with a separable `gaussian` or `box` kernel matching a sphere of `radius`
+    """
+    vol = np.asarray(scalars, dtype=np.float32).reshape(dims[::-1])
+    for axis, step in enumerate(spacing[::-1]):
+        if mode == 'gaussian':
+            # a uniform ball of radius r has a variance of r**2 / 5 per axis
+            vol = ndimage.gaussian_filter1d(vol, radius / np.sqrt(5.) / step,
+                                            axis=axis, mode='nearest')
+        elif mode == 'box':
+            # cube with the volume of the ball, side r * (4 pi / 3)**(1/3)
+            half = int(round(radius * (np.pi / 6.)**(1. / 3) / step))
+            vol = ndimage.uniform_filter1d(vol, 2 * half + 1,
+                                           axis=axis, mode='nearest')
+        else:
+            raise ValueError('Unknown sampling mode "{}"'.format(mode))
+    return vol
+
+
+def _interpolate(vol, points, spacing, origin):
+    """
+    Trilinear interpolation of the (z, y, x) volume `vol` at `points`
+    """
+    pos = (points - origin) / spacing
+    return ndimage.map_coordinates(vol, pos[:, ::-1].T, order=1,
+                                   mode='nearest').astype(float)
+
+
+def _pointcloud(skel, ch1, ch2, **kwargs):
+    """
+    Returns the `vox_ch1` and `vox_ch2` VTK arrays of the mean voxel
+    intensities around each skeleton point, see _pointcloud_channels()
+    """
+    return _pointcloud_channels(skel, [('ch1', ch1), ('ch2', ch2)], **kwargs)
+
+
+def _pointcloud_channels(skel, channels, radius=2.5, radii=(),
+                         mode='sphere'):
+    """
+    Returns a `vox_<label>` VTK array of the mean voxel intensities within
+    `radius` of each skeleton point for each (label, volume) in `channels`,
+    followed by the `vox_<label>_r{R}` arrays for each extra radius R in
+    `radii`. The `gaussian` and `box` modes interpolate smoothed volumes
+    instead
+    """
+    grids = [(label, _grid(vol)) for label, vol in channels]
+    dims, spacing, origin = grids[0][1][:3]
+    for label, grid in grids[1:]:
+        if not all(np.array_equal(a, b) for a, b in
+                   zip(grid[:3], (dims, spacing, origin))):
+            raise ValueError('Volume of channel {} is not on the grid of '
+                             'channel {}'.format(label, grids[0][0]))
+    points = vnpy.vtk_to_numpy(skel.GetPoints().GetData()).astype(float)
+
+    if mode == 'sphere':
+        # the resampled volumes are regular grids, so the voxels lying within
+        # the radius of every skeleton point are gathered in one go with a
+        # fixed offset stencil instead of a vtkPointLocator query per point.
+        # Smaller radii reuse the shells of the largest one
+        ids, dist2 = _cloud_shells(ceil(points / .055), dims, spacing,
+                                   origin, max([radius] + list(radii)))
+    else:
+        # one convolution per volume and radius, then a gather at the
+        # unsnapped skeleton coordinates
+        points = points / .055
+
+    arrays = []
+    for rad, suffix in ([(radius, '')] +
+                        [(r, '_r{:g}'.format(r)) for r in radii]):
+        if mode == 'sphere':
+            cloud = np.where(dist2 <= rad**2, ids, -1)
+        for label, grid in grids:
+            if mode == 'sphere':
+                vals = _cloud_mean(grid[3], cloud)
+            else:
+                vals = _interpolate(_smoothed(grid[3], dims, spacing, rad,
+                                              mode),
+                                    points, spacing, origin)
+            vox = vnpy.numpy_to_vtk(vals, deep=1)
+            vox.SetName('vox_' + label + suffix)
+            arrays.append(vox)
+    return arrays
+
+
+class VoxelHistogram(object):
+    """
+    Cumulative histogram of integer voxel intensities (eg. 12/16-bit
+    microscope data). Percentiles are exact, matching `numpy.percentile`
+    with linear interpolation, but are found in the counts instead of by
+    sorting every voxel
+    """
+    def __init__(self, vox, chunksize=2**22):
+        self.offset = int(vox.min())
+        self.size = vox.size
+        counts = np.zeros(int(vox.max()) - self.offset + 1, dtype=np.int64)
+        # chunked along the first axis so that a memory-mapped volume, or a
+        # cropped view of one, is never copied whole
+        step = max(1, chunksize * len(vox) // max(self.size, 1))
+        for start in range(0, len(vox), step):
+            chunk = np.asarray(vox[start:start + step], dtype=np.int64)
+            counts += np.bincount(chunk.ravel() - self.offset,
+                                  minlength=counts.size)
+        self.cumcounts = np.cumsum(counts)
+
+    def value(self, rank):
+        """
+        Returns the voxel value at position `rank` of the sorted voxels
+        """
+        return np.searchsorted(self.cumcounts, rank, side='right') + \
+            self.offset
+
+    def percentile(self, q):
+        """
+        Returns the `q`-th percentile of the voxel intensities
+        """
+        rank = q / 100. * (self.size - 1)
+        lower = int(np.floor(rank))
+        upper = min(lower + 1, self.size - 1)
+        low = self.value(lower)
+        return low + (rank - lower) * (self.value(upper) - low)
+
+
+def _mapped_region(vox):
+    """
+    Returns a key of the file region of memory-mapped array `vox`, or of a
+    view of one such as a cropped volume, None for other arrays
+    """
+    if not isinstance(vox, np.memmap) or vox.filename is None:
+        return None
+    root = vox
+    while isinstance(root.base, np.ndarray):
+        root = root.base
+    start = (vox.__array_interface__['data'][0] -
+             root.__array_interface__['data'][0])
+    return (vox.filename, vox.offset + start, vox.shape, vox.strides,
+            op.getmtime(vox.filename))
+
+
+def voxel_histogram(vox):
+    """
+    Returns the VoxelHistogram of integer voxel array `vox`. Histograms of
+    memory-mapped volumes (see vtkio.read_volume()) and of cropped views of
+    them are cached per file region, so repeated background queries on the
+    same volume do not read it again
+    """
+    key = _mapped_region(vox)
+    if key is None:
+        return VoxelHistogram(vox)
+    if key not in _HISTOGRAMS:
+        if len(_HISTOGRAMS) >= 8:
+            _HISTOGRAMS.clear()
+        _HISTOGRAMS[key] = VoxelHistogram(vox)
+    return _HISTOGRAMS[key]
+
+
+def voxel_percentile(vox, q):
+    """
+    Returns the `q`-th percentile of voxel intensities `vox`, which may be a
+    VoxelHistogram, an integer array (histogram method, see
+    voxel_histogram()) or a float array (`numpy.percentile`)
+    """
+    if isinstance(vox, VoxelHistogram):
+        return vox.percentile(q)
+    vox = np.asanyarray(vox)  # not raveled, that would copy a cropped view
+    if vox.dtype.kind not in 'iu' or not vox.size:
+        return percentile(vox, q)
+    # cached histograms and 8/16-bit volumes need no pass over the voxels,
+    # wider integers only fit a histogram if their range is narrow
+    if (vox.dtype.itemsize <= 2 or _mapped_region(vox) in _HISTOGRAMS or
+            int(vox.max()) - int(vox.min()) < 2**24):
+        return voxel_histogram(vox).percentile(q)
+    return percentile(vox, q)
 
 
 def normalize_skel(polydata, raw_vox_ch1, raw_vox_ch2,
@@ -104,8 +413,9 @@ def normalize_skel(polydata, raw_vox_ch1, raw_vox_ch2,
     ----------
     polydata : vtkPolyData
         vtk object returned from pt_cld_sclrs()
-    raw_vox_ch1, raw_vox_ch2 : Numpy array
-        Voxel intensity values in numpy array format
+    raw_vox_ch1, raw_vox_ch2 : Numpy array or VoxelHistogram
+        Voxel intensity values in numpy array format, integer volumes use
+        the histogram percentile (see voxel_percentile())
     backgrnd_thresh : float
         The default threshold of a background value is the 5th percentile of
         voxel intensities in the respective channel. This might have to be
@@ -118,6 +428,13 @@ def normalize_skel(polydata, raw_vox_ch1, raw_vox_ch2,
         cell ID as keys and channel labels as subkeys
 
         eg. {`Cell_1`: {`ch1`: 3000.2, `ch2`: 2500.5} ...}
+
+    Returns
+    -------
+    results : dict
+        normalized arrays keyed by their LEGACY_NAMES, for write_vtk(). The
+        `vox_ch1`, `vox_ch2` and `tubewidth` arrays of `polydata` are
+        renamed to rGFP, rRFP and TubeWidth in place
     """
     temp = polydata.GetPointData()
     vox_ch1 = vnpy.vtk_to_numpy(temp.GetArray('vox_ch1'))
@@ -136,8 +453,8 @@ def normalize_skel(polydata, raw_vox_ch1, raw_vox_ch2,
                format(background['ch1'], background['ch2']))
 
     else:
-        min_ch1 = percentile(raw_vox_ch1, background_thresh)
-        min_ch2 = percentile(raw_vox_ch2, background_thresh)
+        min_ch1 = voxel_percentile(raw_vox_ch1, background_thresh)
+        min_ch2 = voxel_percentile(raw_vox_ch2, background_thresh)
 
     # background Substracted rfp and gfps
     ch2_bckgrnd = vox_ch2 - min_ch2
@@ -151,32 +468,37 @@ def normalize_skel(polydata, raw_vox_ch1, raw_vox_ch2,
     _min = min(unscaled_dy)
     _max = max(unscaled_dy)
     normalized_dy = ((unscaled_dy - _min)/(_max - _min))
-    tubewidth = temp.GetArray('tubewidth')
-
-    # Output results as a labelled dictionary
-    results = {'normalized_dy': normalized_dy,
-               'unscaled_dy': unscaled_dy,
-               'ch1_bckgrnd': ch1_bckgrnd,
-               'ch2_bckgrnd': ch2_bckgrnd,
-               'width_eqv': width_eqv,
-               'tubewidth': tubewidth}
+
+    # the raw channels and width are already in polydata, so they are only
+    # renamed, each array is written once
+    for name in ('vox_ch1', 'vox_ch2', 'tubewidth'):
+        temp.GetArray(name).SetName(LEGACY_NAMES[name])
+
+    # Output results as a labelled dictionary, see LEGACY_NAMES
+    results = {'DY_minmax': normalized_dy,
+               'DY_raw': unscaled_dy,
+               'bkstGFP': ch1_bckgrnd,
+               'bkstRFP': ch2_bckgrnd,
+               'WidthEq': width_eqv}
     return results
 
 
 def write_vtk(dat, fname, **kwargs):
     """
     Write out a vtk file using VTK polydata object *dat* and a filename *fname*
-    with optional labels dictionary *kwargs* for the outputs
+    with optional labels dictionary *kwargs* for the outputs. A *fname* ending
+    in `.vtp` is written as compressed binary XML, otherwise legacy ASCII
 
     kwargs
     ------
-    Default dictionary keys are:
+    Default dictionary keys are the LEGACY_NAMES returned by
+    normalize_skel():
 
-    * normalized_dy
-    * unscaled_dy
-    * ch1_bckgrnd
-    * ch2_bckgrnd
-    * width_eqv'
+    * DY_minmax
+    * DY_raw
+    * bkstGFP
+    * bkstRFP
+    * WidthEq
 
     """
     for k in sorted(kwargs):
@@ -186,8 +508,4 @@ def write_vtk(dat, fname, **kwargs):
             temp = kwargs[k]
         temp.SetName(k)
         dat.GetPointData().AddArray(temp)
-
-    writer = vtk.vtkPolyDataWriter()
-    writer.SetFileName(fname)
-    writer.SetInputData(dat)
-    writer.Update()
+    write_polydata(dat, fname)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Module for the point level graph of a skeleton, where consecutive points of
+a line are joined by an edge of their distance and lines are joined at
+their shared endpoints, so distances can be measured along the network
+between any two skeleton points
+"""
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from pipeline.make_networkx import endpoint_labels
+from pipeline.polylines import PolylineTable
+# pylint: disable=C0103
+
+
+class PointGraph(object):
+    """
+    Points of the skeleton in PolylineTable `table` as the vertices of a
+    sparse graph weighted by distance. Row `r` of the table is vertex
+    `vertex[r]` and `rows[v]` is the first table row of vertex `v`. Rows of
+    the same point id are one vertex, and so are the line endpoints that
+    share a node of make_networkx.makegraph() with the same `tol`
+
+    Parameters
+    ----------
+    table : PolylineTable
+        lines of the skeleton
+    tol : float
+        endpoints closer than `tol` are joined, the default 0 only joins
+        identical coordinates
+    """
+    __slots__ = ('table', 'vertex', 'rows', 'matrix')
+
+    def __init__(self, table, tol=0.):
+        self.table = table
+        end_rows = np.column_stack((table.offsets[:-1],
+                                    table.offsets[1:] - 1)).ravel()
+        keys = table.pids.copy()
+        if len(end_rows):
+            labels = endpoint_labels(table.xyz[end_rows], tol)
+            keys[end_rows] = table.pids[end_rows[labels]]
+        uniq, self.rows, self.vertex = np.unique(keys, return_index=True,
+                                                 return_inverse=True)
+
+        # consecutive rows are an edge unless they end and start a line
+        step = np.ones(max(len(keys) - 1, 0), dtype=bool)
+        step[table.offsets[1:-1] - 1] = False
+        dist = np.linalg.norm(table.xyz[1:][step] - table.xyz[:-1][step],
+                              axis=1)
+        self.matrix = _adjacency(self.vertex[:-1][step],
+                                 self.vertex[1:][step], dist, len(uniq))
+
+    @classmethod
+    def from_polydata(cls, polydata, names=None, tol=0.):
+        """
+        Build the graph of a VTK or tvtk polydata skeleton, with the point
+        data arrays in `names` (all arrays if None) as table columns
+        """
+        return cls(PolylineTable.from_polydata(polydata, names), tol)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def xyz(self):
+        """
+        Coordinates of each vertex
+        """
+        return self.table.xyz[self.rows]
+
+    def values(self, name):
+        """
+        Values of table column `name` at each vertex
+        """
+        return self.table.columns[name][self.rows]
+
+    def point_vertices(self, pids):
+        """
+        Vertices of the VTK point ids `pids`, -1 for points on no line
+        """
+        lookup = -np.ones(self.table.pids.max() + 1 if len(self) else 0,
+                          dtype=int)
+        lookup[self.table.pids] = self.vertex
+        pids = np.asarray(pids)
+        inside = pids < len(lookup)
+        return np.where(inside, lookup[np.where(inside, pids, 0)], -1)
+
+    def distances(self, sources, limit=np.inf, min_only=False):
+        """
+        Returns the geodesic distances from each vertex in `sources` (len
+        sources x len graph array) to every vertex, np.inf beyond `limit`
+        or in other components. With `min_only` the distance to the nearest
+        source (len graph array)
+        """
+        sources = np.atleast_1d(np.asarray(sources, dtype=int))
+        if min_only:
+            try:
+                return csgraph.dijkstra(self.matrix, directed=False,
+                                        indices=sources, limit=limit,
+                                        min_only=True)
+            except TypeError:  # scipy < 1.3
+                dist = csgraph.dijkstra(self.matrix, directed=False,
+                                        indices=sources, limit=limit)
+                return dist.min(axis=0)
+        return csgraph.dijkstra(self.matrix, directed=False,
+                                indices=sources, limit=limit)
+
+    def within(self, limit, sources=None, chunk=256):
+        """
+        Returns the geodesic distances up to `limit` from `sources` (all
+        vertices if None) as a CSR matrix of len sources x len graph. Only
+        `chunk` sources are searched at a time, so at most `chunk` dense
+        rows are held. Zero distances, eg. of a source to itself, are not
+        stored
+        """
+        if sources is None:
+            sources = np.arange(len(self))
+        sources = np.atleast_1d(np.asarray(sources, dtype=int))
+        blocks = []
+        for start in range(0, len(sources), chunk):
+            dist = self.distances(sources[start:start + chunk], limit)
+            dist[~np.isfinite(dist)] = 0
+            blocks.append(sparse.csr_matrix(dist))
+        if not blocks:
+            return sparse.csr_matrix((0, len(self)))
+        return sparse.vstack(blocks).tocsr()
+
+
+def _adjacency(src, dst, dist, n):
+    """
+    Symmetric CSR matrix of the edges `src`-`dst` of length `dist` between
+    `n` vertices, keeping the shortest of parallel edges and no self loops
+    """
+    keep = src != dst
+    src, dst, dist = src[keep], dst[keep], dist[keep]
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    order = np.lexsort((dist, hi, lo))
+    lo, hi, dist = lo[order], hi[order], dist[order]
+    first = np.ones(len(lo), dtype=bool)
+    first[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])
+    lo, hi, dist = lo[first], hi[first], dist[first]
+    return sparse.csr_matrix((np.r_[dist, dist], (np.r_[lo, hi],
+                                                   np.r_[hi, lo])),
+                             shape=(n, n))
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Module for per-edge access to the lines of a skeleton, built once per file
+from the VTK connectivity arrays instead of a get_cell() call per line
+"""
+import numpy as np
+import vtk.util.numpy_support as vnpy
+from pipeline.vtkio import line_cells
+# pylint: disable=C0103
+
+
+class PolylineTable(object):
+    """
+    Lines (edges) of a skeleton as flat arrays. The point ids of line `i`
+    are `pids[offsets[i]:offsets[i+1]]`, and the coordinates `xyz` and the
+    named point data `columns` are stored in the same line order, so the
+    values of an edge are a slice (view) and per-edge statistics are
+    segment reductions over the whole table
+
+    Parameters
+    ----------
+    offsets, pids : Numpy array
+        line offsets and point ids as returned by vtkio.line_cells()
+    points : Numpy array
+        coordinates of all points, indexed by point id
+    columns : dict
+        point data arrays indexed by point id, keyed by name
+    """
+    __slots__ = ('offsets', 'pids', 'xyz', 'columns')
+
+    def __init__(self, offsets, pids, points, columns=None):
+        self.offsets = offsets
+        self.pids = pids
+        self.xyz = points[pids]
+        self.columns = {name: np.asarray(vals)[pids]
+                        for name, vals in (columns or {}).items()}
+
+    @classmethod
+    def from_polydata(cls, polydata, names=None):
+        """
+        Build the table of a VTK or tvtk polydata skeleton, with the point
+        data arrays in `names` as columns (all arrays if None)
+        """
+        polydata = getattr(polydata, '_vtk_obj', polydata)  # tvtk wrapper
+        offsets, pids = line_cells(polydata)
+        pdata = polydata.GetPointData()
+        if names is None:
+            names = [pdata.GetArrayName(i)
+                     for i in range(pdata.GetNumberOfArrays())]
+        columns = {name: vnpy.vtk_to_numpy(pdata.GetArray(name))
+                   for name in names}
+        points = vnpy.vtk_to_numpy(polydata.GetPoints().GetData())
+        return cls(offsets, pids, points, columns)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def counts(self):
+        """
+        Number of points of each line
+        """
+        return np.diff(self.offsets)
+
+    @property
+    def first(self):
+        """
+        Point id of the first point of each line
+        """
+        return self.pids[self.offsets[:-1]]
+
+    @property
+    def last(self):
+        """
+        Point id of the last point of each line
+        """
+        return self.pids[self.offsets[1:] - 1]
+
+    def _column(self, name):
+        return self.xyz if name is None else self.columns[name]
+
+    def line_pids(self, i):
+        """
+        Point ids of line `i`
+        """
+        return self.pids[self.offsets[i]:self.offsets[i + 1]]
+
+    def edge(self, i, name=None):
+        """
+        Values of column `name` (coordinates if None) along line `i`
+        """
+        return self._column(name)[self.offsets[i]:self.offsets[i + 1]]
+
+    def edges(self, name=None):
+        """
+        List of the values of column `name` (coordinates if None) along
+        every line
+        """
+        return np.split(self._column(name), self.offsets[1:-1])
+
+    def mean(self, name):
+        """
+        Mean of column `name` along each line
+        """
+        return (np.add.reduceat(self.columns[name], self.offsets[:-1],
+                                dtype=float) / self.counts)
+
+    def std(self, name):
+        """
+        Standard deviation of column `name` along each line
+        """
+        counts = self.counts
+        dev = self.columns[name] - np.repeat(self.mean(name), counts)
+        return np.sqrt(np.add.reduceat(dev**2, self.offsets[:-1]) / counts)
+
+    def cv(self, name):
+        """
+        Coefficient of variation of column `name` along each line
+        """
+        return self.std(name) / self.mean(name)
+
+    def lengths(self):
+        """
+        Length of each line, the sum of the distances of consecutive points
+        """
+        steps = np.zeros(len(self.pids), dtype=self.xyz.dtype)
+        steps[:-1] = np.linalg.norm(np.diff(self.xyz, axis=0), axis=1)
+        # steps from the end of one line to the start of the next
+        steps[self.offsets[1:-1] - 1] = 0
+        return np.add.reduceat(steps, self.offsets[:-1])
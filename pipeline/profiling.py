@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Module for timing the pipeline per stage and per cell. Profiling is off
+unless enabled with enable() or by setting the SWEEPY_PROFILE environment
+variable to a trace folder, so that worker processes inherit it. Every
+process then appends its spans to `trace-<pid>.jsonl` in that folder, which
+export_chrome() merges into a Chrome trace (chrome://tracing, Perfetto) and
+print_summary() reduces to the slowest stages and cells.
+
+Functions decorated with timed() and span() cost one dict lookup when
+profiling is off, so it can be enabled at any time (worker processes started
+after that inherit it). With memory recording on, each span also stores the
+peak resident memory (max RSS) of its process and of its finished child
+processes (eg. pool workers), from `resource.getrusage` (not on Windows).
+
+    python -m pipeline.profiling <trace folder> [--chrome trace.json]
+"""
+import os
+import os.path as op
+import argparse
+import functools
+import glob
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+try:
+    import resource
+except ImportError:  # Windows, memory peaks are not recorded
+    resource = None
+# pylint: disable=C0103
+
+ENV = 'SWEEPY_PROFILE'
+ENV_MEMORY = 'SWEEPY_PROFILE_MEMORY'
+_state = {'folder': os.environ.get(ENV) or None,
+          'memory': bool(os.environ.get(ENV_MEMORY)),
+          'pid': None,
+          'out': None}
+
+
+def enabled():
+    """
+    True if profiling is on
+    """
+    return _state['folder'] is not None
+
+
+def enable(folder, memory=False):
+    """
+    Record spans in trace `folder` (created if needed), with the peak
+    resident memory of each span if `memory` (see _maxrss())
+    """
+    if not op.isdir(folder):
+        os.makedirs(folder)
+    _state['folder'] = folder
+    _state['memory'] = memory and resource is not None
+    os.environ[ENV] = folder
+    if _state['memory']:
+        os.environ[ENV_MEMORY] = '1'
+
+
+def disable():
+    """
+    Stop recording spans
+    """
+    _state['folder'] = None
+    os.environ.pop(ENV, None)
+    os.environ.pop(ENV_MEMORY, None)
+
+
+def clear(folder):
+    """
+    Delete the spans recorded in trace `folder`, eg. before a new run
+    """
+    for fpath in glob.glob(op.join(folder, 'trace-*.jsonl')):
+        os.remove(fpath)
+
+
+def _maxrss(who):
+    """
+    Returns the peak resident memory in kB of this process (`who` is
+    RUSAGE_SELF) or of its terminated and waited for children
+    (RUSAGE_CHILDREN)
+    """
+    rss = resource.getrusage(who).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # bytes on OS X
+
+
+def _write(event):
+    pid = os.getpid()
+    if _state['pid'] != pid:  # first span of this (possibly forked) process
+        _state['out'] = open(op.join(_state['folder'],
+                                     'trace-{}.jsonl'.format(pid)), 'a')
+        _state['pid'] = pid
+    _state['out'].write(json.dumps(event, default=str) + '\n')
+    _state['out'].flush()
+
+
+class _Span(object):
+    """
+    Context manager recording one span, see span()
+    """
+    __slots__ = ('name', 'cat', 'args', 'start', 'rss')
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+        self.rss = None
+
+    def __enter__(self):
+        if _state['memory']:
+            self.rss = _maxrss(resource.RUSAGE_SELF)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.time()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        if self.rss is not None:
+            # peaks are lifetime highs, the growth is what this span added
+            self.args['maxrss_kb'] = _maxrss(resource.RUSAGE_SELF)
+            self.args['maxrss_growth_kb'] = self.args['maxrss_kb'] - self.rss
+            self.args['children_maxrss_kb'] = _maxrss(
+                resource.RUSAGE_CHILDREN)
+        _write({'name': self.name,
+                'cat': self.cat,
+                'ts': int(self.start * 1e6),
+                'dur': int((end - self.start) * 1e6),
+                'pid': os.getpid(),
+                'tid': threading.current_thread().ident,
+                'args': self.args})
+        return False
+
+
+class _NullSpan(object):
+    """
+    Context manager doing nothing, returned by span() when profiling is off
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL = _NullSpan()
+
+
+def span(name, cat='', **args):
+    """
+    Context manager timing its block as span `name` of category `cat`
+    (eg. stage, cell), `args` (eg. cell=<name>) are stored with it
+    """
+    if _state['folder'] is None:
+        return _NULL
+    return _Span(name, cat, args)
+
+
+def timed(name=None, cat='', cell=None):
+    """
+    Decorator timing each call as span `name` (the function's qualified
+    name by default) of category `cat`. `cell` names the argument holding
+    the cell name, stored with the span
+    """
+    def decorate(func):
+        label = name or '{}.{}'.format(func.__module__, func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _state['folder'] is None:
+                return func(*args, **kwargs)
+            spanargs = {}
+            if cell is not None:
+                spanargs['cell'] = inspect.getcallargs(
+                    func, *args, **kwargs).get(cell)
+            with _Span(label, cat, spanargs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def load(folder):
+    """
+    Returns the list of spans recorded in trace `folder`
+    """
+    events = []
+    for fpath in sorted(glob.glob(op.join(folder, 'trace-*.jsonl'))):
+        with open(fpath, 'r') as inpt:
+            events.extend(json.loads(line) for line in inpt if line.strip())
+    return events
+
+
+def export_chrome(events, fpath):
+    """
+    Write `events` (from load()) as a Chrome trace event file `fpath`
+    """
+    trace = [dict(event, ph='X') for event in events]
+    with open(fpath, 'w') as out:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, out)
+
+
+def summarize(events):
+    """
+    Returns the spans grouped by name and the cells, each as a list of
+    (key, count, total s, max s) sorted by descending total time. Cell
+    totals add up the spans of category `cell`
+    """
+    names = defaultdict(list)
+    cells = defaultdict(list)
+    for event in events:
+        names[event['name']].append(event['dur'] / 1e6)
+        if event['cat'] == 'cell' and event['args'].get('cell') is not None:
+            cells[event['args']['cell']].append(event['dur'] / 1e6)
+
+    def table(groups):
+        return sorted(((key, len(vals), sum(vals), max(vals))
+                       for key, vals in groups.items()),
+                      key=lambda row: -row[2])
+    return table(names), table(cells)
+
+
+def print_summary(events, top=10):
+    """
+    Print the `top` slowest span names and cells of `events`
+    """
+    names, cells = summarize(events)
+    for title, rows in (('span', names), ('cell', cells)):
+        print '\n{:<48} {:>6} {:>10} {:>10}'.format(
+            'slowest ' + title, 'count', 'total s', 'max s')
+        for key, count, total, longest in rows[:top]:
+            print '{:<48} {:>6} {:>10.2f} {:>10.2f}'.format(
+                str(key)[:48], count, total, longest)
+
+
+def main(argv=None):
+    """
+    Summarize a trace folder and optionally export it as a Chrome trace
+    """
+    parser = argparse.ArgumentParser(
+        description='Summarize the spans of a profiled pipeline run')
+    parser.add_argument('folder', help='trace folder (SWEEPY_PROFILE)')
+    parser.add_argument('--chrome', default=None,
+                        help='write a Chrome trace event file')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of spans and cells listed (default 10)')
+    args = parser.parse_args(argv)
+
+    events = load(args.folder)
+    if args.chrome:
+        export_chrome(events, args.chrome)
+    print_summary(events, args.top)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
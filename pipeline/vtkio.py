@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Module for reading and writing the VTK files used by the pipeline without
+going through the VTK parsers where the file layout allows it
+"""
+import os.path as op
+from collections import namedtuple
+import numpy as np
+import vtk
+import vtk.util.numpy_support as vnpy
+# pylint: disable=C0103
+
+# legacy VTK data types, binary blocks are always written big-endian
+LEGACY_DTYPES = {'bit': None,
+                 'unsigned_char': '>u1',
+                 'char': '>i1',
+                 'unsigned_short': '>u2',
+                 'short': '>i2',
+                 'unsigned_int': '>u4',
+                 'int': '>i4',
+                 'unsigned_long': '>u8',
+                 'long': '>i8',
+                 'vtktypeuint64': '>u8',
+                 'vtktypeint64': '>i8',
+                 'float': '>f4',
+                 'double': '>f8'}
+
+Volume = namedtuple('Volume', ['dims', 'spacing', 'origin', 'scalars'])
+
+
+def read_legacy_header(fpath):
+    """
+    Parse the header of a legacy vtkStructuredPoints file
+
+    Returns
+    -------
+    header : dict
+        `format` (ASCII|BINARY), `dims`, `spacing`, `origin`, `npoints`,
+        `dtype` and `offset`, the byte position of the scalar block
+    """
+    header = {'spacing': (1., 1., 1.), 'origin': (0., 0., 0.)}
+    with open(fpath, 'rb') as inpt:
+        inpt.readline()  # version line
+        inpt.readline()  # title
+        header['format'] = inpt.readline().strip().upper().decode('ascii')
+        while True:
+            line = inpt.readline()
+            if not line:
+                raise ValueError('No scalar data found in {}'.format(fpath))
+            fields = line.decode('ascii').split()
+            if not fields:
+                continue
+            keyword = fields[0].upper()
+            if keyword == 'DATASET' and fields[1] != 'STRUCTURED_POINTS':
+                raise ValueError('{} is not a STRUCTURED_POINTS file'
+                                 .format(fpath))
+            elif keyword == 'DIMENSIONS':
+                header['dims'] = tuple(int(i) for i in fields[1:4])
+            elif keyword in ('SPACING', 'ASPECT_RATIO'):
+                header['spacing'] = tuple(float(i) for i in fields[1:4])
+            elif keyword == 'ORIGIN':
+                header['origin'] = tuple(float(i) for i in fields[1:4])
+            elif keyword == 'POINT_DATA':
+                header['npoints'] = int(fields[1])
+            elif keyword == 'SCALARS':
+                ncomp = int(fields[3]) if len(fields) > 3 else 1
+                dtype = LEGACY_DTYPES.get(fields[2].lower())
+                if dtype is None or ncomp != 1:
+                    raise ValueError('Unsupported scalars "{}" in {}'
+                                     .format(line.strip(), fpath))
+                header['dtype'] = np.dtype(dtype)
+            elif keyword == 'LOOKUP_TABLE':
+                header['offset'] = inpt.tell()
+                return header
+
+
+def read_volume(fpath):
+    """
+    Read a legacy vtkStructuredPoints file (eg. *resampled.vtk*) as a Volume
+
+    For BINARY files the scalars are a read-only `np.memmap` view of the
+    data block in its native (big-endian) dtype, so no copy is made until
+    the values are used and worker processes share the OS page cache. ASCII
+    files fall back to the VTK reader.
+
+    Returns
+    -------
+    vol : Volume
+        namedtuple of `dims`, `spacing`, `origin` and flat `scalars`, with
+        point ids running fastest along x as in VTK
+    """
+    header = read_legacy_header(fpath)
+    if header['format'] == 'BINARY':
+        if header['npoints'] != np.prod(header['dims']):
+            raise ValueError('POINT_DATA does not match DIMENSIONS in {}'
+                             .format(fpath))
+        scalars = np.memmap(fpath, dtype=header['dtype'], mode='r',
+                            offset=header['offset'],
+                            shape=(header['npoints'],))
+    else:
+        reader = vtk.vtkStructuredPointsReader()
+        reader.SetFileName(fpath)
+        reader.Update()
+        data = reader.GetOutput()
+        # copy, the VTK array is freed with the reader
+        scalars = np.array(vnpy.vtk_to_numpy(
+            data.GetPointData().GetScalars()))
+    return Volume(np.array(header['dims']),
+                  np.array(header['spacing']),
+                  np.array(header['origin']),
+                  scalars)
+
+
+def crop_volume(vol, lower, upper):
+    """
+    Returns the part of Volume `vol` inside the box from `lower` to `upper`
+    (world coordinates), with its origin moved to match. The scalars are a
+    (z, y, x) strided view of the block, so nothing is copied and only the
+    voxels used of a memory-mapped volume are read from disk
+    """
+    lo = np.clip(np.floor((lower - vol.origin) / vol.spacing).astype(int),
+                 0, vol.dims)
+    hi = np.clip(np.ceil((upper - vol.origin) / vol.spacing).astype(int) + 1,
+                 lo, vol.dims)
+    block = vol.scalars.reshape(tuple(vol.dims[::-1]))[lo[2]:hi[2],
+                                                       lo[1]:hi[1],
+                                                       lo[0]:hi[0]]
+    return Volume(hi - lo,
+                  vol.spacing,
+                  vol.origin + lo * vol.spacing,
+                  block)
+
+
+def line_cells(polydata):
+    """
+    Returns the point ids of all lines of `polydata` as one flat array
+    `pids`, and `offsets` (number of lines + 1) such that the ids of line `i`
+    are `pids[offsets[i]:offsets[i+1]]`. Read straight from the vtkCellArray,
+    whose legacy layout is [n, id_0 .. id_n-1, n, ...]
+    """
+    lines = polydata.GetLines()
+    if hasattr(lines, 'GetOffsetsArray'):  # VTK >= 9 stores offsets
+        return (vnpy.vtk_to_numpy(lines.GetOffsetsArray()).astype(int),
+                vnpy.vtk_to_numpy(lines.GetConnectivityArray()).astype(int))
+    conn = vnpy.vtk_to_numpy(lines.GetData()).astype(int)
+    starts = []
+    pos = 0
+    sizes = conn.tolist()
+    while pos < len(sizes):
+        starts.append(pos)
+        pos += sizes[pos] + 1
+    offsets = np.r_[0, np.cumsum(conn[starts])]
+    return offsets, np.delete(conn, starts)
+
+
+def read_polydata(fpath):
+    """
+    Read a polydata file (eg. skeleton) as a VTK object, the format is chosen
+    by extension: XML `.vtp` or legacy `.vtk` (ASCII or BINARY)
+    """
+    if op.splitext(fpath)[1].lower() == '.vtp':
+        reader = vtk.vtkXMLPolyDataReader()
+    else:
+        reader = vtk.vtkPolyDataReader()
+    reader.SetFileName(fpath)
+    reader.Update()
+    return reader.GetOutput()
+
+
+def write_polydata(dat, fname):
+    """
+    Write VTK polydata `dat` to `fname`. A `.vtp` extension writes XML with
+    zlib compressed, raw appended binary arrays, anything else writes a
+    legacy ASCII file
+    """
+    if op.splitext(fname)[1].lower() == '.vtp':
+        writer = vtk.vtkXMLPolyDataWriter()
+        writer.SetDataModeToAppended()
+        writer.EncodeAppendedDataOff()
+        writer.SetCompressorTypeToZLib()
+    else:
+        writer = vtk.vtkPolyDataWriter()
+    writer.SetFileName(fname)
+    writer.SetInputData(dat)
+    writer.Write()
@@ -3,15 +3,20 @@
 Main module for mito network normalization
 @author: sweel_lim
 """
+import sys
 import os
 import os.path as op
+import argparse
 import cPickle as pickle
 import re
+import traceback
 from collections import defaultdict
 from post_mitograph import mkdir_exist
 from pipeline import pipefuncs as pf
-import Tkinter
-import TkClas
+from pipeline import manifest as mf
+from pipeline.artifacts import artifact_entry
+from pipeline import profiling as prof
+from wrappers import UsageError
 # pylint: disable=C0103
 
 # data folder should contain subfolders of cell conditions, each condition
@@ -25,6 +30,13 @@ SEARCHDICT = defaultdict(dict,
                          {'resampled': {'RFP': 'ch2',
                                         'GFP': 'ch1'},
                           'skeleton': {'RFP': 'skel'}})
+# normalization parameters, changing these invalidates every normalized file.
+# `format` is the version of the output arrays, 2 has the names read by the
+# graph, fit and munge steps (see pipefuncs.LEGACY_NAMES)
+PARAMS = {'radius': 2.5,
+          'background_thresh': 5.,
+          'full_background': False,
+          'format': 2}
 # master dictionary of file paths stored here, with 'skel', 'ch1' and 'ch2' as
 # the top level keys
 vtks = defaultdict(dict)
@@ -58,44 +70,184 @@ def readfolder(folder):
     return vtks
 
 
-def main():
+def output_name(key, fmt='vtk'):
     """
-    Pipeline to normalize'raw' vtk files and make mito network graph
+    File name of the normalized skeleton of cell `key`, `fmt` is `vtk`
+    (legacy ASCII) or `vtp` (compressed binary XML)
     """
+    return 'Normalized_{}_mitoskel.{}'.format(key, fmt)
 
-    root = Tkinter.Tk()
-    root.withdraw()
-    gui = TkClas.SelectDirClient(root,
-                                 initialdir='./mutants/pre_normalized')
-    basedir = gui.askdirectory()
+
+@prof.timed(cat='cell', cell='key')
+def normalize_cell(key, skelpath, ch1path, ch2path, background, savefolder,
+                   fmt='vtk'):
+    """
+    Normalize a single cell and write it out as
+    `Normalized_<key>_mitoskel.<fmt>` in `savefolder`
+
+    Returns
+    -------
+    savename : str
+        path of the normalized VTK file
+    """
+    savename = op.join(savefolder, output_name(key, fmt))
+    data, v1, v2 = pf.point_cloud_scalars(
+        skelpath, ch1path, ch2path, radius=PARAMS['radius'],
+        full_background=PARAMS['full_background'])
+    dict_output = pf.normalize_skel(
+        data, v1, v2, backgroundfile=background,
+        background_thresh=PARAMS['background_thresh'])
+    pf.write_vtk(data, savename, **dict_output)
+    return savename
+
+
+def _normalize_task(args):
+    """
+    Pool worker for normalize_cell(), the cell is skipped if its manifest
+    entry shows it was already normalized from identical inputs. Failures
+    are returned as a traceback string instead of being raised so that one
+    bad cell does not stop the batch
+    """
+    (key, skelpath, ch1path, ch2path,
+     background, savefolder, fmt, previous) = args
+    try:
+        old_inputs = (previous or {}).get('inputs', {})
+        entry = {'inputs': {lab: mf.file_record(path, old_inputs.get(lab))
+                            for lab, path in (('skel', skelpath),
+                                              ('ch1', ch1path),
+                                              ('ch2', ch2path))},
+                 'background': mf.value_digest(background),
+                 'params': mf.value_digest(PARAMS),
+                 'output': output_name(key, fmt)}
+        if (mf.same_inputs(entry, previous) and
+                op.isfile(op.join(savefolder, entry['output']))):
+            return key, entry, None, True
+        normalize_cell(key, skelpath, ch1path, ch2path,
+                       background, savefolder, fmt)
+        return key, entry, None, False
+    except Exception:  # pylint: disable=W0703
+        return key, None, traceback.format_exc(), False
+
+
+def run_batch(basedir, jobs=1, force=False, fmt='vtk', store=None):
+    """
+    Normalize every cell found in `basedir` using a pool of `jobs` worker
+    processes, outputs are saved in `basedir/Normalized` in format `fmt`
+    (see output_name()).
+
+    Cells are recorded in `Normalized/manifest.json` with content hashes of
+    their inputs, background values and PARAMS, and are skipped on later runs
+    until one of those changes (or `force` is set). The manifest is saved as
+    cells finish, so an interrupted run resumes where it stopped. With an
+    ArtifactStore `store` the output of each cell is also recorded as a
+    `normalize` artifact, which the artifacts made from it depend on
+
+    Returns
+    -------
+    done, failed : dict
+        output file paths and error tracebacks, keyed by cell
+    """
     savefolder = op.join(basedir, 'Normalized')
-    print "files will be saved in {}!".format(savefolder)
+    print ("files will be saved in {}!".format(savefolder))
     mkdir_exist(savefolder)
 
     try:
         with open(op.join(basedir, 'background_all.pkl'), 'rb') as inpt:
             bck = pickle.load(inpt)
     except IOError:
-        print ("File not found: Make sure you have file 'background_all.pkl' "
-               "in selected directory")
+        traceback.print_stack(limit=4)
+        raise UsageError("File not found: Make sure you have file "
+                         "'background_all.pkl' in selected directory")
 
+    manifest = mf.Manifest(op.join(savefolder, 'manifest.json'))
     paths = readfolder(basedir)
-    cells = paths['skel']
-    keys = sorted(cells.keys())
-    # use for loop here instead of while.. because we know we will iterate
-    # fully everytime over list (i.e. no STOP flag)
-    for key in keys:
-        savename = op.join(savefolder,
-                           'Normalized_{}_mitoskel.vtk'.format(key))
-
-        data, v1, v2 = pf.point_cloud_scalars(
-            paths['skel'][key],
-            paths['ch1'][key.replace('RFP', 'GFP')],
-            paths['ch2'][key])
-        dict_output = pf.normalize_skel(data, v1, v2,
-                                        backgroundfile=bck[key[:-4]])
-        pf.write_vtk(data, savename, **dict_output)
-        print "{} normalized!".format(key)
+    done = {}
+    failed = {}
+    tasks = []
+    for key in sorted(paths['skel'].keys()):
+        if key[:-4] not in bck:
+            failed[key] = 'No background value in background_all.pkl\n'
+            continue
+        tasks.append((key,
+                      paths['skel'][key],
+                      paths['ch1'].get(key.replace('RFP', 'GFP')),
+                      paths['ch2'].get(key),
+                      bck[key[:-4]],
+                      savefolder,
+                      fmt,
+                      None if force else manifest.get(key)))
+
+    inputs = {task[0]: task[1:5] for task in tasks}
+
+    def handle(result):
+        key, entry, error, skipped = result
+        if error is not None:
+            failed[key] = error
+            manifest.discard(key)
+            return key, 'FAILED', False
+        done[key] = op.join(savefolder, entry['output'])
+        manifest.update(key, entry)
+        if store is not None:
+            skel, ch1, ch2, background = inputs[key]
+            # the manifest entry holds the input hashes
+            store.put(artifact_entry(
+                'normalize', key,
+                files={'skel': skel, 'ch1': ch1, 'ch2': ch2},
+                values={'background': background}, params=PARAMS,
+                previous=entry), outputs={'vtk': done[key]})
+        return key, 'up to date' if skipped else 'normalized!', skipped
+
+    mf.map_cells(_normalize_task, tasks, handle, [manifest, store], jobs)
+
+    if failed:
+        report = op.join(savefolder, 'normalize_errors.txt')
+        with open(report, 'w') as out:
+            for key in sorted(failed):
+                out.write('{}\n{}\n'.format(key, failed[key]))
+        print ("{} cells failed, see {}".format(len(failed), report))
+    return done, failed
+
+
+def _askdirectory():
+    """
+    Tk dialog to select the data folder when none is given on the command line
+    """
+    import Tkinter
+    import TkClas
+    root = Tkinter.Tk()
+    root.withdraw()
+    gui = TkClas.SelectDirClient(root,
+                                 initialdir='./mutants/pre_normalized')
+    return gui.askdirectory()
+
+
+def main(argv=None):
+    """
+    Pipeline to normalize'raw' vtk files and make mito network graph
+    """
+    parser = argparse.ArgumentParser(
+        description='Normalize raw skeleton VTK files')
+    parser.add_argument('basedir', nargs='?',
+                        help='folder of cell condition subfolders, a folder '
+                        'selection dialog is shown if omitted')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (default 1)')
+    parser.add_argument('--format', choices=('vtk', 'vtp'), default='vtk',
+                        help='legacy ASCII .vtk (default) or compressed '
+                        'binary XML .vtp output')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='normalize all cells, even if up to date')
+    args = parser.parse_args(argv)
+
+    try:
+        basedir = args.basedir or _askdirectory()
+        _, failed = run_batch(basedir, jobs=max(args.jobs, 1),
+                               force=args.force, fmt=args.format)
+        return 1 if failed else 0
+
+    except UsageError as e:
+        print e
+        return 1
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
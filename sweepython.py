@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+Headless command line for the whole pipeline, eg.
+
+    python sweepython.py run --stages normalize,graph,fit,munge --jobs 8
+                             --root mutants
+
+Stages run in dependency order, each over all its cells with a pool of
+worker processes, and only cells whose inputs changed are recomputed (see
+the manifest, graph store and artifact store of each stage). Folders below
+the root:
+
+* pre_normalized : MitoGraph output, one subfolder per condition, and
+  background_all.pkl
+* pre_normalized/Normalized : normalized skeletons (normalize)
+* graphs : CellGraphs (graph)
+* fitted_data, fitted_data_scaled : edge lag distributions (fit)
+* munged_dataframe.pkl : per cell statistical and topological measures of
+  network_het.MungeDataSet (munge), backgrounds are read from
+  fileMetas.pkl or pre_normalized/background_all.pkl
+* network_features.pkl, graphlet_nodes.pkl : per cell spectral and graphlet
+  features and per node graphlet orbits (network-features)
+* artifacts : the output of each stage and cell, with the inputs and
+  upstream outputs it was made from (see pipeline.artifacts)
+
+With `--profile DIR` every stage, cell and instrumented function is timed
+(see pipeline.profiling), the spans are written to DIR/trace.json for
+chrome://tracing or Perfetto and the slowest stages and cells are printed.
+`--memory` adds the peak resident memory of each span and of the pool workers
+of each stage.
+
+`python sweepython.py stale` lists the artifacts (per stage and cell) that
+are out of date with their inputs or with the artifacts they were made from.
+
+`python sweepython.py check-imports` times the imports of the worker
+modules against a budget, and fails if they load a plotting or GUI package
+(also run by the tests, see tests/test_imports.py)
+"""
+import sys
+import os.path as op
+import argparse
+import json
+import subprocess
+import time
+import traceback
+from collections import OrderedDict
+import wrappers as wr
+from pipeline import profiling as prof
+from pipeline.artifacts import ArtifactStore
+from pipeline.catalog import FileCatalog
+# pylint: disable=C0103
+
+
+def skeletons(root, catalog):
+    """
+    Returns a dict of cell: normalized skeleton path of the cells below
+    `root`, from `normalizedVTK` (media subfolders of Norm_*skeleton files)
+    and from the output of the normalize stage, which wins for cells in both
+    """
+    paths = {}
+    legacy = op.join(root, 'normalizedVTK')
+    if op.isdir(legacy):
+        try:
+            vtkF = catalog.ddwalk(legacy, '*skeleton.vt[kp]', start=5,
+                                  stop=-13)
+            paths.update((cell, vtkF[media][cell])
+                         for media in vtkF for cell in vtkF[media])
+        except wr.UsageError:  # no skeletons in this folder
+            pass
+    normalized = op.join(root, 'pre_normalized', 'Normalized')
+    if op.isdir(normalized):
+        try:
+            paths.update(catalog.swalk(normalized,
+                                       'Normalized_*_mitoskel.vt[kp]',
+                                       start=11, stop=-13))
+        except wr.UsageError:
+            pass
+    return paths
+
+
+def stage_normalize(root, jobs, catalog):
+    """
+    Normalize the skeletons of every cell in `root/pre_normalized`
+    """
+    from pipeline.write_raw_vtk import run_batch
+    done, failed = run_batch(op.join(root, 'pre_normalized'), jobs=jobs,
+                             store=ArtifactStore(op.join(root, 'artifacts')))
+    return len(done), failed
+
+
+def stage_graph(root, jobs, catalog):
+    """
+    Build the CellGraph of every normalized skeleton into `root/graphs`
+    """
+    from pipeline.graphstore import GraphStore, build_graphs
+    paths = skeletons(root, catalog)
+    failed = build_graphs(GraphStore(op.join(root, 'graphs')), paths,
+                          jobs=jobs,
+                          artifacts=ArtifactStore(op.join(root, 'artifacts')))
+    return len(paths) - len(failed), failed
+
+
+def stage_fit(root, jobs, catalog):
+    """
+    Fit the edge lag distributions of every normalized skeleton into
+    `root/fitted_data` and `root/fitted_data_scaled`
+    """
+    from pipeline.artifacts import cached_map
+    from tubule_het.make_fitted_data import fit_task, write_fitted
+    paths = skeletons(root, catalog)
+    store = ArtifactStore(op.join(root, 'artifacts'))
+    fitted = cached_map(fit_task, paths, store, 'fit', jobs=jobs)
+    for cell in sorted(fitted):
+        entry = store.entry('fitted_data', cell,
+                            deps={'fit': store.head('fit', cell)})
+        if store.has(entry['key']):
+            store.record(entry)
+        else:
+            unscaled, scaled = write_fitted(root, cell, fitted[cell])
+            store.put(entry, outputs={'unscaled': unscaled,
+                                      'scaled': scaled})
+    store.save()
+    return len(fitted), {cell: 'fit failed, see log\n'
+                         for cell in paths if cell not in fitted}
+
+
+def stage_munge(root, jobs, catalog):
+    """
+    Munge the measures of every normalized skeleton and its stored CellGraph
+    into the DataFrame `root/munged_dataframe.pkl`, see
+    network_het.MungeDataSet
+    """
+    import cPickle as pickle
+    from pipeline.graphstore import GraphStore
+    from network_het.MungeDataSet import (cell_background, load_backgrounds,
+                                          munge_cells, munge_frame)
+    graphs = GraphStore(op.join(root, 'graphs'))
+    backgrounds = load_backgrounds(root)
+    paths = skeletons(root, catalog)
+    failed = {}
+    cells = {}
+    for cell in sorted(paths):
+        if not graphs.index.get(cell):
+            failed[cell] = 'no graph, run the graph stage\n'
+            continue
+        try:
+            background = cell_background(backgrounds, cell)
+        except KeyError:
+            failed[cell] = 'no background value\n'
+            continue
+        cells[cell] = (paths[cell],
+                       op.join(graphs.folder, graphs.index.get(cell)['graph']),
+                       background)
+    store = ArtifactStore(op.join(root, 'artifacts'))
+    results = munge_cells(cells, jobs=jobs, store=store)
+    failed.update((cell, 'munge failed, see log\n') for cell in cells
+                  if cell not in results)
+    if results:
+        output = op.join(root, 'munged_dataframe.pkl')
+        with open(output, 'wb') as out:
+            pickle.dump(munge_frame(results), out)
+        store.put(store.entry('munge', 'dataframe',
+                              deps={'munge_cell/' + cell:
+                                    store.head('munge_cell', cell)
+                                    for cell in results}),
+                  outputs={'dataframe': output})
+        store.save()
+    return len(results), failed
+
+
+def stage_network_features(root, jobs, catalog):
+    """
+    Join the spectral descriptors and graphlet counts of every stored
+    CellGraph into `root/network_features.pkl`, with the per node orbit
+    counts in `root/graphlet_nodes.pkl`
+    """
+    import cPickle as pickle
+    from pipeline.graphstore import GraphStore
+    from network_het.graphlets import graphlet_tables
+    from network_het.spectral import spectral_table
+    graphs = GraphStore(op.join(root, 'graphs'))
+    paths = skeletons(root, catalog)
+    files = {cell: op.join(graphs.folder, graphs.index.get(cell)['graph'])
+             for cell in paths if graphs.index.get(cell)}
+    store = ArtifactStore(op.join(root, 'artifacts'))
+    spectral = spectral_table(files, jobs=jobs, store=store)
+    cells, nodes = graphlet_tables(files, jobs=jobs, store=store)
+    df = spectral.join(cells.drop('media', axis=1), how='outer')
+    outputs = {'network': op.join(root, 'network_features.pkl'),
+               'nodes': op.join(root, 'graphlet_nodes.pkl')}
+    with open(outputs['network'], 'wb') as output:
+        pickle.dump(df, output)
+    with open(outputs['nodes'], 'wb') as output:
+        pickle.dump(nodes, output)
+    deps = {}
+    for stage, table in (('spectral', spectral), ('graphlets', cells)):
+        deps.update(('{}/{}'.format(stage, cell), store.head(stage, cell))
+                    for cell in table.index)
+    store.put(store.entry('network_features', 'table', deps=deps),
+              outputs=outputs)
+    store.save()
+    failed = {cell: 'no graph, run the graph stage\n'
+              for cell in paths if cell not in files}
+    failed.update((cell, 'features failed, see log\n') for cell in files
+                  if cell not in spectral.index or cell not in cells.index)
+    return len(paths) - len(failed), failed
+
+
+# stage: (function, upstream stages)
+STAGES = OrderedDict([('normalize', (stage_normalize, ())),
+                      ('graph', (stage_graph, ('normalize',))),
+                      ('fit', (stage_fit, ('normalize',))),
+                      ('munge', (stage_munge, ('normalize', 'graph'))),
+                      ('network-features', (stage_network_features,
+                                            ('graph',)))])
+
+
+def schedule(stages):
+    """
+    Returns `stages` in dependency order, ValueError for unknown stages
+    """
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError('unknown stage(s) {}, choose from {}'.format(
+            ', '.join(sorted(unknown)), ', '.join(STAGES)))
+    order = []
+
+    def visit(stage):
+        for upstream in STAGES[stage][1]:
+            if upstream in stages:
+                visit(upstream)
+        if stage not in order:
+            order.append(stage)
+
+    for stage in STAGES:
+        if stage in stages:
+            visit(stage)
+    return order
+
+
+def run(root, stages, jobs=1):
+    """
+    Run `stages` on `root` in dependency order. Stages whose selected
+    upstream stage raised are skipped, failed cells do not stop a stage
+
+    Returns
+    -------
+    summary : list
+        dict of stage, status, seconds, done and failed cells per stage
+    """
+    catalog = FileCatalog(op.join(root, 'catalog.sqlite'))
+    summary = []
+    broken = set()
+    try:
+        for stage in schedule(stages):
+            func, upstream = STAGES[stage]
+            record = {'stage': stage, 'done': 0, 'failed': {},
+                      'seconds': 0.}
+            if broken.intersection(upstream):
+                record['status'] = 'skipped'
+                broken.add(stage)
+                summary.append(record)
+                continue
+            print '=' * 79 + '\n%s\n' % stage + '=' * 79
+            start = time.time()
+            try:
+                with prof.span(stage, 'stage'):
+                    record['done'], record['failed'] = func(root, jobs,
+                                                            catalog)
+                record['status'] = 'ok' if not record['failed'] else 'partial'
+            except Exception:  # pylint: disable=W0703
+                record['status'] = 'error'
+                record['error'] = traceback.format_exc()
+                print record['error']
+                broken.add(stage)
+            record['seconds'] = time.time() - start
+            summary.append(record)
+    finally:
+        catalog.close()
+    return summary
+
+
+def print_summary(summary):
+    """
+    Print a table of the stage status, timings and cell counts of a run
+    """
+    print '\n{:<16} {:<8} {:>10} {:>7} {:>7}'.format(
+        'stage', 'status', 'seconds', 'done', 'failed')
+    for rec in summary:
+        print '{:<16} {:<8} {:>10.1f} {:>7} {:>7}'.format(
+            rec['stage'], rec['status'], rec['seconds'], rec['done'],
+            len(rec['failed']))
+
+
+# modules imported by the stage workers, and the plotting/GUI packages
+# they must not import
+COMPUTE_MODULES = ('pipeline.write_raw_vtk',
+                   'pipeline.graphstore',
+                   'pipeline.pointgraph',
+                   'tubule_het.make_fitted_data',
+                   'network_het.mungedata.MungeDataFuncs',
+                   'network_het.MungeDataSet',
+                   'network_het.spectral',
+                   'network_het.graphlets',
+                   'mombud.functions.vtk_mbfuncs')
+HEAVY_MODULES = ('mayavi', 'tvtk', 'matplotlib', 'seaborn', 'statsmodels')
+# seconds allowed per module, see tests/test_imports.py
+IMPORT_BUDGET = 1.
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.time()
+import {}
+print(json.dumps([time.time() - start,
+                  sorted(m for m in {!r} if m in sys.modules)]))
+"""
+
+
+def probe_import(module):
+    """
+    Import `module` in a fresh interpreter, as a worker process would, and
+    return its import time in seconds and the HEAVY_MODULES it loaded.
+    CalledProcessError (with the traceback as `output`) if the import failed
+    """
+    out = subprocess.check_output(
+        [sys.executable, '-c', _IMPORT_PROBE.format(module, HEAVY_MODULES)],
+        cwd=op.dirname(op.abspath(__file__)),
+        stderr=subprocess.STDOUT)
+    seconds, heavy = json.loads(out.strip().splitlines()[-1])
+    return seconds, heavy
+
+
+def check_imports(budget=IMPORT_BUDGET):
+    """
+    Print the import time and heavy imports of each of COMPUTE_MODULES (see
+    probe_import()). Returns True if all imports took less than `budget`
+    seconds without loading a heavy module
+    """
+    passed = True
+    print '{:<40} {:>8}  {}'.format('module', 'seconds', 'heavy imports')
+    for module in COMPUTE_MODULES:
+        try:
+            seconds, heavy = probe_import(module)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            print '{:<40} {:>8}  {}'.format(module, 'FAILED',
+                                           getattr(e, 'output', e))
+            passed = False
+            continue
+        ok = seconds < budget and not heavy
+        passed &= ok
+        print '{:<40} {:>8.2f}  {}{}'.format(module, seconds,
+                                             ', '.join(heavy) or '-',
+                                             '' if ok else '  <-- over')
+    return passed
+
+
+def main(argv=None):
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description='Run the mito network pipeline without user input')
+    commands = parser.add_subparsers(dest='command')
+    runner = commands.add_parser('run', help='run pipeline stages')
+    runner.add_argument('--stages', default=','.join(STAGES),
+                        help='comma separated stages to run, from {} '
+                        '(default all)'.format(', '.join(STAGES)))
+    runner.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes (default 1)')
+    runner.add_argument('--root', default='mutants',
+                        help='data folder (default mutants)')
+    runner.add_argument('--summary', default=None,
+                        help='JSON file for the run summary (default '
+                        '<root>/run_summary.json)')
+    runner.add_argument('--profile', default=None, metavar='DIR',
+                        help='record timings in trace folder DIR')
+    runner.add_argument('--memory', action='store_true',
+                        help='with --profile, record the peak resident '
+                        'memory of each span and of its pool workers')
+    staler = commands.add_parser(
+        'stale', help='list the artifacts that are out of date')
+    staler.add_argument('--root', default='mutants',
+                        help='data folder (default mutants)')
+    checker = commands.add_parser(
+        'check-imports', help='time the imports of the worker modules')
+    checker.add_argument('--budget', type=float, default=IMPORT_BUDGET,
+                         help='seconds allowed per module (default '
+                         '{:g})'.format(IMPORT_BUDGET))
+    args = parser.parse_args(argv)
+
+    if args.command == 'check-imports':
+        return 0 if check_imports(args.budget) else 1
+    if args.command == 'stale':
+        stale = ArtifactStore(op.join(args.root, 'artifacts')).stale()
+        for stage, name in stale:
+            print '{:<12} {}'.format(stage, name)
+        return 1 if stale else 0
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    try:
+        schedule(stages)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.profile:
+        # before the pools are started, so that the workers inherit it
+        prof.clear(args.profile)
+        prof.enable(args.profile, memory=args.memory)
+    summary = run(args.root, stages, jobs=max(args.jobs, 1))
+    print_summary(summary)
+    if args.profile:
+        events = prof.load(args.profile)
+        prof.export_chrome(events, op.join(args.profile, 'trace.json'))
+        prof.print_summary(events)
+    with open(args.summary or op.join(args.root, 'run_summary.json'),
+              'w') as out:
+        json.dump(summary, out, indent=1, sort_keys=True)
+    return 0 if all(rec['status'] == 'ok' for rec in summary) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the dependency tracking of pipeline.artifacts, on a chain of
+artifacts laid out as the pipeline stages record them:
+
+    raw skeleton -> normalize -> graph -> spectral -> munge
+"""
+import os.path as op
+from pipeline.artifacts import ArtifactStore, cached_map
+# pylint: disable=C0103
+
+
+def _write(fpath, text):
+    with open(fpath, 'w') as out:
+        out.write(text)
+
+
+def _pipeline(folder, background=1.):
+    """
+    Record the chain of one cell in a store in `folder`, returns the store
+    and the head keys by stage
+    """
+    store = ArtifactStore(op.join(folder, 'artifacts'))
+    raw = op.join(folder, 'raw.vtk')
+    if not op.isfile(raw):
+        _write(raw, 'raw skeleton')
+    norm = op.join(folder, 'norm.vtk')
+    graph = op.join(folder, 'graph.pkl')
+    table = op.join(folder, 'munged.pkl')
+
+    entry = store.entry('normalize', 'cell', files={'skel': raw},
+                        values={'background': background})
+    _write(norm, 'normalized {}'.format(background))
+    store.put(entry, outputs={'vtk': norm})
+
+    entry = store.entry('graph', 'cell', files={'skel': norm})
+    _write(graph, 'graph of ' + open(norm).read())
+    store.put(entry, outputs={'graph': graph})
+
+    store.get('spectral', 'cell', lambda: {'nodes': 3},
+              files={'input': graph})
+
+    entry = store.entry('munge', 'network',
+                        deps={'spectral/cell': store.head('spectral',
+                                                          'cell')})
+    _write(table, 'munged')
+    store.put(entry, outputs={'network': table})
+    store.save()
+    return store, {stage: store.head(stage, name) for stage, name in
+                   (('normalize', 'cell'), ('graph', 'cell'),
+                    ('spectral', 'cell'), ('munge', 'network'))}
+
+
+def test_input_files_made_by_artifacts_are_deps(tmpdir):
+    store, keys = _pipeline(str(tmpdir))
+    assert store.index.get(keys['graph'])['deps'] == {
+        'skel': keys['normalize']}
+    assert store.index.get(keys['spectral'])['deps'] == {
+        'input': keys['graph']}
+    assert store.downstream(keys['normalize']) == set(
+        [keys['graph'], keys['spectral'], keys['munge']])
+    assert store.stale() == []
+
+
+def test_changed_input_marks_the_chain_stale(tmpdir):
+    store, _ = _pipeline(str(tmpdir))
+    _write(op.join(str(tmpdir), 'raw.vtk'), 'edited raw skeleton')
+    assert store.stale() == [('graph', 'cell'), ('munge', 'network'),
+                             ('normalize', 'cell'), ('spectral', 'cell')]
+
+
+def test_changed_output_marks_its_consumers_stale(tmpdir):
+    store, _ = _pipeline(str(tmpdir))
+    _write(op.join(str(tmpdir), 'graph.pkl'), 'edited graph')
+    assert store.stale() == [('graph', 'cell'), ('munge', 'network'),
+                             ('spectral', 'cell')]
+
+
+def test_rerun_upstream_marks_the_chain_stale(tmpdir):
+    _, old = _pipeline(str(tmpdir))
+    store = ArtifactStore(op.join(str(tmpdir), 'artifacts'))
+    raw = op.join(str(tmpdir), 'raw.vtk')
+    entry = store.entry('normalize', 'cell', files={'skel': raw},
+                        values={'background': 2.})
+    _write(op.join(str(tmpdir), 'norm.vtk'), 'normalized 2.0')
+    store.put(entry, outputs={'vtk': op.join(str(tmpdir), 'norm.vtk')})
+    assert entry['key'] != old['normalize']
+    assert store.stale() == [('graph', 'cell'), ('munge', 'network'),
+                             ('spectral', 'cell')]
+    # rebuilding downstream brings the chain up to date
+    _, new = _pipeline(str(tmpdir), background=2.)
+    assert new['normalize'] == entry['key']
+    assert new['graph'] != old['graph']
+    assert ArtifactStore(op.join(str(tmpdir), 'artifacts')).stale() == []
+
+
+def test_prune_keeps_output_files(tmpdir):
+    _pipeline(str(tmpdir))
+    store, _ = _pipeline(str(tmpdir), background=2.)
+    assert store.prune() == 4
+    assert op.isfile(op.join(str(tmpdir), 'norm.vtk'))
+    assert store.stale() == []
+
+
+def _fail_on_bad(args):
+    name, path = args
+    return name, None if name == 'bad' else open(path).read()
+
+
+def test_cached_map_leaves_out_failed_names(tmpdir):
+    files = {}
+    for name in ('bad', 'good'):
+        files[name] = op.join(str(tmpdir), name + '.txt')
+        _write(files[name], name)
+    store = ArtifactStore(op.join(str(tmpdir), 'artifacts'))
+    assert cached_map(_fail_on_bad, files, store, 'read') == {'good': 'good'}
+    assert store.head('read', 'bad') is None
+
+
+def _join(args):
+    name, paths, values = args
+    return name, open(paths['a']).read() + values['suffix']
+
+
+def test_cached_map_files_and_values_by_name(tmpdir):
+    path = op.join(str(tmpdir), 'a.txt')
+    _write(path, 'a')
+    store = ArtifactStore(op.join(str(tmpdir), 'artifacts'))
+    assert cached_map(_join, {'cell': {'a': path}}, store, 'join',
+                      values={'cell': {'suffix': '1'}}) == {'cell': 'a1'}
+    key = store.head('join', 'cell')
+    # same inputs are loaded, a changed value is recomputed
+    assert cached_map(_join, {'cell': {'a': path}}, store, 'join',
+                      values={'cell': {'suffix': '1'}}) == {'cell': 'a1'}
+    assert store.head('join', 'cell') == key
+    assert cached_map(_join, {'cell': {'a': path}}, store, 'join',
+                      values={'cell': {'suffix': '2'}}) == {'cell': 'a2'}
+    assert store.head('join', 'cell') != key
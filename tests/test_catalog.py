@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the file name parsing and queries of pipeline.catalog
+"""
+import os
+import os.path as op
+import sqlite3
+from pipeline.catalog import FileCatalog, parse_name
+# pylint: disable=C0103
+
+
+def test_parse_normalize_output():
+    assert parse_name('Normalized_YPE_042515_001_RFPstack_000_mitoskel.vtk') \
+        == {'cellkey': 'YPE_042515_001_RFPstack_000', 'date': '042515',
+            'channel': 'RFP', 'kind': 'skeleton'}
+    assert parse_name('Norm_YPE_042515_001_RFPstack_000_skeleton.vtp') \
+        == {'cellkey': 'YPE_042515_001_RFPstack_000', 'date': '042515',
+            'channel': 'RFP', 'kind': 'skeleton'}
+
+
+def test_query_finds_normalize_outputs(tmpdir):
+    folder = op.join(str(tmpdir), 'Normalized')
+    os.makedirs(folder)
+    for name in ('Normalized_YPE_042515_001_RFPstack_000_mitoskel.vtk',
+                 'manifest.json'):
+        open(op.join(folder, name), 'w').close()
+    dbpath = op.join(str(tmpdir), 'catalog.sqlite')
+    catalog = FileCatalog(dbpath)
+    assert catalog.query(folder, kind='skeleton', date='042515') == [
+        (folder, 'Normalized_YPE_042515_001_RFPstack_000_mitoskel.vtk')]
+    catalog.close()
+
+
+def test_old_catalog_rows_are_parsed_again(tmpdir):
+    folder = op.join(str(tmpdir), 'Normalized')
+    os.makedirs(folder)
+    name = 'Normalized_YPE_042515_001_RFPstack_000_mitoskel.vtk'
+    open(op.join(folder, name), 'w').close()
+    dbpath = op.join(str(tmpdir), 'catalog.sqlite')
+    FileCatalog(dbpath).refresh(folder)
+    # as cataloged by a parser that did not know the name
+    conn = sqlite3.connect(dbpath)
+    with conn:
+        conn.execute("UPDATE files SET kind = 'vtk', cellkey = NULL")
+        conn.execute('PRAGMA user_version = 0')
+    conn.close()
+    catalog = FileCatalog(dbpath)
+    assert catalog.query(folder, kind='skeleton') == [(folder, name)]
+    catalog.close()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+The import budget of the modules loaded by the pipeline worker processes,
+see `python sweepython.py check-imports`
+"""
+import os.path as op
+import re
+import subprocess
+import sys
+import pytest
+import sweepython
+# pylint: disable=C0103
+
+REPO = op.dirname(op.dirname(op.abspath(__file__)))
+
+# fits and munges a normalized Y shaped skeleton written to argv[1], then
+# prints the mayavi packages loaded on the way
+_WORKER_PROBE = """
+import sys
+import numpy as np
+import vtk
+import vtk.util.numpy_support as vnpy
+from pipeline.make_networkx import cellgraph
+from pipeline.vtkio import write_polydata
+from network_het.MungeDataSet import munge_cell
+from tubule_het.make_fitted_data import fit_cell
+
+points = vtk.vtkPoints()
+points.InsertNextPoint(0., 0., 0.)
+lines = vtk.vtkCellArray()
+for direction in ([1., 0., 0.], [-1., 1., 0.], [-1., -1., 0.]):
+    lines.InsertNextCell(6)
+    lines.InsertCellPoint(0)
+    for step in range(1, 6):
+        lines.InsertCellPoint(points.InsertNextPoint(
+            *(.1 * step * np.array(direction))))
+skel = vtk.vtkPolyData()
+skel.SetPoints(points)
+skel.SetLines(lines)
+rand = np.random.RandomState(0)
+for name in ('DY_minmax', 'DY_raw', 'rGFP', 'rRFP', 'WidthEq', 'TubeWidth'):
+    array = vnpy.numpy_to_vtk(
+        rand.uniform(.1, 1., points.GetNumberOfPoints()), deep=1)
+    array.SetName(name)
+    skel.GetPointData().AddArray(array)
+write_polydata(skel, sys.argv[1])
+
+fit_cell('YPE_cell_001', sys.argv[1])
+munge_cell('YPE_cell_001', sys.argv[1], cellgraph(skel, 'YPE_cell_001'),
+           (0., 0.))
+print(sorted(m for m in ('mayavi', 'tvtk') if m in sys.modules))
+"""
+
+
+@pytest.mark.parametrize('module', sweepython.COMPUTE_MODULES)
+def test_worker_import_is_light(module):
+    try:
+        seconds, heavy = sweepython.probe_import(module)
+    except subprocess.CalledProcessError as e:
+        missing = re.findall(r"No module named '?([\w.]+)", e.output)
+        # a third party package missing here, not a broken import of ours
+        if missing and not op.exists(op.join(REPO,
+                                             missing[-1].split('.')[0])):
+            pytest.skip('{} is not installed'.format(missing[-1]))
+        raise
+    assert heavy == []
+    assert seconds < sweepython.IMPORT_BUDGET
+
+
+def test_workers_do_not_load_mayavi(tmpdir):
+    for package in ('vtk', 'networkx', 'pandas'):
+        pytest.importorskip(package)
+    out = subprocess.check_output(
+        [sys.executable, '-c', _WORKER_PROBE,
+         op.join(str(tmpdir), 'skel.vtk')],
+        cwd=REPO, stderr=subprocess.STDOUT)
+    assert out.strip().splitlines()[-1] == '[]'
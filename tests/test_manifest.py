@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the batch runner of pipeline.manifest
+"""
+import os.path as op
+import pytest
+from pipeline import manifest as mf
+# pylint: disable=C0103
+
+
+def _square(cell):
+    if cell == 3:
+        raise ValueError('bad cell')
+    return cell, cell * cell
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_map_cells_saves_every_result(tmpdir, jobs):
+    manifest = mf.Manifest(op.join(str(tmpdir), 'manifest.json'))
+
+    def handle(result):
+        cell, value = result
+        manifest.update(str(cell), value)
+        return cell, 'done', cell == 0
+
+    mf.map_cells(_square, [0, 1, 2], handle, [manifest, None], jobs)
+    assert mf.Manifest(manifest.fpath).entries == {'0': 0, '1': 1, '2': 4}
+
+
+def test_map_cells_saves_on_failure(tmpdir):
+    manifest = mf.Manifest(op.join(str(tmpdir), 'manifest.json'))
+
+    def handle(result):
+        manifest.update(str(result[0]), result[1])
+        return result[0], 'done', False
+
+    with pytest.raises(ValueError):
+        mf.map_cells(_square, [1, 2, 3], handle, [manifest])
+    assert mf.Manifest(manifest.fpath).entries == {'1': 1, '2': 4}
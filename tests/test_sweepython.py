@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+End to end runs of the sweepython stages on a synthetic cell: a Y shaped
+skeleton in two random binary volumes
+"""
+import os
+import os.path as op
+import cPickle as pickle
+import numpy as np
+import pytest
+vtk = pytest.importorskip('vtk')
+pytest.importorskip('networkx')
+import sweepython
+from pipeline import pipefuncs
+# pylint: disable=C0103
+
+DIMS = (20, 20, 10)
+
+
+def _write_volume(fpath, values):
+    """
+    Write `values` (x fastest) as a BINARY legacy STRUCTURED_POINTS file
+    """
+    header = ['# vtk DataFile Version 3.0',
+              'resampled',
+              'BINARY',
+              'DATASET STRUCTURED_POINTS',
+              'DIMENSIONS {} {} {}'.format(*DIMS),
+              'SPACING 1 1 1',
+              'ORIGIN 0 0 0',
+              'POINT_DATA {}'.format(values.size),
+              'SCALARS scalars unsigned_short',
+              'LOOKUP_TABLE default']
+    with open(fpath, 'wb') as out:
+        out.write(('\n'.join(header) + '\n').encode('ascii'))
+        out.write(values.astype('>u2').tobytes())
+
+
+def _write_skeleton(fpath):
+    """
+    Write a MitoGraph like skeleton of three branches meeting at one point,
+    with a `Width` array, inside the volumes of _write_volume()
+    """
+    center = np.array([10., 10., 5.])
+    points = vtk.vtkPoints()
+    points.InsertNextPoint(*(center * .055))
+    lines = vtk.vtkCellArray()
+    for direction in ([1, 0, 0], [-1, 1, 0], [-1, -1, 0]):
+        ids = [0]
+        for step in range(1, 7):
+            ids.append(points.InsertNextPoint(
+                *((center + step * np.array(direction)) * .055)))
+        lines.InsertNextCell(len(ids))
+        for pid in ids:
+            lines.InsertCellPoint(pid)
+    width = vtk.vtkFloatArray()
+    width.SetName('Width')
+    for pid in range(points.GetNumberOfPoints()):
+        width.InsertNextValue(.3 + .01 * pid)
+    skel = vtk.vtkPolyData()
+    skel.SetPoints(points)
+    skel.SetLines(lines)
+    skel.GetPointData().SetScalars(width)
+    writer = vtk.vtkPolyDataWriter()
+    writer.SetFileName(fpath)
+    writer.SetInputData(skel)
+    writer.Write()
+
+
+def _cell(root):
+    """
+    Write the MitoGraph output and background of one cell below `root`
+    """
+    cells = op.join(root, 'pre_normalized', 'YPE')
+    os.makedirs(cells)
+    rand = np.random.RandomState(0)
+    _write_skeleton(op.join(cells, 'RFPstack_001_skeleton.vtk'))
+    for channel in ('RFP', 'GFP'):
+        _write_volume(op.join(cells, channel + 'stack_001_resampled.vtk'),
+                      rand.randint(200, 1000, size=np.prod(DIMS)))
+    with open(op.join(root, 'pre_normalized', 'background_all.pkl'),
+              'wb') as out:
+        pickle.dump({'YPE_RFPstack': {'ch1': 150., 'ch2': 150.}}, out)
+
+
+def test_normalize_graph_fit(tmpdir):
+    root = str(tmpdir)
+    _cell(root)
+    summary = sweepython.run(root, ['normalize', 'graph', 'fit'])
+    assert [(rec['stage'], rec['status'], rec['done'])
+            for rec in summary] == [('normalize', 'ok', 1),
+                                    ('graph', 'ok', 1),
+                                    ('fit', 'ok', 1)]
+    for subfolder in ('fitted_data', 'fitted_data_scaled'):
+        assert op.isfile(op.join(root, subfolder, 'YPE_RFPstack_001.pkl'))
+    reader = vtk.vtkPolyDataReader()
+    reader.SetFileName(op.join(root, 'pre_normalized', 'Normalized',
+                               'Normalized_YPE_RFPstack_001_mitoskel.vtk'))
+    reader.Update()
+    pdata = reader.GetOutput().GetPointData()
+    # each array once, under the names read by the graph, fit and munge
+    assert sorted(pdata.GetArrayName(i)
+                  for i in range(pdata.GetNumberOfArrays())) == sorted(
+                      pipefuncs.LEGACY_NAMES.values())
+
+
+def test_normalize_graph_munge(tmpdir):
+    pd = pytest.importorskip('pandas')
+    root = str(tmpdir)
+    _cell(root)
+    summary = sweepython.run(root, ['normalize', 'graph', 'munge'])
+    assert [(rec['stage'], rec['status'], rec['done'])
+            for rec in summary] == [('normalize', 'ok', 1),
+                                    ('graph', 'ok', 1),
+                                    ('munge', 'ok', 1)]
+    df = pd.read_pickle(op.join(root, 'munged_dataframe.pkl'))
+    assert list(df.index) == ['YPE_RFPstack_001']
+    assert df.loc['YPE_RFPstack_001', 'mito_edgenum'] == 3
+    assert df.loc['YPE_RFPstack_001', 'media'] == 'YPE'
@@ -8,49 +8,60 @@ from collections import defaultdict
 import numpy as np
 from numpy.random import choice as samp_no_rep
 import scipy.stats as sp
+import vtk.util.numpy_support as vnpy
+from pipeline import profiling as prof
+from pipeline.polylines import PolylineTable
 # pylint: disable=C0103
 
 
+def point_array(data, voi):
+    """Return point data array `voi` of VTK or tvtk polydata `data` as a
+    flat numpy array, without going through tvtk
+    """
+    data = getattr(data, '_vtk_obj', data)  # tvtk wrapper
+    return np.ravel(vnpy.vtk_to_numpy(data.GetPointData().GetArray(voi)))
+
+
 def getBptsEpts(vtkData, curGrph):
     """Return branchpoints and endpoints Indexes
 
     Parameters
     ----------
     vtkData :
-        Vtk polydata cell
+        Vtk (or tvtk) polydata cell
     curGrph :
         Network x graph
     """
+    vtkData = getattr(vtkData, '_vtk_obj', vtkData)  # tvtk wrapper
     bpts = [
         curGrph.node[i]['coord'] for i in curGrph.nodes()
         if curGrph.node[i]['degree'] > 1]
-    bptsId = [vtkData.find_point(el) for el in bpts]
+    bptsId = [vtkData.FindPoint(el) for el in bpts]
 
     epts = [
         curGrph.node[i]['coord'] for i in curGrph.nodes()
         if curGrph.node[i]['degree'] == 1]
-    eptsId = [vtkData.find_point(el) for el in epts]
+    eptsId = [vtkData.FindPoint(el) for el in epts]
 
     return(bptsId, eptsId)
 
 
-def pointIdsList(data):
+def pointIdsList(data, table=None):
     """Return pointIdList
 
     Parameters
     ----------
     data :
         Vtk polydata cell
+    table :
+        PolylineTable of data, built if not given
     """
-    lines = []
-    for el in range(data.number_of_lines):
-        temp = np.ravel(data.get_cell(el).point_ids)
-        lines.append(temp)
-    pointIds = np.unique([el for ln in lines for el in ln])
-    return pointIds
+    if table is None:
+        table = PolylineTable.from_polydata(data, [])
+    return np.unique(table.pids)
 
 
-def vtkdata(data, voi='DY_minmax'):
+def vtkdata(data, voi='DY_minmax', table=None):
     """Return flattened list of variable of interest (VOR) from vtkdata
     default vor is DY_minmax if kwarg not specified
 
@@ -60,23 +71,21 @@ def vtkdata(data, voi='DY_minmax'):
         vtk reader output
     voi:
         rRFP|rGFP|TubeWidth|DY_minmax|DY_raw|WidthEq|bkstGFP|bkstRFP
+    table:
+        PolylineTable of data with a voi column, built if not given
 
     Returns
     -------
     norm:
-        list of edges data values
+        list of edges data values, one list per edge
      """
-    norm = []
-    pdata = data.point_data
-    datavals = np.ravel(pdata.get_array(voi))
+    if table is None:
+        table = PolylineTable.from_polydata(data, [voi])
+    # lists as before the table, this goes into the fitted_data pickles
+    return [edge.tolist() for edge in table.edges(voi)]
 
-    for j in range(data.number_of_lines):
-        cids = data.get_cell(j).point_ids
-        norm.append([datavals[i] for i in cids])
-    return norm
 
-
-def vtklineids(data, graph):
+def vtklineids(data, graph, table=None):
     """Return flattened list of variable of interest (VOR) from vtkdata
     default vor is DY_minmax if kwarg not specified
 
@@ -84,34 +93,28 @@ def vtklineids(data, graph):
     ----------
     data:
         vtk reader output
+    table:
+        PolylineTable of data, built if not given
 
     Returns
     -------
     lid:
         list of edges data point ids
      """
+    if table is None:
+        table = PolylineTable.from_polydata(data, [])
     lid = defaultdict(dict)
-    firstId = 0
     bpts, _ = getBptsEpts(data, graph)
-    for j in range(data.number_of_lines):
-        lid[j] = []
-        cid = data.get_cell(j).point_ids
-        temp = [cid[0], cid[-1]]  # first and last point on cell
-        if temp[0] in bpts:
-            lid[j].append(('b', firstId))
-        else:
-            lid[j].append(('e', firstId))
-
-        if temp[1] in bpts:
-            lid[j].append(('b', firstId+len(cid)))
-        else:
-            lid[j].append(('e', firstId+len(cid)))
-
-        firstId += len(cid)
+    # first and last point on cell
+    isbpt = {'first': np.in1d(table.first, bpts),
+             'last': np.in1d(table.last, bpts)}
+    for j in range(len(table)):
+        lid[j] = [('b' if isbpt['first'][j] else 'e', table.offsets[j]),
+                  ('b' if isbpt['last'][j] else 'e', table.offsets[j + 1])]
     return lid
 
 
-def vtkshuf(data, voi='DY_minmax'):
+def vtkshuf(data, voi='DY_minmax', table=None):
     """Return shuffled list of variable of interest (VOR) from vtkdata
     default vor is DY_minmax if kwarg not specified
 
@@ -121,28 +124,29 @@ def vtkshuf(data, voi='DY_minmax'):
         vtk reader output
     voi:
         rRFP|rGFP|TubeWidth|DY_minmax|DY_raw|WidthEq|bkstGFP|bkstRFP
+    table:
+        PolylineTable of data, built if not given
     Returns
     -------
     normpermute:
         shuffled distr using np.choice (samp_no_rep)
 
      """
+    if table is None:
+        table = PolylineTable.from_polydata(data, [])
     normpermute = []
-    ptIds = pointIdsList(data)
-    pdata = data.point_data
-    datavals = np.ravel(pdata.get_array(voi))
-
-    for j in range(data.number_of_lines):
-        cids = data.get_cell(j).point_ids
+    ptIds = pointIdsList(data, table)
+    datavals = point_array(data, voi)
 
+    for npts in table.counts:
         # sampl cell pointIds w.o replace
-        shuffledIds = samp_no_rep(ptIds, len(cids), replace=False)
+        shuffledIds = samp_no_rep(ptIds, npts, replace=False)
         normpermute.append(
             [datavals[int(k)] for k in shuffledIds])
     return normpermute
 
 
-def vtksamp(data, voi='DY_minmax'):
+def vtksamp(data, voi='DY_minmax', table=None):
     """Return a fitted uniform and normal list of variable of interest (VOR)
     from vtkdata, default vor is DY_minmax if kwarg not specified
 
@@ -152,6 +156,8 @@ def vtksamp(data, voi='DY_minmax'):
         vtk reader output
     voi:
         rRFP|rGFP|TubeWidth|DY_minmax|DY_raw|WidthEq|bkstGFP|bkstRFP
+    table:
+        PolylineTable of data, built if not given
 
     Returns
     -------
@@ -160,10 +166,11 @@ def vtksamp(data, voi='DY_minmax'):
     sampU:
         scipy unifrm distr bounded by .01 and .99 percentile of act dist
      """
-    temp = data.point_data
+    if table is None:
+        table = PolylineTable.from_polydata(data, [])
     sampN = []
     sampU = []
-    datavals = np.ravel(temp.get_array(voi))
+    datavals = point_array(data, voi)
     cellMeans = np.mean(datavals)
     cellStds = np.std(datavals)
 
@@ -174,13 +181,13 @@ def vtksamp(data, voi='DY_minmax'):
     a = cellMeans - 1.5 * cellStds
     U = sp.uniform(  # uniform distribution
         a.clip(min=0), cellMeans + 1.5 * cellStds)
-    for line in range(data.number_of_lines):
-        M = data.get_cell(line).number_of_points
+    for M in table.counts:
         sampN.append(N.rvs(size=M))
         sampU.append(U.rvs(size=M))
     return (sampN, sampU)
 
 
+@prof.timed(cat='fit')
 def fitDist(vdata, grph):
     """Return fitted distributions for bootstrapping
      branchpoints Delta Psi
@@ -188,7 +195,7 @@ def fitDist(vdata, grph):
     Parameters
     ----------
     vdata :
-        tvtk data
+        vtk (or tvtk) data
     grph :
         Network x graph objects, generated from
         03createEdgeNodeListMulti.py
@@ -211,20 +218,22 @@ def fitDist(vdata, grph):
         type of point (branch/end)
     """
 
+    table = PolylineTable.from_polydata(vdata, ['DY_minmax', 'DY_raw'])
+
     #   actual distribution
-    Scaled = vtkdata(vdata)
-    unScaled = vtkdata(vdata, voi='DY_raw')
-    lineId = vtklineids(vdata, grph)
+    Scaled = vtkdata(vdata, table=table)
+    unScaled = vtkdata(vdata, voi='DY_raw', table=table)
+    lineId = vtklineids(vdata, grph, table=table)
 
 #       shuffle distribution
-    sPermute = vtkshuf(vdata)
-    rPermute = vtkshuf(vdata, voi='DY_raw')
+    sPermute = vtkshuf(vdata, table=table)
+    rPermute = vtkshuf(vdata, voi='DY_raw', table=table)
 
 #       random distributions
-    sampN = vtksamp(vdata)[0]
-    sampU = vtksamp(vdata)[1]
-    sampNRaw = vtksamp(vdata, voi='DY_raw')[0]
-    sampURaw = vtksamp(vdata, voi='DY_raw')[1]
+    sampN = vtksamp(vdata, table=table)[0]
+    sampU = vtksamp(vdata, table=table)[1]
+    sampNRaw = vtksamp(vdata, voi='DY_raw', table=table)[0]
+    sampURaw = vtksamp(vdata, voi='DY_raw', table=table)[1]
 
     return(sampN, sampU, Scaled, sPermute,
            sampNRaw, sampURaw, unScaled, rPermute,
@@ -32,7 +32,7 @@ plt.close('all')
 datadir = op.join(os.getcwd(), 'mutants')
 rawdir = op.join(os.getcwd(), 'mutants')
 vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
-                 '*skeleton.vtk', start=5, stop=-13)
+                 '*skeleton.vt[kp]', start=5, stop=-13)
 
 ACU = defaultdict(dict)  # uniform dist autocors
 ACN = defaultdict(dict)  # Normal dist autocors
@@ -6,66 +6,72 @@ Script to create a distribution of lags for Intensities along edges of cells
 import os
 import os.path as op
 import cPickle as pickle
+import traceback
 from tubule_het.autoCor.fitDistr import fitDist
+from pipeline import profiling as prof
 from pipeline.make_networkx import makegraph
 import wrappers as wr
-import vtk
-from tvtk.api import tvtk
-# =============================================================================
-#           Data initialization
-# =============================================================================
-rawdir = op.join(os.getcwd(), 'old_w_new')
-vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
-                 '*skeleton.vtk', start=5, stop=-13)
+from pipeline.vtkio import read_polydata
 
-for mediatype in sorted(vtkF.keys())[:]:
-    for filekey in sorted(vtkF[mediatype].keys())[:]:
-        lNorm = []
-        lNormP = []
-        llineId = []
-        randNDY = []
-        randUDY = []
 
-        #scaled versions
-        lNorm_s = []
-        lNormP_s = []
-        randNDY_s = []
-        randUDY_s = []
+@prof.timed(cat='cell', cell='filekey')
+def fit_cell(filekey, vtkpath):
+    """
+    Returns the unscaled and scaled fitted data of cell `filekey` with
+    skeleton `vtkpath`, each a tuple of (lNorm, lNormP, randNDY, randUDY,
+    llineId) lists as pickled in `fitted_data` and `fitted_data_scaled`
+    """
+    vtkdata = read_polydata(vtkpath)
+    _, _, nxgrph = makegraph(vtkdata, filekey)
+    output = fitDist(vtkdata, nxgrph)
 
-        reader = vtk.vtkPolyDataReader()
-        reader.SetFileName(vtkF[mediatype][filekey])
-        reader.Update()
-        vtkdata = reader.GetOutput()
-        tvtkdata = tvtk.to_tvtk(vtkdata)
+    #    0:4 for scaled, 5:8 for unscaled
+    sampN, sampU, Scaled, sPermute = output[0:4]
+    sampNRaw, sampURaw, unScaled, rPermute = output[4:8]
+    llineId = [output[-1:]]
+    return (([unScaled], [rPermute], [sampNRaw], [sampURaw], llineId),
+            ([Scaled], [sPermute], [sampN], [sampU], llineId))
 
-        _, _, nxgrph = makegraph(vtkdata, filekey)
-        output = fitDist(tvtkdata, nxgrph)
 
-        lineId = output[-1:]
-        #    0:4 for scaled, 5:8 for unscaled
-        sampN, sampU, Scaled, sPermute = output[0:4]
-        sampNRaw, sampURaw, unScaled, rPermute = output[4:8]
-        lineId = output[-1:]
-        llineId.append(lineId)
+def write_fitted(rawdir, filekey, fitted):
+    """
+    Write the (unscaled, scaled) `fitted` data of cell `filekey` returned by
+    fit_cell() into the `fitted_data` and `fitted_data_scaled` subfolders of
+    `rawdir`, returns the paths of the two files
+    """
+    paths = []
+    for subfolder, data in zip(('fitted_data', 'fitted_data_scaled'),
+                               fitted):
+        if not op.isdir(op.join(rawdir, subfolder)):
+            os.makedirs(op.join(rawdir, subfolder))
+        paths.append(op.join(rawdir, subfolder, "%s.pkl" % filekey))
+        with open(paths[-1], 'wb') as OUT:
+            pickle.dump(data, OUT, protocol=2)
+    return paths
 
-        lNorm.append(unScaled)
-        lNormP.append(rPermute)
-        randNDY.append(sampNRaw)
-        randUDY.append(sampURaw)
 
-        lNorm_s.append(Scaled)
-        lNormP_s.append(sPermute)
-        randNDY_s.append(sampN)
-        randUDY_s.append(sampU)
+def fit_task(args):
+    """
+    Pool worker for fit_cell(), returns (filekey, fitted data), or
+    (filekey, None) after printing the traceback if the cell failed
+    """
+    filekey, vtkpath = args
+    try:
+        return filekey, fit_cell(filekey, vtkpath)
+    except Exception:  # pylint: disable=W0703
+        print "%s failed:\n%s" % (filekey, traceback.format_exc())
+        return filekey, None
 
-        print "append norm dist %s" % filekey
+# =============================================================================
+#           Data initialization
+# =============================================================================
+if __name__ == '__main__':
+    rawdir = op.join(os.getcwd(), 'old_w_new')
+    vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
+                     '*skeleton.vt[kp]', start=5, stop=-13)
 
-        with open(
-         op.join(rawdir, 'fitted_data', "%s.pkl" % filekey), 'wb') as OUT:
-            pickle.dump((lNorm, lNormP, randNDY, randUDY, llineId),
-                        OUT, protocol=2)
-        with open(
-         op.join(rawdir,
-                 'fitted_data_scaled', "%s.pkl" % filekey), 'wb') as OT:
-            pickle.dump((lNorm_s, lNormP_s, randNDY_s, randUDY_s, llineId),
-                        OT, protocol=2)
+    for mediatype in sorted(vtkF.keys())[:]:
+        for filekey in sorted(vtkF[mediatype].keys())[:]:
+            write_fitted(rawdir, filekey,
+                         fit_cell(filekey, vtkF[mediatype][filekey]))
+            print "append norm dist %s" % filekey
@@ -8,8 +8,8 @@ respective random fitted distributions
 import matplotlib.pyplot as plt
 import glob
 import os
-import cPickle as pickle
 import seaborn as sns
+from pipeline.graphstore import GraphStore
 from tubule_het.autoCor.fitDistr import fitDist as fitd
 import numpy as np
 import pandas as pd
@@ -34,19 +34,20 @@ dic = {'1YPE_042515_001_RFPstack_000': 17,
        '2YPL_042515_001_RFPstack_002': 62,
        '3YPR_042715_003_RFPstack_004': 27}
 df = pd.DataFrame()
+# the graph store of the data folder, as make_networkx
+graphs = GraphStore(os.path.join(os.path.dirname(os.getcwd()), 'graphs'))
 
 for k in sorted(dic.keys()):
     labs = k[1:4]
     print'\nNow on %s' % labs+"\n"+"="*79
     files = glob.glob(dirlist[labs]+r'\Norm*vtk')
-    with open(
-        os.path.join(
-            dirlist[labs], '%s_grph.pkl' % labs), 'rb') as inpt:
-        G = pickle.load(inpt)[2]
-        Graphs = {i.graph['cell']: i for i in G}
-        output = fitd(files, Graphs)
-        data = output[0]
-        sampN, sampU, Norm, NormPermute = output[1:5]
+    Graphs = {}
+    for f in files:
+        name = os.path.basename(f)[5:-13]  # Norm_<cell>_skeleton.vtk
+        Graphs[name] = graphs.get(name, f).to_networkx()
+    output = fitd(files, Graphs)
+    data = output[0]
+    sampN, sampU, Norm, NormPermute = output[1:5]
 
     cell = k[1:]
 
@@ -65,6 +66,7 @@ for k in sorted(dic.keys()):
                            'Shuffled': pd.Series(NormPermute[cell][dic[k]])})
     dftemp['media'] = labs
     df = df.append(dftemp)
+graphs.save()
 df['pos'] = df.index
 
 with sns.plotting_context('talk', font_scale=1.3):
@@ -11,11 +11,11 @@ import cPickle as pickle
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
-import vtk
 from tvtk.api import tvtk
 from tubule_het.autoCor.fitDistr import fitDist
 import wrappers as wr
 from pipeline.make_networkx import makegraph
+from pipeline.vtkio import read_polydata
 # pylint: disable=C0103
 
 sns.set_context("talk")
@@ -39,7 +39,7 @@ plt.close('all')
 datadir = op.join(os.getcwd(), 'data')
 rawdir = op.join(os.getcwd(), 'output')
 vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
-                 '*skeleton.vtk', start=5, stop=-13)
+                 '*skeleton.vt[kp]', start=5, stop=-13)
 
 
 def plotcelldist(axeshand, dstr, labels, **kwargs):
@@ -76,10 +76,7 @@ def plotcelldist(axeshand, dstr, labels, **kwargs):
 if __name__ == "__main__":
     filekey = "YPE_042515_001_RFPstack_000"
     mediatype = "YPE"
-    reader = vtk.vtkPolyDataReader()
-    reader.SetFileName(vtkF[mediatype][filekey])
-    reader.Update()
-    vtkdata = reader.GetOutput()
+    vtkdata = read_polydata(vtkF[mediatype][filekey])
     tvtkdata = tvtk.to_tvtk(vtkdata)
     _, _, nxgrph = makegraph(vtkdata, filekey)
 # ONLY RUN THESE LINES IF WANT TO REFIT NEW DISTRIBUTIONS!!
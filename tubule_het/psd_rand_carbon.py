@@ -30,7 +30,7 @@ plt.close('all')
 datadir = op.join(os.getcwd(), 'data')
 rawdir = op.join(os.getcwd(), 'output')
 vtkF = wr.ddwalk(op.join(rawdir, 'normalizedVTK'),
-                 '*skeleton.vtk', start=5, stop=-13)
+                 '*skeleton.vt[kp]', start=5, stop=-13)
 
 PSDY = defaultdict(dict)  # DY_scaled  autocors
 PSDP = defaultdict(dict)  # Shuffled dist autocors
@@ -9,6 +9,7 @@ import glob
 import os
 import cPickle as pickle
 import seaborn as sns
+from pipeline.graphstore import GraphStore
 from tubule_het.autoCor.fitDistRFP import fitdrfp
 sns.set_context("talk")
 sns.set(style="whitegrid")
@@ -17,6 +18,8 @@ sns.set(style="whitegrid")
 #           Data initialization
 # =============================================================================
 plt.close('all')
+# the graph store of the data folder, as make_networkx
+graphs = GraphStore(os.path.join(os.path.dirname(os.getcwd()), 'graphs'))
 temp = []
 for root, dirs, files in os.walk(os.getcwd()):
     for f in dirs:
@@ -31,10 +34,10 @@ for mem in temp:
     files = glob.glob(mem+r'\Norm*vtk')
     labs = mem[-3:]
 
-    with open(os.path.join(mem,
-                           '%s_grph.pkl' % labs), 'rb') as inpt:
-        G = pickle.load(inpt)[2]
-        Graphs = {i.graph['cell']: i for i in G}
+    Graphs = {}
+    for f in files:
+        cell = os.path.basename(f)[5:-13]  # Norm_<cell>_skeleton.vtk
+        Graphs[cell] = graphs.get(cell, f)
 
     output = fitdrfp(files)
     data = output[0]
@@ -48,3 +51,4 @@ for mem in temp:
     out = (randNDY, randUDY, Norm, NormPermute, data)
     with open('%s_lagsRFP.pkl' % labs, 'wb') as OUT:
         pickle.dump(out, OUT)
+graphs.save()
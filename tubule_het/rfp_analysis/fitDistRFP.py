@@ -7,6 +7,7 @@ Fit uniform, normal or shuffled distribution of cell DYs
 from tvtk.api import tvtk
 from collections import defaultdict
 from tubule_het.autoCor.fitDistr import vtkdata, vtkshuf, vtksamp
+from pipeline.vtkio import read_polydata
 # pylint: disable=C0103
 
 
@@ -47,10 +48,7 @@ def fitdrfp(files):
 
     for el in files:
         filekey = el.rsplit('\\', 1)[1][5:][:-13]
-        reader = tvtk.PolyDataReader()
-        reader.set(file_name=el)
-        reader.update()
-        data[filekey] = reader.output
+        data[filekey] = tvtk.to_tvtk(read_polydata(el))
         print filekey
 #       actual distribution
         NormRaw[filekey] = vtkdata(data[filekey], voi='tubeWidth')
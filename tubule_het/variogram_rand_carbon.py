@@ -35,7 +35,7 @@ newlabels = {'YPD': 'WT_YPD',
 plt.close('all')
 rawdir = op.join(os.getcwd(), 'old_w_new')
 vtkF = wr.swalk(op.join(rawdir, 'normalizedVTK'),
-                '*skeleton.vtk', start=5, stop=-13)
+                '*skeleton.vt[kp]', start=5, stop=-13)
 
 df = pd.DataFrame(pd.Series(vtkF))
 df['media'] = df.index.map(lambda x: x.partition('_')[0])
@@ -23,7 +23,7 @@ class FalseException(Exception):
     pass
 
 
-def swalk(ddir, txt, start=None, stop=None):
+def swalk(ddir, txt, start=None, stop=None, catalog=None):
     """
     wrapper caller for single level file dict, returns a dict
 
@@ -40,7 +40,12 @@ def swalk(ddir, txt, start=None, stop=None):
 
     end : int
       end of slice
+
+    catalog : FileCatalog
+      search the pipeline.catalog.FileCatalog instead of walking `ddir`
     """
+    if catalog is not None:
+        return catalog.swalk(ddir, txt, start, stop)
     vtf = dict()
     for root, _, files in os.walk(ddir):
         for f in files:
@@ -54,7 +59,7 @@ def swalk(ddir, txt, start=None, stop=None):
                          .format(txt, ddir))
 
 
-def ddwalk(ddir, txt, start=None, stop=None):
+def ddwalk(ddir, txt, start=None, stop=None, catalog=None):
     """
     wrapper caller for multi level file dicts, returns a defaultdict
 
@@ -72,12 +77,16 @@ def ddwalk(ddir, txt, start=None, stop=None):
     end : int
       end of slice
 
+    catalog : FileCatalog
+      search the pipeline.catalog.FileCatalog instead of walking `ddir`
+
     Returns
     -------
     vtk : defaultdict(dict)
         default two level nested dict
     """
-
+    if catalog is not None:
+        return catalog.ddwalk(ddir, txt, start, stop)
     vtf = defaultdict(dict)
     for root, _, files in os.walk(ddir):
         for f in files: